@@ -0,0 +1,96 @@
+"""Latency and memory of each inference backend (eager, TorchScript, ONNX Runtime).
+
+Run from the backend directory after `python inference_backends.py export`:
+
+    python benchmarks/bench_backends.py --backends eager torchscript onnx --limit 8
+
+Every backend is measured in its own subprocess so resident memory is not shared between them.
+Latency is per frame at the exported min_size/max_size; the first frame is a warm-up. newer.py
+always builds the eager model, so memory is reported as the growth over that baseline once the
+backend is loaded and warmed up, plus the process peak.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_FRAMES_DIR = os.path.join(REPO_DIR, 'video-to-img', 'extracted_frames')
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+def run_backend(name, frames_dir, limit):
+    """Measure one backend in this process and return its report"""
+    os.environ['INFERENCE_BACKEND'] = 'eager'
+    from inference_backends import EXPORT_INFO_PATH, load_backend, load_frames
+    from newer import model
+
+    with open(EXPORT_INFO_PATH, 'r') as f:
+        info = json.load(f)
+    frames = load_frames(frames_dir, limit + 1)
+    baseline_mb = rss_mb()
+    start = time.perf_counter()
+    backend = load_backend(name, model)
+    load_s = time.perf_counter() - start
+
+    latencies = []
+    for i, frame in enumerate(frames):
+        start = time.perf_counter()
+        backend.detect([frame], info['min_size'], info['max_size'])
+        if i > 0:
+            latencies.append((time.perf_counter() - start) * 1000)
+        else:
+            warm_mb = rss_mb()
+
+    latencies.sort()
+    return {
+        'backend': name,
+        'frames': len(latencies),
+        'load_s': round(load_s, 3),
+        'mean_ms': round(statistics.mean(latencies), 1),
+        'p50_ms': round(latencies[len(latencies) // 2], 1),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+        'added_rss_mb': round(warm_mb - baseline_mb, 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['eager', 'torchscript', 'onnx'])
+    parser.add_argument('--frames', default=DEFAULT_FRAMES_DIR)
+    parser.add_argument('--limit', type=int, default=8)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, args.frames, args.limit)))
+        return
+
+    results = []
+    for name in args.backends:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', name, '--frames', args.frames, '--limit', str(args.limit)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'backend':<13}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'load s':>9}{'+RSS MB':>9}{'peak MB':>9}")
+    for r in results:
+        print(f"{r['backend']:<13}{r['mean_ms']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+              f"{r['load_s']:>9}{r['added_rss_mb']:>9}{r['peak_rss_mb']:>9}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
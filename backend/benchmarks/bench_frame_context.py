@@ -0,0 +1,158 @@
+"""Per-request CPU cost of everything around the detector in /api/analyze, before and after FrameContext.
+
+    python benchmarks/bench_frame_context.py --detections 50 500 --iterations 50
+
+The detector is replaced by a fixed synthetic output with the given number of boxes, so only
+decoding, tensor conversion, building detections and rendering/encoding the overlay are
+measured. No model is loaded.
+
+    original       the first version of the endpoint: decode + temp file write, PIL re-open,
+                   two unused decodes and the overlay decoded and rendered twice
+    per_box        one decode, detections built box by box and the overlay drawn from the
+                   detection dicts, filtered three more times for its summary
+    frame_context  one decode; detections and overlay derived once from the output tensors
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from frame_context import FrameContext
+from parking_spot_overlay import ParkingSpotOverlay
+
+DEFAULT_FRAMES_DIR = os.path.join(REPO_DIR, 'video-to-img', 'extracted_frames')
+overlay = ParkingSpotOverlay()
+
+def synthetic_output(height, width, count, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    xy = torch.rand(count, 2, generator=generator) * torch.tensor([width * 0.9, height * 0.9])
+    wh = torch.rand(count, 2, generator=generator) * torch.tensor([width * 0.1, height * 0.1]) + 4
+    return {
+        'boxes': torch.cat([xy, xy + wh], dim=1),
+        'labels': torch.randint(1, 3, (count,), generator=generator),
+        'scores': torch.rand(count, generator=generator)
+    }
+
+def image_to_tensor(image):
+    # Same conversion as newer.image_to_tensor, which cannot be imported without loading the model
+    return torch.from_numpy(image).permute(2, 0, 1).flip(0).float().div_(255)
+
+def decode(image_data):
+    return cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+
+def per_box_detections(output):
+    """newer.to_predictions followed by the per-prediction list comprehension the endpoint used"""
+    predictions = [{'box': box, 'label': int(output['labels'][i]), 'confidence': float(output['scores'][i])}
+                   for i, box in enumerate(output['boxes'])]
+    return [{'class_id': pred['label'], 'confidence': pred['confidence'], 'bbox': [int(x) for x in pred['box'].tolist()]}
+            for pred in predictions]
+
+def draw_per_box(image, detections, confidence_threshold=0.5):
+    """ParkingSpotOverlay.draw_detections as it was: a loop over dicts, then three filtering passes for the summary"""
+    annotated_image = image.copy()
+    for detection in detections:
+        if detection['confidence'] < confidence_threshold:
+            continue
+        x_min, y_min, x_max, y_max = detection['bbox']
+        class_id = detection['class_id']
+        color = overlay.colors.get(class_id, overlay.default_color)
+        cv2.rectangle(annotated_image, (x_min, y_min), (x_max, y_max), color, 2)
+        label = f"{'Filled' if class_id == 2 else 'Empty'}: {detection['confidence']:.2f}"
+        text_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
+        cv2.rectangle(annotated_image, (x_min, y_min - text_size[1] - 10), (x_min + text_size[0], y_min), color, -1)
+        cv2.putText(annotated_image, label, (x_min, y_min - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+    total_spots = len([d for d in detections if d['confidence'] >= confidence_threshold])
+    filled_spots = len([d for d in detections if d['class_id'] == 2 and d['confidence'] >= confidence_threshold])
+    empty_spots = len([d for d in detections if d['class_id'] == 1 and d['confidence'] >= confidence_threshold])
+    summary_text = f"Total: {total_spots} | Filled: {filled_spots} | Empty: {empty_spots}"
+    cv2.putText(annotated_image, summary_text, (10, annotated_image.shape[0] - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2, cv2.LINE_AA)
+    return annotated_image
+
+def overlay_per_box(image, detections):
+    _, buffer = cv2.imencode('.jpg', draw_per_box(image, detections))
+    return base64.b64encode(buffer.tobytes()).decode('utf-8')
+
+def run_original(image_data, output, temp_path):
+    cv2.imwrite(temp_path, decode(image_data))
+    image_tensor = transforms.ToTensor()(Image.open(temp_path).convert('RGB'))
+    detections = per_box_detections(output)
+    decode(image_data)
+    overlay_per_box(decode(image_data), detections)
+    decode(image_data)
+    response_overlay = overlay_per_box(decode(image_data), detections)
+    os.remove(temp_path)
+    return image_tensor, detections, response_overlay
+
+def run_per_box(image_data, output, temp_path):
+    image = decode(image_data)
+    image_tensor = image_to_tensor(image)
+    detections = per_box_detections(output)
+    return image_tensor, detections, overlay_per_box(image, detections)
+
+def run_frame_context(image_data, output, temp_path):
+    frame = FrameContext(decode(image_data))
+    image_tensor = image_to_tensor(frame.image)
+    frame.output = output
+    return image_tensor, frame.detections, frame.overlay_base64()
+
+MODES = {'original': run_original, 'per_box': run_per_box, 'frame_context': run_frame_context}
+
+def measure(run, image_data, output, iterations):
+    temp_path = os.path.join(tempfile.gettempdir(), f'bench_frame_context_{os.getpid()}.jpg')
+    run(image_data, output, temp_path)
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(iterations):
+        run(image_data, output, temp_path)
+    return {
+        'cpu_ms': round((time.process_time() - cpu_start) / iterations * 1000, 3),
+        'wall_ms': round((time.perf_counter() - wall_start) / iterations * 1000, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', help='JPEG to use; defaults to the first extracted frame')
+    parser.add_argument('--detections', type=int, nargs='+', default=[50, 500])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    image_path = args.image or sorted(glob.glob(os.path.join(DEFAULT_FRAMES_DIR, '*.jpg')))[0]
+    with open(image_path, 'rb') as f:
+        image_data = f.read()
+    height, width = decode(image_data).shape[:2]
+    torch.set_num_threads(1)
+
+    results = []
+    print(f"{width}x{height} {os.path.basename(image_path)}, {args.iterations} iterations, 1 thread")
+    print(f"{'detections':>10}  {'mode':<15}{'cpu ms':>10}{'wall ms':>10}{'vs original':>13}")
+    for count in args.detections:
+        output = synthetic_output(height, width, count)
+        baseline = None
+        for name, run in MODES.items():
+            result = dict(measure(run, image_data, output, args.iterations), mode=name, detections=count)
+            baseline = baseline or result['cpu_ms']
+            result['speedup'] = round(baseline / result['cpu_ms'], 2)
+            results.append(result)
+            print(f"{count:>10}  {name:<15}{result['cpu_ms']:>10}{result['wall_ms']:>10}{result['speedup']:>12}x")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
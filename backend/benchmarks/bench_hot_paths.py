@@ -0,0 +1,255 @@
+"""Microbenchmarks of the inference, overlay, logging and frame-extraction hot paths, with regression checks.
+
+Run from the backend directory (final_model.pth is loaded relative to the CWD):
+
+    python benchmarks/bench_hot_paths.py --json bench_baseline.json
+    python benchmarks/bench_hot_paths.py --json bench_new.json --compare bench_baseline.json --threshold 0.15
+    python benchmarks/bench_hot_paths.py --cases create_overlay_image --rounds 50
+
+All inputs come from the repository: the extracted frames in video-to-img/extracted_frames and
+the parking*.jpg images in frontend/vite-project/public. The info.txt logs for
+get_parking_info_from_file (10k and 1M lines) and the video for extract_frames are generated
+from them into a temporary directory, which is also the working directory of the Flask app, so
+nothing is written into the tree. /api/analyze runs with the rate limiter and the inference
+cache off, so every request reaches the detector.
+
+Each case is warmed up once and then timed call by call; results (min, median, mean, stdev in
+ms) are written with host and library versions to --json. With --compare, cases whose median
+is more than --threshold slower than in the baseline are flagged and the exit status is 1.
+"""
+import argparse
+import contextlib
+import glob
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import torch
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_FRAMES_DIR = os.path.join(REPO_DIR, 'video-to-img', 'extracted_frames')
+PUBLIC_IMAGES = os.path.join(REPO_DIR, 'frontend', 'vite-project', 'public', 'parking*.jpg')
+
+def read_inputs(frames_dir):
+    frame_paths = sorted(glob.glob(os.path.join(frames_dir, '*.jpg')))
+    image_paths = sorted(glob.glob(PUBLIC_IMAGES))
+    if not frame_paths or not image_paths:
+        raise SystemExit(f"Benchmark inputs missing: {frames_dir} or {PUBLIC_IMAGES}")
+    images = []
+    for path in image_paths:
+        with open(path, 'rb') as f:
+            images.append((os.path.basename(path), f.read()))
+    return frame_paths, images
+
+def write_info_log(path, lines, image_names, seed=0):
+    """An info.txt in the format newer.compile_data appends, spread over the given image names"""
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for i in range(lines):
+            name = image_names[i % len(image_names)]
+            timestamp = f'2025-01-{1 + i // 86400 % 28:02d}_{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}'
+            x, y = rng.randrange(1200), rng.randrange(700)
+            f.write(f"{name} {timestamp} {rng.random():.4f} {rng.choice((1, 2))} {x} {y} {x + 40} {y + 60}\n")
+
+def write_video(path, frame_paths, fps=10, repeat=5):
+    """A short MP4 of the extracted frames, each held for `repeat` video frames"""
+    first = cv2.imread(frame_paths[0])
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (first.shape[1], first.shape[0]))
+    for frame_path in frame_paths:
+        frame = cv2.imread(frame_path)
+        for _ in range(repeat):
+            writer.write(frame)
+    writer.release()
+
+def setup_cases(frame_paths, images, workdir):
+    """(name, default rounds, setup) for every case; setup returns the callable to time"""
+    def predict():
+        import newer
+        paths = iter(frame_paths * 1000)
+        return lambda: newer.predict(next(paths))
+
+    def create_overlay_image():
+        import newer
+        from parking_spot_overlay import ParkingSpotOverlay
+        overlay = ParkingSpotOverlay()
+        name, data = images[0]
+        path = os.path.join(workdir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        detections = [{'class_id': p['label'], 'confidence': p['confidence'], 'bbox': [int(x) for x in p['box'].tolist()]}
+                      for p in newer.predict(path)]
+        return lambda: overlay.create_overlay_image(data, detections)
+
+    def parking_info(lines):
+        def setup():
+            import flaskapp
+            info_path = os.path.join(workdir, f'info_{lines}.txt')
+            if not os.path.exists(info_path):
+                names = [os.path.splitext(os.path.basename(path))[0] for path in frame_paths]
+                write_info_log(info_path, lines, names)
+            flaskapp.INFO_PATH = info_path
+            target = os.path.basename(frame_paths[len(frame_paths) // 2])
+            return lambda: flaskapp.get_parking_info_from_file(target)
+        return setup
+
+    def api_analyze():
+        import flaskapp
+        flaskapp.limiter.enabled = False
+        client = flaskapp.app.test_client()
+        uploads = iter(images * 1000)
+
+        def post():
+            name, data = next(uploads)
+            response = client.post('/api/analyze', data={'file': (io.BytesIO(data), name), 'location_id': 'bench'},
+                                   content_type='multipart/form-data')
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/analyze returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return post
+
+    def extract_frames():
+        sys.path.insert(0, os.path.join(REPO_DIR, 'video-to-img'))
+        vid_to_img = importlib.import_module('vidToImg')
+        video_path = os.path.join(workdir, 'bench_video.mp4')
+        write_video(video_path, frame_paths)
+        output_dir = os.path.join(workdir, 'extract')
+
+        def run():
+            shutil.rmtree(output_dir, ignore_errors=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                vid_to_img.extract_frames(video_path, output_dir, 'frames', interval=1.0)
+        return run
+
+    return [
+        ('predict', 5, predict),
+        ('create_overlay_image', 20, create_overlay_image),
+        ('get_parking_info_from_file_10k', 20, parking_info(10_000)),
+        ('get_parking_info_from_file_1m', 3, parking_info(1_000_000)),
+        ('api_analyze', 5, api_analyze),
+        ('extract_frames', 3, extract_frames)
+    ]
+
+def measure(fn, rounds):
+    fn()
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        'rounds': rounds,
+        'min_ms': round(min(times), 3),
+        'median_ms': round(statistics.median(times), 3),
+        'mean_ms': round(statistics.mean(times), 3),
+        'stdev_ms': round(statistics.stdev(times), 3) if len(times) > 1 else 0.0
+    }
+
+def environment(threads):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'opencv': cv2.__version__,
+        'torch_threads': threads
+    }
+
+def compare(results, baseline, threshold):
+    """Print median ratios against a baseline run; returns the names of regressed cases"""
+    regressions = []
+    for key in ('platform', 'processor', 'cpu_count', 'torch_threads'):
+        if baseline['environment'].get(key) != results['environment'].get(key):
+            print(f"Warning: baseline {key} differs ({baseline['environment'].get(key)} vs "
+                  f"{results['environment'].get(key)}), timings may not be comparable")
+    print(f"\nvs baseline {baseline['environment'].get('commit')} ({baseline['environment'].get('time')}), "
+          f"threshold +{threshold:.0%}")
+    print(f"{'case':<34}{'baseline ms':>13}{'now ms':>12}{'change':>10}")
+    for name, result in results['cases'].items():
+        before = baseline['cases'].get(name)
+        if before is None:
+            print(f"{name:<34}{'-':>13}{result['median_ms']:>12}{'new':>10}")
+            continue
+        change = result['median_ms'] / before['median_ms'] - 1
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f"{name:<34}{before['median_ms']:>13}{result['median_ms']:>12}{change:>+10.1%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', default=DEFAULT_FRAMES_DIR)
+    parser.add_argument('--cases', nargs='+', help='run only these cases')
+    parser.add_argument('--rounds', type=int, help='timed calls per case, instead of each case\'s default')
+    parser.add_argument('--threads', type=int, default=1, help='torch threads')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='results file of an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.15, help='median slowdown flagged as a regression')
+    args = parser.parse_args()
+    # The cases run with the temporary directory as CWD; paths given relative to the caller's stay valid
+    args.frames, args.json, args.compare = (os.path.abspath(path) if path else path
+                                            for path in (args.frames, args.json, args.compare))
+    caller_dir = os.getcwd()
+
+    torch.set_num_threads(args.threads)
+    frame_paths, images = read_inputs(args.frames)
+    workdir = tempfile.mkdtemp(prefix='bench_hot_paths_')
+    os.environ.setdefault('DETECTION_DB_PATH', os.path.join(workdir, 'bench.db'))
+    os.environ.setdefault('INFERENCE_CACHE', '0')
+    # The model loads from the CWD; the Flask app's uploads/ and results/ then go to workdir
+    import newer  # noqa: F401
+    os.chdir(workdir)
+
+    cases = setup_cases(frame_paths, images, workdir)
+    unknown = set(args.cases or []) - {name for name, _, _ in cases}
+    if unknown:
+        raise SystemExit(f"Unknown cases: {', '.join(sorted(unknown))}")
+
+    results = {'environment': environment(args.threads), 'cases': {}}
+    print(f"{len(frame_paths)} frames, {len(images)} public images, {args.threads} torch thread(s)")
+    print(f"{'case':<34}{'rounds':>7}{'min ms':>11}{'median ms':>11}{'mean ms':>11}{'stdev':>9}")
+    try:
+        for name, rounds, setup in cases:
+            if args.cases and name not in args.cases:
+                continue
+            result = measure(setup(), args.rounds or rounds)
+            results['cases'][name] = result
+            print(f"{name:<34}{result['rounds']:>7}{result['min_ms']:>11}{result['median_ms']:>11}"
+                  f"{result['mean_ms']:>11}{result['stdev_ms']:>9}")
+    finally:
+        os.chdir(caller_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Throughput and latency of the batching inference scheduler under concurrent clients.
+
+Run from the backend directory (final_model.pth is loaded relative to the CWD):
+
+    python benchmarks/bench_scheduler.py --clients 1 4 16 64 --requests 8
+
+Each client sends requests back to back (closed loop). Every concurrency level is run
+once with batching disabled (max batch size 1) and once with the configured window, so the
+table shows the effect of batching on the same host.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from newer import predict_batch, load_tensor
+from inference_scheduler import BatchingScheduler
+
+DEFAULT_FRAMES_DIR = os.path.join(REPO_DIR, 'video-to-img', 'extracted_frames')
+
+def load_frames(frames_dir, limit=None):
+    paths = sorted(glob.glob(os.path.join(frames_dir, '*.jpg')))[:limit]
+    if not paths:
+        raise SystemExit(f"No frames found in {frames_dir}")
+    return [load_tensor(path) for path in paths]
+
+def run_level(frames, clients, requests_per_client, max_batch_size, max_wait_ms):
+    scheduler = BatchingScheduler(predict_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    scheduler.start()
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def client(client_index):
+        local = []
+        for i in range(requests_per_client):
+            frame = frames[(client_index + i) % len(frames)]
+            start = time.perf_counter()
+            scheduler.predict(frame)
+            local.append(time.perf_counter() - start)
+        with latencies_lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stats = scheduler.get_stats()
+    scheduler.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'clients': clients,
+        'max_batch_size': max_batch_size,
+        'max_wait_ms': max_wait_ms,
+        'requests': len(latencies),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'average_batch_size': stats['average_batch_size']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames-dir', default=DEFAULT_FRAMES_DIR)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--requests', type=int, default=8, help='requests per client')
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=20)
+    parser.add_argument('--json', dest='json_path', help='write results to this file')
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames_dir)
+    # Warm up so the first level does not pay for lazy initialisation
+    predict_batch(frames[:1])
+
+    results = []
+    print(f"{'clients':>7} {'batch':>5} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'avg batch':>9}")
+    for clients in args.clients:
+        for max_batch_size in (1, args.max_batch_size):
+            result = run_level(frames, clients, args.requests, max_batch_size, args.max_wait_ms)
+            results.append(result)
+            print(f"{clients:>7} {max_batch_size:>5} {result['throughput_rps']:>8.2f} "
+                  f"{result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['average_batch_size']:>9.2f}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Decode cost of sampling a video: reading every frame vs. grab-only skipping vs. seeking.
+
+    python benchmarks/bench_video_decode.py path/to/video.mp4 --interval 15
+
+Only decoding is measured; no model is loaded.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from video_reader import iter_sampled_frames, video_fps
+
+def read_every_frame(video_path, interval_s):
+    """The original loop: cap.read() on every frame, keeping one every fps * interval"""
+    cap = cv2.VideoCapture(video_path)
+    frame_interval = max(1, int((video_fps(cap) or 25.0) * interval_s))
+    sampled = 0
+    frame_count = 0
+    while True:
+        ret, _ = cap.read()
+        if not ret:
+            break
+        if frame_count % frame_interval == 0:
+            sampled += 1
+        frame_count += 1
+    cap.release()
+    return sampled
+
+def sample(video_path, interval_s, seek_min_gap):
+    return sum(1 for _ in iter_sampled_frames(video_path, interval_s, seek_min_gap))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--interval', type=float, default=15.0)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    modes = {
+        'read_every_frame': lambda: read_every_frame(args.video, args.interval),
+        'grab_skip': lambda: sample(args.video, args.interval, seek_min_gap=float('inf')),
+        'seek_skip': lambda: sample(args.video, args.interval, seek_min_gap=120)
+    }
+    results = {}
+    print(f"{'mode':<18}{'sampled':>9}{'seconds':>10}")
+    for name, run in modes.items():
+        start = time.perf_counter()
+        sampled = run()
+        elapsed = time.perf_counter() - start
+        results[name] = {'sampled_frames': sampled, 'seconds': round(elapsed, 4)}
+        print(f"{name:<18}{sampled:>9}{elapsed:>10.3f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Per-camera settings, persisted as one JSON file keyed by location id.
+
+The only setting so far is the inference resolution: `min_size`/`max_size` for the detector's
+internal resize of each tile (of the whole frame when tiling is off). Cameras without an entry
+use the server-wide TILE_MIN_SIZE/TILE_MAX_SIZE, or the model's own resize when those are unset. resolution_sweep.py measures which resolution a camera needs
+and can write it here with --apply.
+"""
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMERA_SETTINGS_PATH = os.path.join(BASE_DIR, 'camera_settings.json')
+MIN_RESOLUTION = 64
+MAX_RESOLUTION = 4096
+
+def _check_size(name, value):
+    value = int(value)
+    if not MIN_RESOLUTION <= value <= MAX_RESOLUTION:
+        raise ValueError(f"{name} must be between {MIN_RESOLUTION} and {MAX_RESOLUTION}, got {value}")
+    return value
+
+class CameraSettings:
+    def __init__(self, path=CAMERA_SETTINGS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._settings = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self._settings = json.load(f)
+            logger.info(f"Loaded settings for {len(self._settings)} cameras from {path}")
+
+    def get(self, camera_id):
+        with self._lock:
+            return dict(self._settings.get(camera_id, {}))
+
+    def resolution(self, camera_id):
+        """(min_size, max_size) set for a camera, either of which may be None, or None if neither is set"""
+        settings = self.get(camera_id)
+        if settings.get('min_size') is None and settings.get('max_size') is None:
+            return None
+        return settings.get('min_size'), settings.get('max_size')
+
+    def set_resolution(self, camera_id, min_size, max_size=None):
+        """Set a camera's inference resolution; None for both clears it"""
+        min_size = _check_size('min_size', min_size) if min_size is not None else None
+        max_size = _check_size('max_size', max_size) if max_size is not None else None
+        if min_size is not None and max_size is not None and max_size < min_size:
+            raise ValueError(f"max_size {max_size} is smaller than min_size {min_size}")
+        with self._lock:
+            settings = self._settings.setdefault(camera_id, {})
+            settings.update({'min_size': min_size, 'max_size': max_size})
+            if min_size is None and max_size is None:
+                del self._settings[camera_id]
+            self._save()
+        return self.get(camera_id)
+
+    def to_dict(self):
+        with self._lock:
+            return {camera_id: dict(settings) for camera_id, settings in self._settings.items()}
+
+    def _save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._settings, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -9,7 +9,9 @@ import json
 import threading
 import logging
 import os
-import base64
+from collections import deque
+
+from parking_spot_overlay import ParkingSpotOverlay
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -22,12 +24,84 @@ CORS(app)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SIMULATION_VIDEO = os.path.join(BASE_DIR, 'public', 'videos', 'parking-simulation.mp4')
 RASPBERRY_PI_API = "http://192.168.137.135:5000/api"
+LOCATION_ID = "simulation"
+SCENE_CHANGE_THRESHOLD = 6.0  # Mean absolute grey-level difference (0-255) that counts as a change
+SCENE_MAX_AGE = 60.0  # Force a fresh analysis after this many seconds even if nothing changed
+BROADCAST_RING_SIZE = 4  # Most recent encoded frames kept for /video_feed subscribers
+BROADCAST_IDLE_TIMEOUT = 5.0  # Keep capturing this long after the last viewer leaves, for quick reconnects
+ANALYSIS_INTERVAL = 10.0  # Seconds between frames offered for analysis
+LATENCY_WINDOW = 50  # Recent end-to-end analysis latencies kept for the stats
+
+# Bounds and targets for the adaptive submission controller
+CONTROLLER_INTERVAL = (2.0, 60.0)  # Seconds between submissions
+CONTROLLER_MAX_SIZE = (480, 1280)  # Longest side of the uploaded frame
+CONTROLLER_QUALITY = (50, 85)  # JPEG quality of the upload
+# Latency targets are multiples of the backend's baseline latency: the configured one, or else the
+# lowest window median measured so far. Below the first factor, recover; above the second, degrade.
+CONTROLLER_BASELINE_LATENCY = float(os.environ['CONTROLLER_BASELINE_LATENCY']) if os.environ.get('CONTROLLER_BASELINE_LATENCY') else None
+CONTROLLER_RECOVER_FACTOR = float(os.environ.get('CONTROLLER_RECOVER_FACTOR', 1.5))
+CONTROLLER_DEGRADE_FACTOR = float(os.environ.get('CONTROLLER_DEGRADE_FACTOR', 3.0))
+CONTROLLER_WINDOW = 10  # Recent submissions the latency and error rate are measured over
+CONTROLLER_MAX_ERROR_RATE = 0.3
+
+# Keep-alive connections to the analysis backend, reused by every request
+http_session = requests.Session()
+http_session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
 
-# Global flag to control the generator
-stop_event = threading.Event()
 latest_analysis_results = {}
+# The analysis worker publishes results and the stream loop stamps them unchanged; both rebind under this
+latest_analysis_lock = threading.Lock()
+analysis_stats = {
+    'analyses_sent': 0,
+    'analyses_skipped': 0,
+    'forced_refreshes': 0
+}
+
+class SceneChangeDetector:
+    """Cheap change check between the current frame and the last analysed one.
+
+    Frames are reduced to a small blurred greyscale thumbnail and compared by mean absolute
+    difference, which ignores sensor noise and compression artefacts but reacts to a car
+    entering or leaving a spot. The analysis worker marks frames analyzed while the stream loop
+    checks new ones, so the reference is read and replaced under a lock.
+    """
 
-def preprocess_frame(frame, max_size=1280):
+    def __init__(self, threshold=SCENE_CHANGE_THRESHOLD, max_age=SCENE_MAX_AGE, size=(64, 36)):
+        self.threshold = threshold
+        self.max_age = max_age
+        self.size = size
+        self.reference = None
+        self.reference_time = None
+        self._lock = threading.Lock()
+
+    def thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (3, 3), 0)
+
+    def check(self, frame, now=None):
+        """Return (should_analyze, reason) for this frame; reason is 'initial', 'changed', 'max_age' or 'unchanged'"""
+        now = time.time() if now is None else now
+        thumb = self.thumbnail(frame)
+        with self._lock:
+            reference, reference_time = self.reference, self.reference_time
+        if reference is None:
+            return True, 'initial'
+        if self.max_age is not None and now - reference_time >= self.max_age:
+            return True, 'max_age'
+        difference = float(cv2.absdiff(thumb, reference).mean())
+        if difference >= self.threshold:
+            return True, 'changed'
+        return False, 'unchanged'
+
+    def mark_analyzed(self, frame, now=None):
+        """Make this frame the reference that later frames are compared against"""
+        thumb = self.thumbnail(frame)
+        with self._lock:
+            self.reference = thumb
+            self.reference_time = time.time() if now is None else now
+
+def preprocess_frame(frame, max_size=1280, quality=85):
     """Preprocess frame before sending for analysis."""
     if frame is None:
         return None
@@ -37,7 +111,7 @@ def preprocess_frame(frame, max_size=1280):
         scale = max_size / max(width, height)
         frame = cv2.resize(frame, (int(width * scale), int(height * scale)))
     
-    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 85]
+    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
     _, jpeg = cv2.imencode('.jpg', frame, encode_param)
     return jpeg.tobytes()
 
@@ -49,15 +123,22 @@ def send_frame_for_analysis(frame_data, api_url, max_retries=3, backoff_factor=1
     while retry_count < max_retries:
         try:
             frame_buffer = BytesIO(frame_data)
-            response = requests.post(
+            response = http_session.post(
                 api_url,
                 files={'file': ('frame.jpg', frame_buffer, 'image/jpeg')},
+                data={'location_id': LOCATION_ID},
                 timeout=15
             )
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             last_error = e
+            status = e.response.status_code if e.response is not None else None
+            if status == 429:
+                # Rate limited: retrying now only adds load, leave the pacing to the caller
+                logger.warning(f"Analysis rate limited: {str(e)}")
+                return {'error': str(e), 'status_code': status,
+                        'retry_after': e.response.headers.get('Retry-After')}
             retry_count += 1
             if retry_count < max_retries:
                 sleep_time = backoff_factor ** retry_count
@@ -68,97 +149,483 @@ def send_frame_for_analysis(frame_data, api_url, max_retries=3, backoff_factor=1
     
     return {'error': str(last_error)}
 
-def generate_frames(showOverlay=True):
-    if not os.path.exists(SIMULATION_VIDEO):
-        logger.error(f"Video file not found at: {SIMULATION_VIDEO}")
-        return
-    
-    cap = cv2.VideoCapture(SIMULATION_VIDEO)
-    if not cap.isOpened():
-        logger.error(f"Failed to open video file: {SIMULATION_VIDEO}")
-        return
-    
-    logger.info(f"Successfully opened video file: {SIMULATION_VIDEO}")
-    frame_interval = 10.0  # Analyze every 10 seconds
-    last_process = None
-    
+class SubmissionController:
+    """Adapts how often, how large and at what JPEG quality frames are submitted to the backend.
+
+    Every submission's outcome (round-trip latency, failure or 429) is recorded over a window of
+    the last `window` submissions. Latency is judged against the backend's baseline, given as
+    `baseline_latency` or measured as the lowest median of a full error-free window: a median
+    above `degrade_factor` times the baseline is slow, one below `recover_factor` times it fast.
+
+    A 429 doubles the interval straight away and holds off until its Retry-After, and a failing
+    window lengthens the interval. A slow window lengthens the interval first, since fewer
+    requests is what relieves a queueing backend (the detector resizes every upload, so smaller
+    uploads only save transfer time), then lowers the JPEG quality, then the resolution.
+    Degrading reacts to the first outcome under the new settings; recovering needs a full window
+    without errors or 429s and goes one step at a time in the reverse order. Such a window walks a
+    429 or error back-off back to the base interval even when its latency is between the targets;
+    quality and resolution only come back on a fast one. Every change is logged and kept for the stats.
+    """
+
+    def __init__(self, interval=ANALYSIS_INTERVAL, interval_bounds=CONTROLLER_INTERVAL,
+                 size_bounds=CONTROLLER_MAX_SIZE, quality_bounds=CONTROLLER_QUALITY,
+                 baseline_latency=CONTROLLER_BASELINE_LATENCY, recover_factor=CONTROLLER_RECOVER_FACTOR,
+                 degrade_factor=CONTROLLER_DEGRADE_FACTOR, window=CONTROLLER_WINDOW,
+                 max_error_rate=CONTROLLER_MAX_ERROR_RATE):
+        self.base_interval = interval
+        self.interval_bounds = interval_bounds
+        self.size_bounds = size_bounds
+        self.quality_bounds = quality_bounds
+        self.baseline_latency = baseline_latency
+        self.measure_baseline = baseline_latency is None
+        self.recover_factor = recover_factor
+        self.degrade_factor = degrade_factor
+        self.max_error_rate = max_error_rate
+        self.interval = interval
+        # The interval latency alone calls for; 429 and error back-offs go on top of it
+        self.latency_interval = interval
+        self.max_size = size_bounds[1]
+        self.quality = quality_bounds[1]
+        self.hold_until = 0.0
+        self._outcomes = deque(maxlen=window)
+        self._decisions = deque(maxlen=20)
+        self._lock = threading.Lock()
+        self.stats = {'ok': 0, 'errors': 0, 'throttled': 0, 'degrades': 0, 'recoveries': 0}
+
+    def settings(self):
+        with self._lock:
+            return self.max_size, self.quality
+
+    def due(self, last_submit, now):
+        """Whether a frame may be submitted at `now` after the last submission at `last_submit`"""
+        with self._lock:
+            if now < self.hold_until:
+                return False
+            return last_submit is None or now - last_submit >= self.interval
+
+    def record(self, latency, results):
+        """Feed back the outcome of one submission and adjust the settings"""
+        now = time.time()
+        with self._lock:
+            if results.get('status_code') == 429:
+                self.stats['throttled'] += 1
+                self._outcomes.append((latency, False))
+                retry_after = _seconds(results.get('retry_after'))
+                self.hold_until = now + (retry_after if retry_after is not None else self.interval)
+                self._set('throttled', interval=self.interval * 2)
+                return
+            failed = 'error' in results
+            self.stats['errors' if failed else 'ok'] += 1
+            self._outcomes.append((latency, failed))
+            self._adjust()
+
+    def latency_target(self):
+        """(recover below, degrade above) in seconds, or None until a baseline is known"""
+        if self.baseline_latency is None:
+            return None
+        return self.baseline_latency * self.recover_factor, self.baseline_latency * self.degrade_factor
+
+    def _adjust(self):
+        """One degrade or recovery step from the current window; caller holds the lock"""
+        latencies = sorted(latency for latency, failed in self._outcomes if not failed)
+        error_rate = sum(failed for _, failed in self._outcomes) / len(self._outcomes)
+        median = latencies[len(latencies) // 2] if latencies else None
+        full = len(self._outcomes) == self._outcomes.maxlen
+        if self.measure_baseline and full and error_rate == 0 and \
+                (self.baseline_latency is None or median < self.baseline_latency):
+            self.baseline_latency = median
+        target = self.latency_target()
+        if error_rate > self.max_error_rate:
+            # A failing backend needs fewer requests, not smaller ones
+            self._set(f'error rate {error_rate:.0%}', interval=self.interval * 1.5)
+        elif target is None or median is None:
+            return
+        elif median > target[1]:
+            reason = f'median latency {median:.2f}s'
+            if self.interval < self.interval_bounds[1]:
+                self._set(reason, interval=self.interval * 1.5)
+                self.latency_interval = self.interval
+            elif self.quality > self.quality_bounds[0]:
+                self._set(reason, quality=self.quality - 10)
+            else:
+                self._set(reason, max_size=int(self.max_size * 0.75))
+        elif error_rate == 0 and full:
+            reason = f'median latency {median:.2f}s'
+            if self.interval > self.latency_interval:
+                # 429s and errors have stopped: undo their back-off whatever the latency
+                self._set(reason, interval=max(self.latency_interval, self.interval / 1.5))
+            elif median >= target[0]:
+                return
+            elif self.max_size < self.size_bounds[1]:
+                self._set(reason, max_size=int(self.max_size / 0.75))
+            elif self.quality < self.quality_bounds[1]:
+                self._set(reason, quality=self.quality + 10)
+            elif self.interval > self.base_interval:
+                self._set(reason, interval=max(self.base_interval, self.interval / 1.5))
+                self.latency_interval = self.interval
+
+    def _set(self, reason, interval=None, max_size=None, quality=None):
+        before = (self.interval, self.max_size, self.quality)
+        if interval is not None:
+            self.interval = min(max(interval, self.interval_bounds[0]), self.interval_bounds[1])
+        if max_size is not None:
+            self.max_size = min(max(max_size, self.size_bounds[0]), self.size_bounds[1])
+        if quality is not None:
+            self.quality = min(max(quality, self.quality_bounds[0]), self.quality_bounds[1])
+        after = (self.interval, self.max_size, self.quality)
+        if after == before:
+            return
+        degraded = after[0] > before[0] or after[1] < before[1] or after[2] < before[2]
+        self.stats['degrades' if degraded else 'recoveries'] += 1
+        # Judge the new settings on their own outcomes
+        self._outcomes.clear()
+        decision = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'reason': reason,
+                    'interval': round(self.interval, 2), 'max_size': self.max_size, 'quality': self.quality}
+        self._decisions.append(decision)
+        logger.info(f"Submission controller {'degraded' if degraded else 'recovered'} ({reason}): "
+                    f"interval {self.interval:.1f}s, max_size {self.max_size}, quality {self.quality}")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            latencies = sorted(latency for latency, failed in self._outcomes if not failed)
+            stats.update({
+                'interval_s': round(self.interval, 2),
+                'max_size': self.max_size,
+                'quality': self.quality,
+                'holding_s': round(max(0.0, self.hold_until - time.time()), 1),
+                'baseline_latency_s': round(self.baseline_latency, 3) if self.baseline_latency is not None else None,
+                'window_error_rate': round(sum(failed for _, failed in self._outcomes) / len(self._outcomes), 3)
+                                     if self._outcomes else None,
+                'window_median_latency_s': round(latencies[len(latencies) // 2], 3) if latencies else None,
+                'decisions': list(self._decisions)
+            })
+        return stats
+
+def _seconds(value):
     try:
-        while not stop_event.is_set():
-            success, frame = cap.read()
-            if not success:
-                logger.info("Video ended, restarting from beginning")
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                continue
-                
-            current_time = time.time()
-            
-            # Always encode the frame for streaming
-            ret, jpeg = cv2.imencode('.jpg', frame)
-            frame_bytes = jpeg.tobytes()
-            
-            results = None
-            if last_process is None or (current_time - last_process >= frame_interval):
-                processed_frame = preprocess_frame(frame)
-                if processed_frame:
-                    try:
-                        start_time = time.time()
-                        results = send_frame_for_analysis(
-                            processed_frame, 
-                            f"{RASPBERRY_PI_API}/analyze"
-                        )
-                        logger.info(f"Frame analyzed in {time.time() - start_time:.2f} seconds")
-                        last_process = current_time
-                        
-                        # Use overlay image if available and showOverlay is True
-                        if showOverlay and 'overlay_image' in results and results['overlay_image']:
-                            try:
-                                frame_bytes = base64.b64decode(results['overlay_image'])
-                            except Exception as e:
-                                logger.error(f"Failed to decode overlay: {str(e)}")
-                        
-                        # Update the latest analysis results
-                        global latest_analysis_results
-                        latest_analysis_results = results
-                                
-                    except Exception as e:
-                        logger.error(f"Analysis error: {str(e)}")
-                        results = {'error': str(e)}
-                        last_process = current_time
-            
-            # Yield the frame
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            
-            time.sleep(0.033)  # ~30 FPS
-    finally:
-        cap.release()
-        logger.info("Video capture released")
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def publish_analysis(results):
+    global latest_analysis_results
+    with latest_analysis_lock:
+        latest_analysis_results = results
+
+def mark_analysis_unchanged():
+    """Stamp the current results as still valid, in the same step as reading them so a newer result is never overwritten"""
+    global latest_analysis_results
+    with latest_analysis_lock:
+        if latest_analysis_results:
+            latest_analysis_results = dict(
+                latest_analysis_results,
+                scene_unchanged=True,
+                checked_at=time.strftime('%Y-%m-%d %H:%M:%S')
+            )
+
+def result_boxes(results, scale=1.0):
+    """Detections of an analysis result as the arrays ParkingSpotOverlay.draw_boxes takes, scaled to capture size"""
+    detections = results.get('detections') or []
+    boxes = np.array([d['bbox'] for d in detections], dtype=np.float32).reshape(-1, 4) * scale
+    class_ids = np.array([d['class_id'] for d in detections], dtype=np.int64)
+    confidences = np.array([d['confidence'] for d in detections], dtype=np.float32)
+    return boxes.astype(np.int64), class_ids, confidences
+
+class AnalysisWorker:
+    """Sends frames for analysis from a background thread, so the stream loop never waits on the network.
+
+    `submit()` puts a frame in a single latest-frame slot: a frame still waiting there when a
+    newer one is submitted is dropped rather than queued. The worker takes the slot, uploads
+    the frame over the shared keep-alive session and publishes the result, with its boxes
+    scaled to the captured frame, for the stream loop to composite onto later frames.
+    """
+
+    def __init__(self, api_url, scene_detector=None, controller=None, baseline_latency=CONTROLLER_BASELINE_LATENCY):
+        self.api_url = api_url
+        self.scene_detector = scene_detector
+        self.controller = controller or SubmissionController(baseline_latency=baseline_latency)
+        self.overlay = ParkingSpotOverlay()
+        self._slot = None
+        self._condition = threading.Condition()
+        self._boxes = None
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {'submitted': 0, 'in_flight': 0, 'completed': 0, 'failed': 0, 'dropped': 0}
+        self._thread = threading.Thread(target=self._run, name='analysis-worker', daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, captured_at):
+        with self._condition:
+            if self._slot is not None:
+                self.stats['dropped'] += 1
+            self._slot = (frame, captured_at)
+            self.stats['submitted'] += 1
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._slot is not None)
+                frame, captured_at = self._slot
+                self._slot = None
+                self.stats['in_flight'] += 1
+
+            max_size, quality = self.controller.settings()
+            # Results come back in the coordinates of the shrunk upload
+            scale = max(1.0, max(frame.shape[:2]) / max_size)
+            try:
+                data = preprocess_frame(frame, max_size, quality)
+                sent_at = time.time()
+                # No retries: the controller backs off instead
+                results = send_frame_for_analysis(data, self.api_url, max_retries=1)
+                self.controller.record(time.time() - sent_at, results)
+            except Exception as e:
+                logger.error(f"Analysis error: {str(e)}")
+                results = {'error': str(e)}
+            latency = time.time() - captured_at
+
+            with self._condition:
+                self.stats['in_flight'] -= 1
+                if 'error' in results:
+                    self.stats['failed'] += 1
+                    continue
+                self.stats['completed'] += 1
+                self._latencies.append(latency)
+                self._boxes = result_boxes(results, scale)
+            logger.info(f"Frame analyzed {latency:.2f} seconds after capture")
+            if self.scene_detector is not None:
+                self.scene_detector.mark_analyzed(frame, captured_at)
+            publish_analysis(results)
+
+    def composite(self, frame):
+        """JPEG of `frame` with the most recent result drawn on it, or None before the first result"""
+        with self._condition:
+            boxes = self._boxes
+        if boxes is None:
+            return None
+        return self.overlay.encode_boxes(frame, *boxes)
+
+    def get_stats(self):
+        with self._condition:
+            stats = dict(self.stats)
+            latencies = sorted(self._latencies)
+        if latencies:
+            stats.update({
+                'latency_last_s': round(self._latencies[-1], 3),
+                'latency_mean_s': round(sum(latencies) / len(latencies), 3),
+                'latency_p95_s': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3)
+            })
+        stats['controller'] = self.controller.get_stats()
+        return stats
+
+class FrameBroadcaster:
+    """One capture/encode/analysis loop per video source, shared by every /video_feed client.
+
+    The loop publishes each encoded frame, and while any client wants it the frame with the
+    latest analysis composited on it, to a small ring buffer under an increasing sequence
+    number. Analysis itself runs in an AnalysisWorker. Subscribers always take the newest
+    frame, so a slow client skips frames instead of queueing them and costs no extra decoding,
+    encoding or analysis. The loop starts with the first subscriber and stops once there have
+    been none for `idle_timeout` seconds.
+    """
+
+    def __init__(self, source, ring_size=BROADCAST_RING_SIZE, idle_timeout=BROADCAST_IDLE_TIMEOUT):
+        self.source = source
+        self.idle_timeout = idle_timeout
+        self._ring = deque(maxlen=ring_size)
+        self._sequence = 0
+        self._subscribers = 0
+        self._overlay_subscribers = 0
+        self._idle_since = None
+        self._thread = None
+        self._condition = threading.Condition()
+        self.stats = {'frames_published': 0, 'frames_sent': 0, 'frames_skipped': 0, 'loops_started': 0}
+        self.analysis = AnalysisWorker(f"{RASPBERRY_PI_API}/analyze", SceneChangeDetector())
+
+    def subscribe(self, show_overlay=False):
+        with self._condition:
+            self._subscribers += 1
+            self._overlay_subscribers += int(show_overlay)
+            self._idle_since = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='frame-broadcaster', daemon=True)
+                self.stats['loops_started'] += 1
+                self._thread.start()
+
+    def unsubscribe(self, show_overlay=False):
+        with self._condition:
+            self._subscribers -= 1
+            self._overlay_subscribers -= int(show_overlay)
+            if self._subscribers == 0:
+                self._idle_since = time.time()
+
+    def _should_stop(self):
+        """Called by the loop; clears the thread under the lock so a new subscriber starts a fresh loop"""
+        with self._condition:
+            if self._subscribers == 0 and self._idle_since is not None \
+                    and time.time() - self._idle_since >= self.idle_timeout:
+                self._thread = None
+                self._condition.notify_all()
+                return True
+            return False
+
+    def publish(self, frame_bytes, overlay_bytes=None):
+        with self._condition:
+            self._sequence += 1
+            self._ring.append((self._sequence, frame_bytes, overlay_bytes))
+            self.stats['frames_published'] += 1
+            self._condition.notify_all()
+
+    def wait_for_frame(self, after, timeout=1.0):
+        """Newest (sequence, frame, overlay) published after `after`, or None if nothing new arrived in time"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequence > after or self._thread is None, timeout)
+            if not self._ring or self._ring[-1][0] <= after:
+                return None
+            return self._ring[-1]
+
+    def stream(self, show_overlay=True):
+        """multipart/x-mixed-replace chunks for one client"""
+        self.subscribe(show_overlay)
+        last_sent = 0
+        try:
+            while True:
+                entry = self.wait_for_frame(last_sent)
+                if entry is None:
+                    with self._condition:
+                        if self._thread is None:
+                            # The loop ended (source missing or failed) and published nothing new
+                            return
+                    continue
+                sequence, frame_bytes, overlay_bytes = entry
+                with self._condition:
+                    if last_sent:
+                        self.stats['frames_skipped'] += sequence - last_sent - 1
+                    self.stats['frames_sent'] += 1
+                last_sent = sequence
+                if show_overlay and overlay_bytes:
+                    frame_bytes = overlay_bytes
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        finally:
+            self.unsubscribe(show_overlay)
+
+    def get_stats(self):
+        with self._condition:
+            stats = dict(self.stats)
+            stats.update({'source': self.source, 'subscribers': self._subscribers,
+                          'overlay_subscribers': self._overlay_subscribers, 'running': self._thread is not None})
+        return stats
+
+    def _run(self):
+        try:
+            self._capture()
+        except Exception as e:
+            logger.error(f"Frame broadcaster for {self.source} failed: {str(e)}")
+        finally:
+            with self._condition:
+                # Unless an idle stop already handed over to a newer loop, let the next subscriber start one
+                if self._thread is threading.current_thread():
+                    self._thread = None
+                self._condition.notify_all()
+
+    def _capture(self):
+        if not os.path.exists(self.source):
+            logger.error(f"Video file not found at: {self.source}")
+            return
+
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            logger.error(f"Failed to open video file: {self.source}")
+            return
+
+        logger.info(f"Successfully opened video file: {self.source}")
+        last_process = None
+        scene_detector = self.analysis.scene_detector
+
+        try:
+            while not self._should_stop():
+                success, frame = cap.read()
+                if not success:
+                    logger.info("Video ended, restarting from beginning")
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+
+                current_time = time.time()
+
+                # Encoded once per frame, whatever the number of viewers
+                ret, jpeg = cv2.imencode('.jpg', frame)
+                frame_bytes = jpeg.tobytes()
+                overlay_bytes = self.analysis.composite(frame) if self._overlay_subscribers else None
+
+                if self.analysis.controller.due(last_process, current_time):
+                    last_process = current_time
+                    should_analyze, reason = scene_detector.check(frame, current_time)
+                    if not should_analyze:
+                        # Nothing moved since the last analysis: keep publishing its results
+                        analysis_stats['analyses_skipped'] += 1
+                        mark_analysis_unchanged()
+                    else:
+                        if reason == 'max_age':
+                            analysis_stats['forced_refreshes'] += 1
+                        # Never waits: the worker uploads it in the background
+                        self.analysis.submit(frame, current_time)
+                        analysis_stats['analyses_sent'] += 1
+
+                self.publish(frame_bytes, overlay_bytes)
+                time.sleep(0.033)  # ~30 FPS
+        finally:
+            cap.release()
+            logger.info("Video capture released")
+
+broadcasters = {}
+broadcasters_lock = threading.Lock()
+
+def get_broadcaster(source=SIMULATION_VIDEO):
+    with broadcasters_lock:
+        if source not in broadcasters:
+            broadcasters[source] = FrameBroadcaster(source)
+        return broadcasters[source]
 
 @app.route('/video_feed')
 def video_feed():
     # Get showOverlay parameter from query string, default to True
     showOverlay = request.args.get('showOverlay', 'true').lower() == 'true'
-    stop_event.clear()
-    
+    frames = get_broadcaster().stream(showOverlay)
+
     def stream_frames():
         try:
-            for frame in generate_frames(showOverlay):
+            for frame in frames:
                 yield frame
         except Exception as e:
             logger.error(f"Streaming error: {str(e)}")
-    
+
     response = Response(stream_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
-    
+
     @response.call_on_close
     def on_close():
-        stop_event.set()
-    
+        # Closing the generator unsubscribes this client only
+        frames.close()
+
     return response
 
+@app.route('/stream_stats')
+def get_stream_stats():
+    return jsonify([broadcaster.get_stats() for broadcaster in list(broadcasters.values())])
+
+def analysis_pipeline_stats():
+    return {source: broadcaster.analysis.get_stats() for source, broadcaster in list(broadcasters.items())}
+
 @app.route('/current_analysis')
 def current_analysis():
-    global latest_analysis_results
-    return jsonify(latest_analysis_results if latest_analysis_results else {})
+    results = latest_analysis_results
+    if not results:
+        return jsonify({})
+    return jsonify(dict(results, analysis_pipeline=analysis_pipeline_stats()))
+
+@app.route('/analysis_stats')
+def get_analysis_stats():
+    return jsonify(dict(analysis_stats, pipeline=analysis_pipeline_stats()))
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True, threaded=True)
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""Readers for the results/detections.txt log that never load the whole file.
+
+Pages are read backwards from the end of the file (or from a cursor) in fixed-size blocks, so
+the cost of a page depends on how many lines it has to look at, not on the size of the log.
+A cursor is the byte offset where the oldest line of the previous page starts.
+"""
+import json
+import os
+
+BLOCK_SIZE = 64 * 1024
+
+def parse_detection_line(line):
+    parts = line.split()
+    if len(parts) < 7:
+        return None
+    try:
+        return {
+            'image_name': parts[0],
+            'class_id': int(parts[1]),
+            'confidence': float(parts[2]),
+            'bbox': [int(parts[3]), int(parts[4]), int(parts[5]), int(parts[6])]
+        }
+    except ValueError:
+        return None
+
+class DetectionFilter:
+    """Optional filters on image name, class and confidence range"""
+
+    def __init__(self, image_name=None, class_id=None, min_confidence=None, max_confidence=None):
+        self.image_name = image_name
+        self.class_id = class_id
+        self.min_confidence = min_confidence
+        self.max_confidence = max_confidence
+        self._image_prefix = f'{image_name} '.encode('utf-8') if image_name else None
+
+    def quick_reject(self, raw_line):
+        """Cheap pre-check on the raw bytes before parsing"""
+        return self._image_prefix is not None and not raw_line.startswith(self._image_prefix)
+
+    def __call__(self, detection):
+        if self.image_name is not None and detection['image_name'] != self.image_name:
+            return False
+        if self.class_id is not None and detection['class_id'] != self.class_id:
+            return False
+        if self.min_confidence is not None and detection['confidence'] < self.min_confidence:
+            return False
+        if self.max_confidence is not None and detection['confidence'] > self.max_confidence:
+            return False
+        return True
+
+def iter_lines_reverse(path, end=None, block_size=BLOCK_SIZE):
+    """Yield (start_offset, raw_line) from `end` (default EOF) back to the start of the file"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell() if end is None else min(end, f.tell())
+        remainder = b''
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            chunk = f.read(read_size) + remainder
+            lines = chunk.split(b'\n')
+            # The first piece may be a partial line; keep it for the next block
+            remainder = lines[0]
+            offset = position + len(chunk)
+            for line in reversed(lines[1:]):
+                offset -= len(line) + 1
+                if line.strip():
+                    yield offset + 1, line
+        if remainder.strip():
+            yield 0, remainder
+
+def read_page(path, limit=100, cursor=None, detection_filter=None, skip=0):
+    """Return (detections newest first, next_cursor) for up to `limit` matching lines before `cursor`.
+
+    `skip` drops that many matching lines first (offset pagination); `next_cursor` is None once the
+    start of the log has been reached.
+    """
+    detection_filter = detection_filter or DetectionFilter()
+    detections = []
+    next_cursor = None
+    for start, raw_line in iter_lines_reverse(path, cursor):
+        if detection_filter.quick_reject(raw_line):
+            continue
+        detection = parse_detection_line(raw_line.decode('utf-8', errors='replace'))
+        if detection is None or not detection_filter(detection):
+            continue
+        if skip > 0:
+            skip -= 1
+            continue
+        detections.append(detection)
+        if len(detections) >= limit:
+            next_cursor = start if start > 0 else None
+            break
+    return detections, next_cursor
+
+def iter_detections(path, detection_filter=None, start=0, end=None):
+    """Yield matching detections oldest first, streaming the file line by line"""
+    detection_filter = detection_filter or DetectionFilter()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for raw_line in f:
+            if end is not None and f.tell() > end:
+                break
+            if detection_filter.quick_reject(raw_line):
+                continue
+            detection = parse_detection_line(raw_line.decode('utf-8', errors='replace'))
+            if detection is not None and detection_filter(detection):
+                yield detection
+
+def iter_ndjson(path, detection_filter=None, end=None):
+    """Detections as newline-delimited JSON chunks, for chunked streaming responses"""
+    for detection in iter_detections(path, detection_filter, end=end):
+        yield json.dumps(detection) + '\n'
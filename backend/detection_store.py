@@ -0,0 +1,199 @@
+"""SQLite-backed store for analysis results.
+
+One row per analysis in `analyses` (indexed on image_name, timestamp) plus its raw boxes in
+`detections`. Each analysis is written in a single transaction, and the latest result for an
+image is an index lookup instead of a scan of info.txt.
+
+    python detection_store.py import info.txt [--db parking.db]
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, 'parking.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    image_name TEXT NOT NULL,
+    location_id TEXT,
+    timestamp TEXT NOT NULL,
+    total_spots INTEGER NOT NULL,
+    filled_spots INTEGER NOT NULL,
+    empty_spots INTEGER NOT NULL,
+    occupancy_rate REAL NOT NULL,
+    spots_status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_image_time ON analyses (image_name, timestamp);
+CREATE TABLE IF NOT EXISTS detections (
+    analysis_id INTEGER NOT NULL REFERENCES analyses (id),
+    class_id INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    x_min INTEGER NOT NULL,
+    y_min INTEGER NOT NULL,
+    x_max INTEGER NOT NULL,
+    y_max INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_detections_analysis ON detections (analysis_id);
+"""
+
+def normalize_timestamp(timestamp):
+    """info.txt writes '2024-01-01_12:00:00'; the store keeps '2024-01-01 12:00:00' so both sort together"""
+    return timestamp.replace('_', ' ', 1)
+
+def summarize_detections(detections):
+    """Counts and per-detection spot status computed from raw detections, as info.txt readers did"""
+    total_spots = len(detections)
+    filled_spots = sum(1 for d in detections if d['class_id'] == 2)
+    empty_spots = sum(1 for d in detections if d['class_id'] == 1)
+    return {
+        'total_spots': total_spots,
+        'filled_spots': filled_spots,
+        'empty_spots': empty_spots,
+        'occupancy_rate': float((filled_spots / total_spots * 100) if total_spots > 0 else 0),
+        'spots_status': [{'id': i + 1, 'status': 'filled' if d['class_id'] == 2 else 'empty'}
+                         for i, d in enumerate(detections)]
+    }
+
+class SQLiteStore:
+    """Thread-local WAL connections to one SQLite file, creating `schema` on first use"""
+
+    schema = ''
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(self.schema)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+class DetectionStore(SQLiteStore):
+    schema = SCHEMA
+
+    def _insert(self, conn, image_name, timestamp, detections, summary, location_id):
+        cursor = conn.execute(
+            "INSERT INTO analyses (image_name, location_id, timestamp, total_spots, filled_spots, empty_spots, "
+            "occupancy_rate, spots_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (image_name, location_id, normalize_timestamp(timestamp), summary['total_spots'], summary['filled_spots'],
+             summary['empty_spots'], summary['occupancy_rate'], json.dumps(summary.get('spots_status', [])))
+        )
+        analysis_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO detections (analysis_id, class_id, confidence, x_min, y_min, x_max, y_max) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(analysis_id, d['class_id'], d['confidence'], *[int(v) for v in d['bbox']]) for d in detections]
+        )
+        return analysis_id
+
+    def add_analysis(self, image_name, timestamp, detections, summary=None, location_id=None):
+        """Write one analysis and all of its detections in a single transaction"""
+        summary = summary or summarize_detections(detections)
+        conn = self._connection()
+        with conn:
+            return self._insert(conn, image_name, timestamp, detections, summary, location_id)
+
+    def latest(self, image_name):
+        """Most recent analysis recorded for an image name, or None"""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT * FROM analyses WHERE image_name = ? ORDER BY timestamp DESC, id DESC LIMIT 1",
+            (image_name,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        detections = [{
+            'image_name': row['image_name'],
+            'timestamp': row['timestamp'],
+            'confidence': d['confidence'],
+            'class_id': d['class_id'],
+            'bbox': [d['x_min'], d['y_min'], d['x_max'], d['y_max']]
+        } for d in conn.execute(
+            "SELECT class_id, confidence, x_min, y_min, x_max, y_max FROM detections WHERE analysis_id = ? ORDER BY rowid",
+            (row['id'],)
+        )]
+        return {
+            'total_spots': row['total_spots'],
+            'filled_spots': row['filled_spots'],
+            'empty_spots': row['empty_spots'],
+            'occupancy_rate': row['occupancy_rate'],
+            'spots_status': json.loads(row['spots_status']) if row['spots_status'] else [],
+            'detections': detections,
+            'timestamp': row['timestamp']
+        }
+
+    def iter_occupancy(self):
+        """Yield (location_id, timestamp, occupancy_rate) for every stored analysis"""
+        for row in self._connection().execute(
+                "SELECT COALESCE(location_id, image_name) AS location_id, timestamp, occupancy_rate FROM analyses"):
+            yield row['location_id'], row['timestamp'], row['occupancy_rate']
+
+    def import_info_file(self, info_path, batch_size=500):
+        """Stream an info.txt log into the store, committing every `batch_size` analyses"""
+        conn = self._connection()
+        imported = 0
+        for image_name, timestamp, detections in iter_info_analyses(info_path):
+            self._insert(conn, image_name, timestamp, detections, summarize_detections(detections), None)
+            imported += 1
+            if imported % batch_size == 0:
+                conn.commit()
+        conn.commit()
+        return imported
+
+def iter_info_analyses(info_path):
+    """Yield (image_name, timestamp, detections) per analysis of an info.txt log in one streaming pass.
+
+    Consecutive lines with the same image name and timestamp form one analysis.
+    """
+    current_key = None
+    current = []
+    with open(info_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 8:
+                continue
+            image_name, timestamp, confidence, class_id, x_min, y_min, x_max, y_max = parts[:8]
+            key = (image_name, timestamp)
+            if key != current_key:
+                if current:
+                    yield current_key[0], current_key[1], current
+                current_key = key
+                current = []
+            current.append({
+                'class_id': int(class_id),
+                'confidence': float(confidence),
+                'bbox': [int(x_min), int(y_min), int(x_max), int(y_max)]
+            })
+    if current:
+        yield current_key[0], current_key[1], current
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    importer = subparsers.add_parser('import', help='import an existing info.txt log')
+    importer.add_argument('info_path')
+    importer.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    store = DetectionStore(args.db)
+    count = store.import_info_file(args.info_path)
+    print(f"Imported {count} analyses from {args.info_path} into {args.db}")
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,5 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 import os
-import numpy as np
-import cv2
 import time
 from datetime import datetime
 import json
@@ -11,11 +9,27 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import logging
 import torch
-import base64
+import uuid
 from io import BytesIO
 
 from parking_spot_overlay import ParkingSpotOverlay
-from newer import predict, crop, compile_data
+from newer import model, backend as inference_backend, detect_batch, decode_image, decode_image_for, image_to_tensor, MODEL_VERSION
+from frame_context import FrameContext
+from overlay_cache import OverlayCache, KEY_PATTERN
+from inference_cache import InferenceCache, settings_key
+from inference_scheduler import BatchingScheduler
+from worker_pool import InferencePool, load_tuned_config
+from tiling import TileConfig, TiledDetector
+from camera_settings import CameraSettings, CAMERA_SETTINGS_PATH
+from spot_map import SpotMapManager, load_classifier, classify_spots
+from spot_tracker import SpotTrackerRegistry, summarize_spots
+from detection_store import DetectionStore
+from detection_log import DetectionFilter, read_page, iter_ndjson
+from rollups import RollupStore
+from state_cache import LatestStateCache
+from video_jobs import VideoJobManager, ndjson_stream, sse_stream
+from video_pipeline import VideoPipeline
+from video_reader import iter_sampled_frames, estimate_sample_count, spool_upload
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,6 +49,42 @@ MAX_CONTENT_LENGTH = 100 * 1024 * 1024
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, 'final_model.pth')
 INFO_PATH = os.path.join(BASE_DIR, 'info.txt')
+DB_PATH = os.environ.get('DETECTION_DB_PATH', os.path.join(BASE_DIR, 'parking.db'))
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 8))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 20))
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 0))
+INFERENCE_THREADS_PER_WORKER = int(os.environ.get('INFERENCE_THREADS_PER_WORKER', 0))
+INFERENCE_TIMEOUT_S = float(os.environ.get('INFERENCE_TIMEOUT_S', 120))  # A batch sent to a worker process
+TILE_ROWS = int(os.environ.get('TILE_ROWS', 2))
+TILE_COLS = int(os.environ.get('TILE_COLS', 2))
+TILE_OVERLAP = float(os.environ.get('TILE_OVERLAP', 0.15))
+# Detector resize per tile; unset means the loaded model's own (e.g. 800/1333, or 320/640 for mobilenet_320)
+TILE_MIN_SIZE = int(os.environ['TILE_MIN_SIZE']) if os.environ.get('TILE_MIN_SIZE') else None
+TILE_MAX_SIZE = int(os.environ['TILE_MAX_SIZE']) if os.environ.get('TILE_MAX_SIZE') else None
+REDUCED_DECODE = os.environ.get('REDUCED_DECODE', '1') == '1'
+SPOT_MAP_MODE = os.environ.get('SPOT_MAP_MODE', '0') == '1'
+SPOT_MAP_MAX_AGE_S = float(os.environ.get('SPOT_MAP_MAX_AGE_S', 24 * 3600))
+SPOT_MAP_RECALIBRATE_EVERY = int(os.environ.get('SPOT_MAP_RECALIBRATE_EVERY', 500))
+TRACKER_CONFIRM_FRAMES = int(os.environ.get('TRACKER_CONFIRM_FRAMES', 3))
+TRACKER_REDETECT_EVERY = int(os.environ.get('TRACKER_REDETECT_EVERY', 10))
+STATUS_STALE_AFTER_S = float(os.environ.get('STATUS_STALE_AFTER_S', 60))
+STATUS_MAX_WAIT_S = 30.0
+VIDEO_SAMPLE_INTERVAL_S = float(os.environ.get('VIDEO_SAMPLE_INTERVAL_S', 15))
+VIDEO_PIPELINE_BATCH_SIZE = int(os.environ.get('VIDEO_PIPELINE_BATCH_SIZE', 4))
+VIDEO_PIPELINE_QUEUE_SIZE = int(os.environ.get('VIDEO_PIPELINE_QUEUE_SIZE', 8))
+VIDEO_POST_WORKERS = int(os.environ.get('VIDEO_POST_WORKERS', 2))
+VIDEO_JOB_WORKERS = int(os.environ.get('VIDEO_JOB_WORKERS', 1))
+VIDEO_JOB_MAX_KEPT = int(os.environ.get('VIDEO_JOB_MAX_KEPT', 20))
+VIDEO_JOB_STREAM_TIMEOUT_S = float(os.environ.get('VIDEO_JOB_STREAM_TIMEOUT_S', 600))  # Without a new frame
+OVERLAY_CACHE_MAX_MB = float(os.environ.get('OVERLAY_CACHE_MAX_MB', 64))
+OVERLAY_CACHE_DIR = os.environ.get('OVERLAY_CACHE_DIR') or None
+OVERLAY_CACHE_DISK_MAX_MB = float(os.environ.get('OVERLAY_CACHE_DISK_MAX_MB', 512))
+INFERENCE_CACHE = os.environ.get('INFERENCE_CACHE', '1') == '1'
+INFERENCE_CACHE_MAX_MB = float(os.environ.get('INFERENCE_CACHE_MAX_MB', 64))
+INFERENCE_CACHE_DIR = os.environ.get('INFERENCE_CACHE_DIR') or None
+INFERENCE_CACHE_DISK_MAX_MB = float(os.environ.get('INFERENCE_CACHE_DISK_MAX_MB', 512))
+# Overlay URLs are content hashes, so clients may keep them indefinitely
+OVERLAY_MAX_AGE_S = 365 * 24 * 3600
 
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
@@ -45,16 +95,12 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def log_detection_to_file(image_name, detections):
+    # The trailing analysis id tells apart analyses of uploads that share a name
+    analysis_id = uuid.uuid4().hex[:12]
     with open(os.path.join(RESULTS_FOLDER, DETECTION_LOG), 'a') as f:
         for detection in detections:
             f.write(f"{image_name} {detection['class_id']} {detection['confidence']:.4f} "
-                   f"{detection['bbox'][0]} {detection['bbox'][1]} {detection['bbox'][2]} {detection['bbox'][3]}\n")
-
-def save_image_temp(file_data, temp_path):
-    nparr = np.frombuffer(file_data, np.uint8)
-    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    cv2.imwrite(temp_path, image)
-    return temp_path
+                   f"{detection['bbox'][0]} {detection['bbox'][1]} {detection['bbox'][2]} {detection['bbox'][3]} {analysis_id}\n")
 
 def get_parking_info_from_file(image_name):
     """Read parking spot info from info.txt for the most recent entry of a given image name"""
@@ -113,10 +159,149 @@ def get_parking_info_from_file(image_name):
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
-    default_limits=["500 per minute", "1000 per hour"]
+    default_limits=["500 per minute", "1000 per hour"],
+    # Retry-After on 429s lets clients such as camera_simulator back off for exactly as long as needed
+    headers_enabled=True
 )
 
 overlay_handler = ParkingSpotOverlay()
+detection_store = DetectionStore(DB_PATH)
+rollup_store = RollupStore(DB_PATH)
+state_cache = LatestStateCache()
+overlay_cache = OverlayCache(
+    max_bytes=int(OVERLAY_CACHE_MAX_MB * 1024 * 1024),
+    disk_dir=OVERLAY_CACHE_DIR,
+    disk_max_bytes=int(OVERLAY_CACHE_DISK_MAX_MB * 1024 * 1024)
+)
+inference_cache = InferenceCache(
+    MODEL_VERSION,
+    max_bytes=int(INFERENCE_CACHE_MAX_MB * 1024 * 1024),
+    disk_dir=INFERENCE_CACHE_DIR,
+    disk_max_bytes=int(INFERENCE_CACHE_DISK_MAX_MB * 1024 * 1024)
+) if INFERENCE_CACHE else None
+camera_settings = CameraSettings(os.environ.get('CAMERA_SETTINGS_PATH', CAMERA_SETTINGS_PATH))
+tiled_detector = TiledDetector(
+    detect_batch,
+    TileConfig(rows=TILE_ROWS, cols=TILE_COLS, overlap=TILE_OVERLAP).with_resolution(
+        *inference_backend.resolution()).with_resolution(TILE_MIN_SIZE, TILE_MAX_SIZE)
+)
+
+def create_inference_pool():
+    """Forked worker processes when INFERENCE_WORKERS (or a tuned inference_pool.json) asks for them"""
+    workers, threads = INFERENCE_WORKERS, INFERENCE_THREADS_PER_WORKER
+    if 'INFERENCE_WORKERS' not in os.environ:
+        tuned = load_tuned_config()
+        if tuned:
+            workers, threads = tuned['workers'], tuned['threads_per_worker']
+    if workers < 1:
+        return None
+    # Fork before any inference thread starts so no lock is copied while held
+    return InferencePool(tiled_detector, workers, threads or None, shared=[model], timeout=INFERENCE_TIMEOUT_S)
+
+inference_pool = create_inference_pool()
+inference_scheduler = BatchingScheduler(
+    inference_pool.run if inference_pool is not None else tiled_detector,
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+    concurrency=len(inference_pool.workers) if inference_pool is not None else 1
+)
+
+spot_classifier = load_classifier()
+
+def create_spot_map_manager():
+    if not SPOT_MAP_MODE:
+        return None
+    if spot_classifier is None:
+        logger.warning("SPOT_MAP_MODE is set but no trained spot classifier was found; using the full detector")
+        return None
+    return SpotMapManager(spot_classifier, max_age=SPOT_MAP_MAX_AGE_S, recalibrate_every=SPOT_MAP_RECALIBRATE_EVERY)
+
+spot_map_manager = create_spot_map_manager()
+spot_trackers = SpotTrackerRegistry(confirm_frames=TRACKER_CONFIRM_FRAMES)
+
+def tile_config_for(location_id):
+    """The tiling config with the camera's own inference resolution, when one is set"""
+    resolution = camera_settings.resolution(location_id) if location_id else None
+    if resolution is None:
+        return tiled_detector.config
+    return tiled_detector.config.with_resolution(*resolution)
+
+def decode_upload(file_data, location_id=None):
+    """Decode upload bytes for the camera's detector resolution; returns (BGR image, factor to full resolution)"""
+    if REDUCED_DECODE:
+        return decode_image_for(file_data, tile_config_for(location_id))
+    return decode_image(file_data), 1.0
+
+def submit_detection(frame, image_tensor, config):
+    """Future for the full detector's output on a frame, from the inference cache when this frame was seen before"""
+    if inference_cache is None:
+        return inference_scheduler.submit((image_tensor, config))
+    key = inference_cache.key(frame.content_key(), settings_key(config))
+    return inference_cache.get_or_submit(key, lambda: inference_scheduler.submit((image_tensor, config)))
+
+def shortcut_detect(image_tensor, location_id=None, factor=1.0, offset=0):
+    """Detector-style output from the tracked spots of a location, or None when the full detector must run.
+
+    When every tracked spot of the location has been confirmed over the last
+    TRACKER_CONFIRM_FRAMES analyses, the known spots are classified instead; the full detector
+    still runs every TRACKER_REDETECT_EVERY frames so new spots are picked up. `offset` is the
+    frame's position in a batch that the tracker has not seen yet.
+    """
+    if spot_classifier is not None and location_id:
+        tracker = spot_trackers.get(location_id)
+        if tracker.can_skip_detection() and (tracker.frames + offset) % TRACKER_REDETECT_EVERY != 0:
+            # Tracked boxes are in full-resolution coordinates
+            boxes = torch.from_numpy(tracker.tracked_boxes()) / factor
+            return classify_spots(image_tensor, boxes, spot_classifier)
+    return None
+
+def detect_frames(frames, location_id=None):
+    """Set the detector output of each FrameContext, avoiding the full detector where the camera's spots are known.
+
+    With a spot map the known spots are classified (see SpotMapManager); otherwise frames whose
+    tracked spots are confirmed are. All full-detector frames are submitted before waiting so
+    they share a batch. Outputs are in the coordinates of each frame's decoded image. Frames seen
+    before are answered from the inference cache, and identical frames in flight at the same
+    time share one detector run.
+    """
+    config = tile_config_for(location_id)
+    image_tensors = [image_to_tensor(frame.image) for frame in frames]
+    if spot_map_manager is not None and location_id:
+        outputs = spot_map_manager.detect_batch(
+            location_id, image_tensors, lambda i, tensor: submit_detection(frames[i], tensor, config))
+        for frame, output in zip(frames, outputs):
+            frame.output = output
+        return frames
+
+    for i, (frame, image_tensor) in enumerate(zip(frames, image_tensors)):
+        frame.output = shortcut_detect(image_tensor, location_id, frame.factor, offset=i)
+    futures = {i: submit_detection(frame, image_tensor, config)
+               for i, (image_tensor, frame) in enumerate(zip(image_tensors, frames)) if frame.output is None}
+    for i, future in futures.items():
+        frames[i].output = future.result()
+    return frames
+
+def publish_state(location_id, result):
+    """Make an analysis result the live state served by /api/parking_status"""
+    state_cache.update(location_id, {
+        'total_spots': result['total_spots'],
+        'filled_spots': result['filled_spots'],
+        'empty_spots': result['empty_spots'],
+        'occupancy_rate': result['occupancy_rate'],
+        'spots_status': result['spots_status'],
+        'last_updated': result['timestamp']
+    })
+
+def get_location_id(filename):
+    """Camera/location an upload belongs to: the location_id form field, else the upload's base name"""
+    return request.form.get('location_id') or os.path.splitext(filename)[0]
+
+def wants_inline_overlay():
+    """Whether the client asked (inline=true, as a query or form field) for base64 overlays in the JSON"""
+    return request.values.get('inline', 'false').lower() in ('1', 'true', 'yes')
+
+def overlay_url(frame):
+    return f'/api/overlays/{frame.cache_overlay()}.jpg'
 
 @app.errorhandler(404)
 def not_found(error):
@@ -152,134 +337,198 @@ def analyze_video():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Invalid video format'}), 400
 
+    video_path = None
     try:
         filename = secure_filename(file.filename)
-        file_data = file.read()
-        nparr = np.frombuffer(file_data, np.uint8)
-        results = process_video(nparr, filename)
-        
-        for i, frame_result in enumerate(results):
-            if 'frame_data' in frame_result and 'detections' in frame_result:
-                overlay_image = overlay_handler.create_overlay_image(
-                    frame_result['frame_data'],
-                    frame_result['detections'],
-                    confidence_threshold=0.5
-                )
-                frame_result['overlay_image'] = base64.b64encode(overlay_image).decode('utf-8')
+        video_path = os.path.join(UPLOAD_FOLDER, f'{uuid.uuid4().hex}_{filename}')
+        spool_upload(file.stream, video_path)
+
+        inline = wants_inline_overlay()
+
+        def add_overlay(frame_result, frame):
+            frame_result['overlay_url'] = overlay_url(frame)
+            if inline:
+                frame_result['overlay_image'] = frame.overlay_base64()
+            return frame_result
+
+        pipeline = process_video(video_path, filename, get_location_id(filename), add_overlay)
+        results = list(pipeline)
                 
         return jsonify({
             'total_frames': len(results),
             'results': results,
-            'average_occupancy': sum(r['occupancy_rate'] for r in results) / len(results) if results else 0
+            'average_occupancy': sum(r['occupancy_rate'] for r in results) / len(results) if results else 0,
+            'timing': pipeline.report()
         })
     except Exception as e:
         logger.error(f'Video processing error: {str(e)}')
         return jsonify({'error': 'Failed to process video'}), 500
+    finally:
+        if video_path and os.path.exists(video_path):
+            os.remove(video_path)
+
+def process_video(video_path, original_filename, location_id=None, post_fn=None):
+    """Pipeline over the sampled frames of a video; iterating it yields post_fn(frame_result, frame) per frame.
+
+    `frame` is the frame's FrameContext, with its detector output set.
+
+    Frames are decoded, detected in batches, tracked, post-processed (overlays) and recorded to the
+    detection log, store, rollups and live state on separate stages; see video_pipeline.
+    """
+    base_name = os.path.splitext(original_filename)[0]
+    location = location_id or base_name
+
+    def analyze(batch):
+        detect_frames([frame for _, _, frame in batch], location_id)
+        frame_results = []
+        for frame_number, video_time_s, frame in batch:
+            detections = frame.detections
+            spots = spot_trackers.update(location, detections)
+
+            frame_result = summarize_spots(spots)
+            frame_result.update({
+                'detections': detections,
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'frame_number': frame_number,
+                'video_time_s': round(video_time_s, 3)
+            })
+            frame_results.append(frame_result)
+        return frame_results
+
+    def record(frame_result):
+        frame_name = f"{base_name}_frame_{frame_result['frame_number']}"
+        log_detection_to_file(frame_name, frame_result['detections'])
+        detection_store.add_analysis(frame_name, frame_result['timestamp'], frame_result['detections'], frame_result, location_id)
+        rollup_store.record(location, frame_result['timestamp'], frame_result['occupancy_rate'])
+        publish_state(location, frame_result)
+
+    frames = ((frame_number, video_time_s, FrameContext(image, overlay=overlay_handler, cache=overlay_cache))
+              for frame_number, video_time_s, image in iter_sampled_frames(video_path, VIDEO_SAMPLE_INTERVAL_S))
+    return VideoPipeline(
+        frames,
+        analyze,
+        post_fn or (lambda frame_result, frame: frame_result),
+        record,
+        batch_size=VIDEO_PIPELINE_BATCH_SIZE,
+        queue_size=VIDEO_PIPELINE_QUEUE_SIZE,
+        post_workers=VIDEO_POST_WORKERS
+    )
+
+def run_video_job(job):
+    """Analyze a job's video, writing each frame's overlay to disk so only summaries stay in memory"""
+    job.set_expected(estimate_sample_count(job.video_path, VIDEO_SAMPLE_INTERVAL_S))
+
+    def write_overlay(frame_result, frame):
+        frame_number = frame_result['frame_number']
+        with open(job.overlay_path(frame_number), 'wb') as f:
+            f.write(frame.overlay_jpeg())
+        frame_result['overlay_url'] = f'/api/video_jobs/{job.id}/frames/{frame_number}/overlay.jpg'
+        return frame_result
+
+    pipeline = process_video(job.video_path, job.filename, job.location_id, write_overlay)
+    for frame_result in pipeline:
+        job.add_result(frame_result)
+    job.timing = pipeline.report()
+    logger.info(f"Video job {job.id} finished: {job.timing}")
+
+video_jobs = VideoJobManager(
+    run_video_job,
+    os.path.join(RESULTS_FOLDER, 'video_jobs'),
+    max_workers=VIDEO_JOB_WORKERS,
+    max_jobs=VIDEO_JOB_MAX_KEPT
+)
 
-def process_video(video_data, original_filename):
-    results = []
-    cap = cv2.VideoCapture(video_data)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_interval = int(fps * 15)
+@app.route('/api/video_jobs', methods=['POST'])
+@limiter.limit("2 per minute")
+def create_video_job():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No video file provided'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No video selected'}), 400
+
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Invalid video format'}), 400
 
     try:
-        frame_count = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            if frame_count % frame_interval == 0:
-                base_name = os.path.splitext(original_filename)[0]
-                temp_path = os.path.join(UPLOAD_FOLDER, f'{base_name}_frame_{frame_count}.jpg')
-                cv2.imwrite(temp_path, frame)
-                
-                all_predictions = predict(temp_path)
-                if len(all_predictions) >= 100:
-                    cropped_path = crop(temp_path, all_predictions)
-                    cropped_predictions = predict(cropped_path)
-                    all_predictions.extend(cropped_predictions)
-                
-                detections = [{'class_id': pred['label'], 'confidence': pred['confidence'], 'bbox': [int(x) for x in pred['box'].tolist()]} for pred in all_predictions]
-                
-                total_spots = len(detections)
-                filled_spots = sum(1 for d in detections if d['class_id'] == 2)
-                empty_spots = sum(1 for d in detections if d['class_id'] == 1)
-
-                spots_status = [{'id': i + 1, 'status': 'filled' if d['class_id'] == 2 else 'empty'} for i, d in enumerate(detections)]
-
-                _, buffer = cv2.imencode('.jpg', frame)
-                frame_data = buffer.tobytes()
-                frame_result = {
-                    'total_spots': total_spots,
-                    'filled_spots': filled_spots,
-                    'empty_spots': empty_spots,
-                    'occupancy_rate': float((filled_spots / total_spots * 100) if total_spots > 0 else 0),
-                    'spots_status': spots_status,
-                    'detections': detections,
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'frame_data': frame_data
-                }
-                results.append(frame_result)
-                
-                frame_name = f"{base_name}_frame_{frame_count}"
-                log_detection_to_file(frame_name, detections)
-                compile_data(temp_path, all_predictions)
-                
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-            
-            frame_count += 1
-            
-    finally:
-        cap.release()
-        
-    return results
+        filename = secure_filename(file.filename)
+        job = video_jobs.create(filename, get_location_id(filename))
+        spool_upload(file.stream, job.video_path)
+        video_jobs.start(job)
+
+        status = job.to_dict()
+        status.update({
+            'status_url': f'/api/video_jobs/{job.id}',
+            'results_url': f'/api/video_jobs/{job.id}/results'
+        })
+        return jsonify(status), 202
+    except Exception as e:
+        logger.error(f'Failed to start video job: {str(e)}')
+        return jsonify({'error': 'Failed to start video job'}), 500
+
+@app.route('/api/video_jobs/<job_id>', methods=['GET'])
+def get_video_job(job_id):
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'No video job {job_id}'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/video_jobs/<job_id>/results', methods=['GET'])
+def stream_video_job_results(job_id):
+    """Per-frame results as NDJSON (or SSE with format=sse), streamed as frames finish"""
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'No video job {job_id}'}), 404
 
-def analyze_parking_image(file_data, original_filename):
+    try:
+        start = max(0, int(request.args.get('start', 0)))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+
+    results = job.iter_results(start, idle_timeout=VIDEO_JOB_STREAM_TIMEOUT_S)
+    if request.args.get('format') == 'sse':
+        return Response(sse_stream(results, job, start), mimetype='text/event-stream')
+    return Response(ndjson_stream(results), mimetype='application/x-ndjson')
+
+@app.route('/api/video_jobs/<job_id>/frames/<int:frame_number>/overlay.jpg', methods=['GET'])
+def get_video_job_overlay(job_id, frame_number):
+    job = video_jobs.get(job_id)
+    if job is None or not os.path.exists(job.overlay_path(frame_number)):
+        return jsonify({'error': 'Overlay not found'}), 404
+    return send_from_directory(job.work_dir, os.path.basename(job.overlay_path(frame_number)), mimetype='image/jpeg')
+
+def analyze_parking_image(file_data, original_filename, location_id=None, inline_overlay=False):
+    """Detect, track and record one uploaded image; the overlay is returned as a URL, and inline too if asked"""
     try:
         start_time = time.time()
         
         base_name = os.path.splitext(original_filename)[0]
-        temp_path = os.path.join(UPLOAD_FOLDER, f'{base_name}.jpg')
-        save_image_temp(file_data, temp_path)
-        
-        all_predictions = predict(temp_path)
-        if len(all_predictions) >= 100:
-            cropped_path = crop(temp_path, all_predictions)
-            cropped_predictions = predict(cropped_path)
-            all_predictions.extend(cropped_predictions)
+        image, factor = decode_upload(file_data, location_id)
+        # Carries the decoded frame, detections and overlay through the request, each computed once
+        frame = FrameContext(image, factor, overlay=overlay_handler, cache=overlay_cache, source=file_data)
+        detect_frames([frame], location_id)
         
-        detections = [{'class_id': pred['label'], 'confidence': pred['confidence'], 'bbox': [int(x) for x in pred['box'].tolist()]} for pred in all_predictions]
-        
-        total_spots = len(detections)
-        filled_spots = sum(1 for d in detections if d['class_id'] == 2)
-        empty_spots = sum(1 for d in detections if d['class_id'] == 1)
-
-        spots_status = [{'id': i + 1, 'status': 'filled' if d['class_id'] == 2 else 'empty'} for i, d in enumerate(detections)]
+        detections = frame.detections
+        spots = spot_trackers.update(location_id or base_name, detections)
 
-        log_detection_to_file(base_name, detections)
-        compile_data(temp_path, all_predictions)
-
-        result = {
-            'total_spots': total_spots,
-            'filled_spots': filled_spots,
-            'empty_spots': empty_spots,
-            'occupancy_rate': float((filled_spots / total_spots * 100) if total_spots > 0 else 0),
-            'spots_status': spots_status,
+        result = summarize_spots(spots)
+        result.update({
             'detections': detections,
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        
-        nparr = np.frombuffer(file_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        overlay_image = overlay_handler.create_overlay_image(file_data, detections, confidence_threshold=0.5)
-        result['overlay_image'] = base64.b64encode(overlay_image).decode('utf-8')
+        })
+
+        log_detection_to_file(base_name, detections)
+        detection_store.add_analysis(base_name, result['timestamp'], detections, result, location_id)
+        rollup_store.record(location_id or base_name, result['timestamp'], result['occupancy_rate'])
+        publish_state(location_id or base_name, result)
         
-        logger.info(f"Image processed in {time.time() - start_time:.2f} seconds with {total_spots} spots")
+        # The overlay is drawn at the decoded resolution
+        result['overlay_url'] = overlay_url(frame)
+        if inline_overlay:
+            result['overlay_image'] = frame.overlay_base64()
         
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        logger.info(f"Image processed in {time.time() - start_time:.2f} seconds with {result['total_spots']} spots")
         
         return result
     except Exception as e:
@@ -288,7 +537,15 @@ def analyze_parking_image(file_data, original_filename):
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'inference': inference_scheduler.get_stats(),
+        'inference_workers': inference_pool.get_stats() if inference_pool is not None else None,
+        'spot_map': spot_map_manager.get_stats() if spot_map_manager is not None else None,
+        'overlay_cache': overlay_cache.get_stats(),
+        'inference_cache': inference_cache.get_stats() if inference_cache is not None else None
+    })
 
 @app.route('/api/analyze', methods=['POST'])
 @limiter.limit("10 per second")
@@ -307,25 +564,69 @@ def analyze_parking():
         filename = secure_filename(file.filename)
         file_data = file.read()
         
-        # Process the image and save to info.txt
-        analyze_parking_image(file_data, filename)
-        
-        # Read the results from info.txt
-        results = get_parking_info_from_file(filename)
-        if not results:
-            return jsonify({'error': f'No data found in info.txt for {filename}'}), 404
-        
-        # Generate overlay image
-        nparr = np.frombuffer(file_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        overlay_image = overlay_handler.create_overlay_image(file_data, results['detections'], confidence_threshold=0.5)
-        results['overlay_image'] = base64.b64encode(overlay_image).decode('utf-8')
+        # Process the image; the result is stored and returned from memory
+        results = analyze_parking_image(file_data, filename, get_location_id(filename), wants_inline_overlay())
         
         return jsonify(results)
     except Exception as e:
         logger.error(f'Error processing image: {str(e)}')
         return jsonify({'error': 'Failed to process image'}), 500
 
+@app.route('/api/overlays/<key>.jpg', methods=['GET'])
+def get_overlay(key):
+    """A rendered overlay by content hash; the hash is the ETag, so revalidation never needs the bytes"""
+    if not KEY_PATTERN.match(key):
+        return jsonify({'error': 'Overlay not found'}), 404
+    if key in request.if_none_match:
+        response = Response(status=304)
+    else:
+        data = overlay_cache.get(key)
+        if data is None:
+            return jsonify({'error': 'Overlay not found'}), 404
+        response = Response(data, mimetype='image/jpeg')
+    response.set_etag(key)
+    response.cache_control.public = True
+    response.cache_control.max_age = OVERLAY_MAX_AGE_S
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/api/cameras/<location_id>/settings', methods=['GET'])
+def get_camera_settings(location_id):
+    config = tile_config_for(location_id)
+    return jsonify({
+        'location_id': location_id,
+        'min_size': config.min_size,
+        'max_size': config.max_size,
+        'custom_resolution': camera_settings.resolution(location_id) is not None
+    })
+
+@app.route('/api/cameras/<location_id>/settings', methods=['PUT'])
+def update_camera_settings(location_id):
+    """Set (or with nulls, clear) a camera's inference resolution: {"min_size": 320, "max_size": 1333}"""
+    data = request.get_json(silent=True) or {}
+    min_size, max_size = data.get('min_size'), data.get('max_size')
+    try:
+        if min_size is not None or max_size is not None:
+            config = tiled_detector.config.with_resolution(min_size, max_size)
+            if not inference_backend.supports_resolution(config.min_size, config.max_size):
+                return jsonify({'error': f"The {inference_backend.name} inference backend cannot run at "
+                                         f"min_size={config.min_size}, max_size={config.max_size}"}), 400
+        camera_settings.set_resolution(location_id, min_size, max_size)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    return get_camera_settings(location_id)
+
+@app.route('/api/latest_analysis', methods=['GET'])
+def get_latest_analysis():
+    image_name = request.args.get('image_name')
+    if not image_name:
+        return jsonify({'error': 'image_name parameter is required'}), 400
+
+    result = detection_store.latest(os.path.splitext(secure_filename(image_name))[0])
+    if not result:
+        return jsonify({'error': f'No analysis found for {image_name}'}), 404
+    return jsonify(result)
+
 @app.route('/videos/<path:filename>')
 def serve_video(filename):
     return send_from_directory(os.path.join(app.static_folder, 'videos'), filename)
@@ -339,14 +640,18 @@ def get_statistics():
     if not location_id:
         return jsonify({'error': 'location_id parameter is required'}), 400
     
+    try:
+        rollup = rollup_store.statistics(location_id, start_date, end_date)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid date: {str(e)}'}), 400
+    if not rollup:
+        return jsonify({'error': f'No statistics recorded for {location_id}'}), 404
+
     stats = {
         'location_id': location_id,
-        'period': {'start': start_date or 'all time', 'end': end_date or 'current date'},
-        'average_occupancy': 65.3,
-        'peak_hours': ['08:00-09:00', '17:00-18:00'],
-        'lowest_occupancy_hours': ['03:00-04:00', '22:00-23:00'],
-        'total_records': 287
+        'period': {'start': start_date or 'all time', 'end': end_date or 'current date'}
     }
+    stats.update(rollup)
     return jsonify(stats)
 
 @app.route('/api/parking_status', methods=['GET'])
@@ -355,38 +660,60 @@ def get_current_status():
     if not location_id:
         return jsonify({'error': 'location_id parameter is required'}), 400
     
-    status = {
-        'location_id': location_id,
-        'total_spots': 10,
-        'filled_spots': 6,
-        'empty_spots': 4,
-        'occupancy_rate': 60.0,
-        'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
+    since = request.args.get('since')
+    try:
+        if since is not None:
+            # Long-poll: hold the request until a newer analysis arrives or the wait expires
+            timeout = min(float(request.args.get('timeout', STATUS_MAX_WAIT_S)), STATUS_MAX_WAIT_S)
+            entry = state_cache.wait_for_update(location_id, int(since), timeout)
+        else:
+            entry = state_cache.get(location_id)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+
+    if not entry:
+        return jsonify({'error': f'No analysis recorded for {location_id}'}), 404
+
+    age = time.time() - entry['updated_at']
+    status = {'location_id': location_id}
+    status.update(entry['state'])
+    status.update({
+        'version': entry['version'],
+        'age_seconds': round(age, 3),
+        'stale': age > STATUS_STALE_AFTER_S,
+        'changed': since is None or entry['version'] > int(since)
+    })
     return jsonify(status)
 
 @app.route('/api/detections', methods=['GET'])
 def get_detections():
     try:
-        limit = int(request.args.get('limit', 100))
-        if not os.path.exists(os.path.join(RESULTS_FOLDER, DETECTION_LOG)):
+        log_path = os.path.join(RESULTS_FOLDER, DETECTION_LOG)
+        if not os.path.exists(log_path):
             return jsonify({'error': 'No detections recorded yet'}), 404
-        
-        detections = []
-        with open(os.path.join(RESULTS_FOLDER, DETECTION_LOG), 'r') as f:
-            lines = f.readlines()[-limit:]
-            for line in lines:
-                parts = line.strip().split()
-                if len(parts) >= 8:
-                    detection = {
-                        'image_name': parts[0],
-                        'class_id': int(parts[1]),
-                        'confidence': float(parts[2]),
-                        'bbox': [int(parts[3]), int(parts[4]), int(parts[5]), int(parts[6])]
-                    }
-                    detections.append(detection)
-        
-        return jsonify({'detections': detections, 'count': len(detections)})
+
+        limit = max(1, min(int(request.args.get('limit', 100)), 10000))
+        offset = max(0, int(request.args.get('offset', 0)))
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+        class_id = request.args.get('class_id')
+        min_confidence = request.args.get('min_confidence')
+        max_confidence = request.args.get('max_confidence')
+        detection_filter = DetectionFilter(
+            image_name=request.args.get('image_name') or None,
+            class_id=int(class_id) if class_id else None,
+            min_confidence=float(min_confidence) if min_confidence else None,
+            max_confidence=float(max_confidence) if max_confidence else None
+        )
+
+        if request.args.get('stream', 'false').lower() == 'true':
+            # Oldest first, up to the cursor if one was given
+            return Response(iter_ndjson(log_path, detection_filter, end=cursor), mimetype='application/x-ndjson')
+
+        detections, next_cursor = read_page(log_path, limit, cursor, detection_filter, skip=offset)
+        return jsonify({'detections': detections, 'count': len(detections), 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
     except Exception as e:
         logger.error(f'Failed to retrieve detections: {str(e)}')
         return jsonify({'error': f'Failed to retrieve detections: {str(e)}'}), 500
@@ -0,0 +1,101 @@
+"""Request-scoped state for one analyzed frame.
+
+A FrameContext goes with a frame through a request, or through the video pipeline stages, and
+holds the decoded image and detector output plus everything derived from them. Each derived
+value (the detections list, the rendered overlay and its JPEG/base64 encodings) is computed the
+first time it is asked for and reused after that, so no stage decodes or renders the frame again.
+With an OverlayCache, an overlay already rendered for the same frame content and detections is
+taken from the cache instead of being drawn.
+"""
+import base64
+import hashlib
+
+import numpy as np
+
+from parking_spot_overlay import ParkingSpotOverlay
+
+_default_overlay = ParkingSpotOverlay()
+
+class FrameContext:
+    """One decoded BGR frame and what was computed from it.
+
+    `factor` maps coordinates in `image` (which may be a reduced-size decode) to full-resolution
+    coordinates. `output` is the detector output dict in `image` coordinates; set it before
+    reading `detections` or rendering. The overlay is drawn on `image` itself, since nothing
+    reads the undecorated frame after that. `source`, the encoded bytes `image` was decoded
+    from, is hashed for the overlay key instead of the pixels when given.
+    """
+
+    def __init__(self, image, factor=1.0, output=None, overlay=None, confidence_threshold=0.5,
+                 cache=None, source=None):
+        self.image = image
+        self.factor = factor
+        self.output = output
+        self.overlay = overlay or _default_overlay
+        self.confidence_threshold = confidence_threshold
+        self.cache = cache
+        self.source = source
+        self._detections = None
+        self._content_key = None
+        self._overlay_key = None
+        self._overlay_jpeg = None
+        self._overlay_base64 = None
+
+    @property
+    def detections(self):
+        """[{'class_id', 'confidence', 'bbox'}] in full-resolution pixels, built in one pass over the output tensors"""
+        if self._detections is None:
+            boxes = self.output['boxes'] * self.factor if self.factor != 1.0 else self.output['boxes']
+            self._detections = [
+                {'class_id': label, 'confidence': score, 'bbox': box}
+                for label, score, box in zip(self.output['labels'].tolist(), self.output['scores'].tolist(),
+                                             boxes.int().tolist())
+            ]
+        return self._detections
+
+    def content_key(self):
+        """Hash of the frame as decoded: its source bytes (or pixels) and decoded size"""
+        if self._content_key is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(self.source if self.source is not None else np.ascontiguousarray(self.image).data)
+            digest.update(str(self.image.shape).encode('utf-8'))
+            self._content_key = digest.hexdigest()
+        return self._content_key
+
+    def overlay_key(self):
+        """Hash of everything the overlay is drawn from: frame content, detector output and threshold"""
+        if self._overlay_key is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(f'{self.content_key()}:{self.confidence_threshold}'.encode('utf-8'))
+            for name in ('boxes', 'labels', 'scores'):
+                digest.update(self.output[name].contiguous().numpy().tobytes())
+            self._overlay_key = digest.hexdigest()
+        return self._overlay_key
+
+    def overlay_jpeg(self):
+        if self._overlay_jpeg is None:
+            # The key may hash the pixels, so take it before drawing on them
+            key = self.overlay_key()
+            data = self.cache.get(key) if self.cache is not None else None
+            if data is None:
+                data = self.overlay.encode_boxes(
+                    self.image, self.output['boxes'].int().numpy(), self.output['labels'].numpy(),
+                    self.output['scores'].numpy(), self.confidence_threshold, copy=False
+                )
+                if self.cache is not None:
+                    self.cache.put(key, data)
+            self._overlay_jpeg = data
+        return self._overlay_jpeg
+
+    def cache_overlay(self):
+        """Make sure the overlay is rendered and in the cache; returns its key"""
+        data = self.overlay_jpeg()
+        key = self.overlay_key()
+        if key not in self.cache:
+            self.cache.put(key, data)
+        return key
+
+    def overlay_base64(self):
+        if self._overlay_base64 is None:
+            self._overlay_base64 = base64.b64encode(self.overlay_jpeg()).decode('utf-8')
+        return self._overlay_base64
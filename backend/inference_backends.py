@@ -0,0 +1,273 @@
+"""Interchangeable runtimes for the parking spot detector.
+
+`eager` runs the torchvision model built in newer.py. `torchscript` and `onnx` run artifacts
+exported from it (custom 3-class head and detections_per_img included), so serving does not
+depend on the Python model code. The runtime is chosen with the INFERENCE_BACKEND environment
+variable.
+
+    python inference_backends.py export [--min-size 400] [--max-size 1333]  (default: the model's own resize)
+    python inference_backends.py parity [--backend onnx] [--frames DIR]
+
+ONNX graphs have the detector's resize baked in at export time, so the ONNX backend only accepts
+the min_size/max_size it was exported with (recorded in export_info.json). TorchScript keeps
+the resize configurable like eager.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+import torch
+from torchvision.ops import box_iou
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_DIR = os.path.join(BASE_DIR, 'exported_models')
+TORCHSCRIPT_PATH = os.path.join(EXPORT_DIR, 'final_model.ts')
+ONNX_PATH = os.path.join(EXPORT_DIR, 'final_model.onnx')
+EXPORT_INFO_PATH = os.path.join(EXPORT_DIR, 'export_info.json')
+ONNX_OPSET = 17
+BACKENDS = ('eager', 'torchscript', 'onnx')
+
+class _ResizeOverride:
+    """Temporarily set a detector's internal resize, restoring it afterwards"""
+
+    def __init__(self, detector, min_size=None, max_size=None):
+        self.transform = detector.transform
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def __enter__(self):
+        self.saved = (self.transform.min_size, self.transform.max_size)
+        if self.min_size is not None:
+            self.transform.min_size = (int(self.min_size),)
+        if self.max_size is not None:
+            self.transform.max_size = int(self.max_size)
+
+    def __exit__(self, *exc):
+        self.transform.min_size, self.transform.max_size = self.saved
+
+def native_resolution(detector):
+    """(min_size, max_size) a torchvision detector resizes to when nothing overrides it"""
+    return int(detector.transform.min_size[-1]), int(detector.transform.max_size)
+
+class EagerBackend:
+    name = 'eager'
+
+    def __init__(self, model):
+        self.model = model
+        # Serializes forward passes so per-call resize overrides cannot interleave
+        self._lock = threading.Lock()
+
+    def resolution(self):
+        return native_resolution(self.model)
+
+    def supports_resolution(self, min_size=None, max_size=None):
+        return True
+
+    def detect(self, image_tensors, min_size=None, max_size=None):
+        with self._lock, torch.no_grad(), _ResizeOverride(self.model, min_size, max_size):
+            return self.model(list(image_tensors))
+
+class TorchScriptBackend:
+    name = 'torchscript'
+
+    def __init__(self, path=TORCHSCRIPT_PATH):
+        self.path = path
+        self.module = torch.jit.load(path, map_location='cpu')
+        self.module.eval()
+        self._lock = threading.Lock()
+
+    def resolution(self):
+        return native_resolution(self.module)
+
+    def supports_resolution(self, min_size=None, max_size=None):
+        return True
+
+    def detect(self, image_tensors, min_size=None, max_size=None):
+        with self._lock, torch.no_grad(), _ResizeOverride(self.module, min_size, max_size):
+            # Scripted detection models return (losses, detections)
+            _, detections = self.module(list(image_tensors))
+            return detections
+
+class OnnxBackend:
+    """ONNX Runtime on the CPU execution provider, one image per run.
+
+    The session is created on first use so that forked inference workers each build their own
+    thread pools, sized to torch's thread count in that process.
+    """
+
+    name = 'onnx'
+
+    def __init__(self, path=ONNX_PATH, info_path=EXPORT_INFO_PATH):
+        self.path = path
+        with open(info_path, 'r') as f:
+            info = json.load(f)
+        self.min_size = info['min_size']
+        self.max_size = info['max_size']
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        if self._session is None:
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = torch.get_num_threads()
+            self._session = onnxruntime.InferenceSession(self.path, options, providers=['CPUExecutionProvider'])
+        return self._session
+
+    def resolution(self):
+        return self.min_size, self.max_size
+
+    def supports_resolution(self, min_size=None, max_size=None):
+        """Only the resize the graph was exported with; None means no override"""
+        return (min_size is None or int(min_size) == self.min_size) and \
+            (max_size is None or int(max_size) == self.max_size)
+
+    def detect(self, image_tensors, min_size=None, max_size=None):
+        if not self.supports_resolution(min_size, max_size):
+            raise ValueError(f"ONNX model was exported for min_size={self.min_size}, max_size={self.max_size}; "
+                             f"re-export to run at min_size={min_size}, max_size={max_size}")
+        with self._lock:
+            session = self._get_session()
+            outputs = []
+            for image_tensor in image_tensors:
+                boxes, labels, scores = session.run(None, {'image': image_tensor.contiguous().numpy()})
+                outputs.append({
+                    'boxes': torch.from_numpy(boxes),
+                    'labels': torch.from_numpy(labels),
+                    'scores': torch.from_numpy(scores)
+                })
+            return outputs
+
+def load_backend(name, model=None):
+    """Build the named backend; `model` is the eager torchvision model (required for 'eager')"""
+    if name == 'eager':
+        return EagerBackend(model)
+    if name == 'torchscript':
+        return TorchScriptBackend()
+    if name == 'onnx':
+        return OnnxBackend()
+    raise ValueError(f"Unknown inference backend '{name}', expected one of {', '.join(BACKENDS)}")
+
+def export_torchscript(model, path=TORCHSCRIPT_PATH):
+    scripted = torch.jit.script(model)
+    torch.jit.save(scripted, path)
+    return path
+
+def export_onnx(model, sample, path=ONNX_PATH, min_size=400, max_size=1333, opset=ONNX_OPSET):
+    """Trace the detector on `sample` (a CHW float tensor) with its resize fixed to min_size/max_size"""
+    with torch.no_grad(), _ResizeOverride(model, min_size, max_size):
+        torch.onnx.export(
+            model, ([sample],), path,
+            opset_version=opset,
+            input_names=['image'],
+            output_names=['boxes', 'labels', 'scores'],
+            dynamic_axes={'image': {1: 'height', 2: 'width'}, 'boxes': {0: 'detections'},
+                          'labels': {0: 'detections'}, 'scores': {0: 'detections'}},
+            dynamo=False
+        )
+    return path
+
+def match_outputs(reference, candidate, iou_threshold=0.99):
+    """Pair each reference detection with the best same-label candidate box by IoU.
+
+    Returns (matched count, max box coordinate error, max score error) over the matched pairs.
+    """
+    if len(reference['boxes']) == 0 or len(candidate['boxes']) == 0:
+        return 0, 0.0, 0.0
+    ious = box_iou(reference['boxes'], candidate['boxes'])
+    ious[reference['labels'][:, None] != candidate['labels'][None, :]] = 0
+    best_iou, best = ious.max(dim=1)
+    matched = best_iou >= iou_threshold
+    if not matched.any():
+        return 0, 0.0, 0.0
+    box_error = (reference['boxes'][matched] - candidate['boxes'][best[matched]]).abs().max().item()
+    score_error = (reference['scores'][matched] - candidate['scores'][best[matched]]).abs().max().item()
+    return int(matched.sum()), box_error, score_error
+
+def check_parity(reference, candidate, frames, min_size=None, max_size=None,
+                 box_tolerance=1.0, score_tolerance=1e-3, min_match_rate=0.99):
+    """Compare a candidate backend's boxes and scores with a reference backend on the same frames"""
+    report = {'frames': len(frames), 'reference_detections': 0, 'candidate_detections': 0, 'matched': 0,
+              'max_box_error': 0.0, 'max_score_error': 0.0}
+    for frame in frames:
+        expected = reference.detect([frame], min_size, max_size)[0]
+        actual = candidate.detect([frame], min_size, max_size)[0]
+        matched, box_error, score_error = match_outputs(expected, actual)
+        report['reference_detections'] += len(expected['boxes'])
+        report['candidate_detections'] += len(actual['boxes'])
+        report['matched'] += matched
+        report['max_box_error'] = max(report['max_box_error'], box_error)
+        report['max_score_error'] = max(report['max_score_error'], score_error)
+    total = report['reference_detections']
+    report['match_rate'] = report['matched'] / total if total else 1.0
+    report['passed'] = (report['match_rate'] >= min_match_rate and report['max_box_error'] <= box_tolerance
+                        and report['max_score_error'] <= score_tolerance)
+    return report
+
+def load_frames(frames_dir, limit=None):
+    from newer import load_tensor
+    paths = sorted(glob.glob(os.path.join(frames_dir, '*.jpg')))[:limit]
+    if not paths:
+        raise SystemExit(f"No frames found in {frames_dir}")
+    return [load_tensor(path) for path in paths]
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    default_frames = os.path.join(os.path.dirname(BASE_DIR), 'video-to-img', 'extracted_frames')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    exporter = subparsers.add_parser('export', help='write TorchScript and ONNX artifacts for the configured model')
+    exporter.add_argument('--min-size', type=int, help="defaults to the model's own resize")
+    exporter.add_argument('--max-size', type=int, help="defaults to the model's own resize")
+    exporter.add_argument('--frames', default=default_frames, help='a frame from here is the ONNX tracing input')
+    parity = subparsers.add_parser('parity', help='check exported backends against eager')
+    parity.add_argument('--backend', choices=BACKENDS[1:], nargs='+', default=list(BACKENDS[1:]))
+    parity.add_argument('--frames', default=default_frames)
+    parity.add_argument('--limit', type=int, default=4)
+    args = parser.parse_args()
+
+    from newer import model, model_info
+
+    if args.command == 'export':
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        native_min, native_max = native_resolution(model)
+        args.min_size = args.min_size or native_min
+        args.max_size = args.max_size or native_max
+        sample = load_frames(args.frames, limit=1)[0]
+        start = time.perf_counter()
+        export_torchscript(model)
+        export_onnx(model, sample, min_size=args.min_size, max_size=args.max_size)
+        info = {
+            'arch': model_info['arch'],
+            'min_size': args.min_size,
+            'max_size': args.max_size,
+            'num_classes': model_info['num_classes'],
+            'detections_per_img': model_info['detections_per_img'],
+            'onnx_opset': ONNX_OPSET,
+            'exported_at': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        with open(EXPORT_INFO_PATH, 'w') as f:
+            json.dump(info, f, indent=2)
+        print(f"Exported {TORCHSCRIPT_PATH} and {ONNX_PATH} in {time.perf_counter() - start:.1f}s")
+        return
+
+    with open(EXPORT_INFO_PATH, 'r') as f:
+        info = json.load(f)
+    frames = load_frames(args.frames, args.limit)
+    reference = EagerBackend(model)
+    failed = False
+    for name in args.backend:
+        report = check_parity(reference, load_backend(name), frames, info['min_size'], info['max_size'])
+        print(f"{name}: {json.dumps(report)}")
+        failed = failed or not report['passed']
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Detector outputs cached by content hash, with concurrent requests for the same frame coalesced.
+
+A key hashes the frame content together with the model version and the inference settings, so
+a repeated upload of the same image is answered without running the detector. The model version
+(newer.MODEL_VERSION) changes whenever the loaded checkpoint file does; entries on disk from any
+other version are deleted when the cache starts, so a retrained final_model.pth never serves
+results of the old one.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+def settings_key(config):
+    """The TileConfig fields that change detector outputs"""
+    return (f'{config.rows}x{config.cols}:{config.overlap}:{int(config.include_full_frame)}:'
+            f'{config.min_size}:{config.max_size}:{config.iou_threshold}:{config.edge_margin}')
+
+def output_size(output):
+    return sum(tensor.numel() * tensor.element_size() for tensor in output.values())
+
+class InferenceCache:
+    """LRU of detector outputs bounded by tensor bytes, with an optional disk tier and single-flight.
+
+    `get_or_submit(key, submit_fn)` returns a Future: already resolved on a hit, the in-flight
+    Future when the same key is being computed, and otherwise the Future from `submit_fn()`,
+    whose result is stored once it arrives. Cached outputs are shared, so callers must not
+    modify them.
+    """
+
+    def __init__(self, version, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        self.version = version
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_dir = os.path.join(disk_dir, version) if disk_dir else None
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0,
+                      'evictions': 0, 'disk_evictions': 0}
+        if disk_dir:
+            self._prepare_disk(disk_dir)
+
+    def key(self, content_key, settings):
+        return hashlib.blake2b(f'{self.version}|{settings}|{content_key}'.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _prepare_disk(self, root):
+        os.makedirs(self.disk_dir, exist_ok=True)
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name != self.version and os.path.isdir(path):
+                logger.info(f"Removing inference cache for model version {name}")
+                shutil.rmtree(path, ignore_errors=True)
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.pt'):
+                stat = os.stat(os.path.join(self.disk_dir, name))
+                entries.append((stat.st_mtime, name[:-3], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f'{key}.pt')
+
+    def _remember(self, key, output):
+        """Insert into the memory tier, evicting least recently used entries; caller holds the lock"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        size = output_size(output)
+        if size > self.max_bytes:
+            return
+        self._memory[key] = (output, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self.stats['evictions'] += 1
+
+    def _read_disk(self, key):
+        try:
+            return torch.load(self._path(key), map_location='cpu', weights_only=True)
+        except Exception as e:
+            logger.warning(f"Dropping unreadable inference cache entry {key}: {str(e)}")
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_bytes -= size
+            return None
+
+    def get_or_submit(self, key, submit_fn):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats['hits'] += 1
+                return _resolved(entry[0])
+            if key in self._inflight:
+                self.stats['coalesced'] += 1
+                return self._inflight[key]
+            on_disk = key in self._disk
+
+        output = self._read_disk(key) if on_disk else None
+        with self._lock:
+            if output is not None:
+                self.stats['disk_hits'] += 1
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self._remember(key, output)
+                return _resolved(output)
+            if key in self._inflight:
+                self.stats['coalesced'] += 1
+                return self._inflight[key]
+            self.stats['misses'] += 1
+            future = submit_fn()
+            self._inflight[key] = future
+        # Outside the lock: the callback runs immediately if the future is already done
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return future
+
+    def _finish(self, key, future):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.exception() is not None:
+                self.stats['errors'] += 1
+                return
+            output = future.result()
+            self._remember(key, output)
+            write = self.disk_dir is not None and key not in self._disk
+        if write:
+            self._write_disk(key, output)
+
+    def _write_disk(self, key, output):
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            torch.save({name: tensor.detach().cpu() for name, tensor in output.items()}, tmp_path)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Could not write inference cache entry {key}: {str(e)}")
+            return
+        evicted = []
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = size
+                self._disk_bytes += size
+            while self._disk_bytes > self.disk_max_bytes and len(self._disk) > 1:
+                old_key, old_size = self._disk.popitem(last=False)
+                self._disk_bytes -= old_size
+                self.stats['disk_evictions'] += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats['hits'] + stats['disk_hits'] + stats['misses'] + stats['coalesced']
+            stats.update({
+                'model_version': self.version,
+                'hit_rate': round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0,
+                'in_flight': len(self._inflight),
+                'memory_items': len(self._memory),
+                'memory_mb': round(self._memory_bytes / 1024 / 1024, 2),
+                'disk_items': len(self._disk),
+                'disk_mb': round(self._disk_bytes / 1024 / 1024, 2)
+            })
+        return stats
+
+def _resolved(output):
+    future = Future()
+    future.set_result(output)
+    return future
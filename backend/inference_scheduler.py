@@ -0,0 +1,133 @@
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class BatchingScheduler:
+    """Collects inference requests that arrive within a short window and runs them as one batch.
+
+    `runner` receives a list of inputs and must return a list of results in the same order.
+    A batch is dispatched as soon as it holds `max_batch_size` items or the oldest waiting
+    item has been queued for `max_wait_ms` milliseconds, whichever comes first. With
+    `concurrency` > 1 that many batches can be running at once, for runners backed by
+    several model instances.
+    """
+
+    def __init__(self, runner, max_batch_size=8, max_wait_ms=20, concurrency=1):
+        self.runner = runner
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.concurrency = max(1, int(concurrency))
+        self._queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self.stats = {
+            'batches': 0,
+            'requests': 0,
+            'max_batch_size_seen': 0,
+            'errors': 0
+        }
+
+    def _running(self):
+        return bool(self._threads) and all(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        with self._lock:
+            if self._running():
+                return
+            self._stop_event.clear()
+            self._threads = [threading.Thread(target=self._run, name=f'inference-scheduler-{i}', daemon=True)
+                             for i in range(self.concurrency)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, item):
+        """Queue an input for inference and return a Future for its result"""
+        if not self._running():
+            self.start()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def predict(self, item, timeout=None):
+        """Submit an input and block until its result is ready"""
+        return self.submit(item).result(timeout)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['average_batch_size'] = stats['requests'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                self._stop_event.set()
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                # Wake up periodically: with several dispatch threads, another one may drain our stop sentinel
+                entry = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if entry is None:
+                break
+
+            batch = self._collect_batch(entry)
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                results = self.runner([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Runner returned {len(results)} results for a batch of {len(batch)}")
+                for (_, future), result in zip(batch, results):
+                    # A runner may fail some items of a batch without failing the others
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+            except Exception as e:
+                logger.error(f"Batched inference failed: {str(e)}")
+                with self._lock:
+                    self.stats['errors'] += 1
+                for _, future in batch:
+                    future.set_exception(e)
+
+            with self._lock:
+                self.stats['batches'] += 1
+                self.stats['requests'] += len(batch)
+                self.stats['max_batch_size_seen'] = max(self.stats['max_batch_size_seen'], len(batch))
+
+        # Fail anything still waiting so callers are not left blocked
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not None and entry[1].set_running_or_notify_cancel():
+                entry[1].set_exception(RuntimeError('Inference scheduler stopped'))
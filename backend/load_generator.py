@@ -0,0 +1,273 @@
+"""Replay video files or frame directories as many virtual cameras against the analysis backend.
+
+Each virtual camera cycles through the frames of one source (sources are assigned round robin),
+submits them to /api/analyze under its own location id at its own rate with random jitter, and,
+like camera_simulator, keeps at most one request in flight (--max-in-flight): a frame that comes
+due while the previous one is still outstanding is dropped, so a camera never completes more than
+1/latency frames per second. Cameras run concurrently on asyncio (aiohttp).
+
+    python load_generator.py --url http://192.168.137.135:5000/api/analyze --cameras 1 2 4 8 16
+    python load_generator.py --source ../video-to-img/extracted_frames --source lot_b.mp4 --cameras 4 8 --rate 0.5 --jitter 0.2
+    python load_generator.py --stub --cameras 16 64 256 --rate 5
+    python load_generator.py --cameras 8 16 --rate 0.1 1 --jitter 0 0.5
+
+--rate and --jitter take one value for every camera, or a LOW HIGH range from which each
+camera draws its own; the report lists every camera's values and results.
+
+Every --cameras value is one stage of --duration seconds. The report gives throughput, latency
+percentiles and error, 429 and drop rates per stage, and the saturation point: the first stage
+whose completed throughput falls below --saturation of the offered rate or whose error rate
+exceeds --max-error-rate. --stub serves /api/analyze from an in-process aiohttp server that
+answers immediately (or after --stub-delay), which measures the harness itself.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import time
+
+import aiohttp
+import cv2
+from aiohttp import web
+
+from camera_simulator import RASPBERRY_PI_API, preprocess_frame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FRAMES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  'video-to-img', 'extracted_frames')
+
+def load_source(path, limit, max_size=1280, quality=85):
+    """Up to `limit` frames of a video file or directory of images, encoded as camera_simulator uploads them"""
+    frames = []
+    if os.path.isdir(path):
+        for image_path in sorted(glob.glob(os.path.join(path, '*.jpg')) + glob.glob(os.path.join(path, '*.png')))[:limit]:
+            frames.append(preprocess_frame(cv2.imread(image_path), max_size, quality))
+    else:
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or limit
+        step = max(1, total // limit)
+        index = 0
+        while len(frames) < limit:
+            success, frame = cap.read()
+            if not success:
+                break
+            if index % step == 0:
+                frames.append(preprocess_frame(frame, max_size, quality))
+            index += 1
+        cap.release()
+    if not frames:
+        raise SystemExit(f"No frames read from {path}")
+    logger.info(f"Loaded {len(frames)} frames from {path}")
+    return frames
+
+def sample(rng, spec):
+    """One value for a camera from a [value] or [low, high] command line spec"""
+    return spec[0] if len(spec) == 1 else rng.uniform(spec[0], spec[1])
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+class VirtualCamera:
+    """One simulated camera: a frame source, a location id and a submission schedule"""
+
+    def __init__(self, location_id, frames, rate, jitter, rng, max_in_flight=1):
+        self.location_id = location_id
+        self.frames = frames
+        self.rate = rate
+        self.jitter = jitter
+        self.rng = rng
+        self.max_in_flight = max_in_flight
+        self.results = []  # (latency seconds, status); status is the HTTP code or 'error'
+        self.dropped = 0
+
+    def next_delay(self):
+        return (1.0 / self.rate) * (1.0 + self.rng.uniform(-self.jitter, self.jitter))
+
+    async def submit(self, session, url, frame_data):
+        form = aiohttp.FormData()
+        form.add_field('file', frame_data, filename='frame.jpg', content_type='image/jpeg')
+        form.add_field('location_id', self.location_id)
+        start = time.perf_counter()
+        try:
+            async with session.post(url, data=form) as response:
+                await response.read()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug(f"{self.location_id}: {type(e).__name__}: {str(e)}")
+            status = 'error'
+        self.results.append((time.perf_counter() - start, status))
+
+    async def run(self, session, url, until):
+        # Cameras start at random points of their first period so they do not submit in lockstep
+        next_time = time.perf_counter() + self.rng.uniform(0, 1.0 / self.rate)
+        index = self.rng.randrange(len(self.frames))
+        in_flight = set()
+        while next_time < until:
+            await asyncio.sleep(max(0.0, next_time - time.perf_counter()))
+            in_flight = {task for task in in_flight if not task.done()}
+            if len(in_flight) >= self.max_in_flight:
+                self.dropped += 1
+            else:
+                in_flight.add(asyncio.ensure_future(self.submit(session, url, self.frames[index % len(self.frames)])))
+                index += 1
+            next_time += self.next_delay()
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+async def run_stage(url, sources, cameras, rate, jitter, duration, timeout, seed, max_in_flight=1):
+    """One stage; `rate` and `jitter` are [value] or [low, high] specs sampled per camera"""
+    rng = random.Random(seed)
+    fleet = [VirtualCamera(f'loadgen-{i}', sources[i % len(sources)], sample(rng, rate), sample(rng, jitter),
+                           random.Random(rng.random()), max_in_flight)
+             for i in range(cameras)]
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(camera.run(session, url, start + duration) for camera in fleet))
+        elapsed = time.perf_counter() - start
+    return summarize(fleet, cameras, duration, elapsed)
+
+def camera_report(camera):
+    ok = sorted(latency for latency, status in camera.results if status == 200)
+    return {
+        'location_id': camera.location_id,
+        'rate': round(camera.rate, 3),
+        'jitter': round(camera.jitter, 3),
+        'sent': len(camera.results),
+        'completed': len(ok),
+        'dropped': camera.dropped,
+        'p50_ms': round(percentile(ok, 0.50) * 1000, 1) if ok else None
+    }
+
+def summarize(fleet, cameras, duration, elapsed):
+    """Stage report; throughput is over the scheduled `duration`, not the drain of the last requests"""
+    results = [result for camera in fleet for result in camera.results]
+    dropped = sum(camera.dropped for camera in fleet)
+    ok = sorted(latency for latency, status in results if status == 200)
+    throttled = sum(1 for _, status in results if status == 429)
+    failed = sum(1 for _, status in results if status != 200)
+    sent = len(results)
+    return {
+        'cameras': cameras,
+        'offered_rps': round(sum(camera.rate for camera in fleet), 2),
+        'sent': sent,
+        'completed': len(ok),
+        'dropped': dropped,
+        'throughput_rps': round(len(ok) / duration, 2),
+        'p50_ms': round(percentile(ok, 0.50) * 1000, 1) if ok else None,
+        'p90_ms': round(percentile(ok, 0.90) * 1000, 1) if ok else None,
+        'p99_ms': round(percentile(ok, 0.99) * 1000, 1) if ok else None,
+        'max_ms': round(ok[-1] * 1000, 1) if ok else None,
+        'error_rate': round(failed / sent, 4) if sent else 0.0,
+        'throttle_rate': round(throttled / sent, 4) if sent else 0.0,
+        'drop_rate': round(dropped / (sent + dropped), 4) if sent + dropped else 0.0,
+        'elapsed_s': round(elapsed, 2),
+        'camera_results': [camera_report(camera) for camera in fleet]
+    }
+
+def saturation_point(stages, min_fraction, max_error_rate):
+    """First stage that completes less than min_fraction of the offered rate or fails too often, or None"""
+    for stage in stages:
+        if stage['throughput_rps'] < stage['offered_rps'] * min_fraction or stage['error_rate'] > max_error_rate:
+            return stage
+    return None
+
+async def start_stub(delay):
+    """In-process /api/analyze answering a fixed result after `delay` seconds; returns (runner, url)"""
+    body = {'total_spots': 0, 'empty_spots': 0, 'filled_spots': 0, 'occupancy_rate': 0.0, 'detections': []}
+
+    async def analyze(request):
+        await request.post()
+        if delay:
+            await asyncio.sleep(delay)
+        return web.json_response(body)
+
+    app = web.Application(client_max_size=32 * 1024 * 1024)
+    app.router.add_post('/api/analyze', analyze)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}/api/analyze'
+
+async def run(args, sources):
+    runner = None
+    url = args.url
+    if args.stub:
+        runner, url = await start_stub(args.stub_delay)
+    stages = []
+    try:
+        for cameras in args.cameras:
+            logger.info(f"Stage: {cameras} cameras at {'-'.join(map(str, args.rate))}/s each against {url}")
+            stage = await run_stage(url, sources, cameras, args.rate, args.jitter, args.duration, args.timeout,
+                                    args.seed, args.max_in_flight)
+            logger.info(f"{cameras} cameras: {dict((k, v) for k, v in stage.items() if k != 'camera_results')}")
+            stages.append(stage)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+    return url, stages
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=f'{RASPBERRY_PI_API}/analyze')
+    parser.add_argument('--source', action='append', help='video file or frame directory; repeat for several')
+    parser.add_argument('--frames', type=int, default=20, help='frames loaded per source')
+    parser.add_argument('--cameras', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--rate', type=float, nargs='+', default=[1.0], metavar='RATE',
+                        help='submissions per second per camera, or a LOW HIGH range sampled per camera')
+    parser.add_argument('--jitter', type=float, nargs='+', default=[0.1], metavar='JITTER',
+                        help='relative jitter of the submission interval, or a LOW HIGH range sampled per camera')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds per stage')
+    parser.add_argument('--max-in-flight', type=int, default=1, help='outstanding requests per camera')
+    parser.add_argument('--timeout', type=float, default=15.0, help='request timeout, as in camera_simulator')
+    parser.add_argument('--max-size', type=int, default=1280)
+    parser.add_argument('--quality', type=int, default=85)
+    parser.add_argument('--saturation', type=float, default=0.9)
+    parser.add_argument('--max-error-rate', type=float, default=0.05)
+    parser.add_argument('--stub', action='store_true', help='target an in-process stub backend')
+    parser.add_argument('--stub-delay', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='load_report.json')
+    args = parser.parse_args()
+    for name in ('rate', 'jitter'):
+        spec = getattr(args, name)
+        if len(spec) > 2 or (len(spec) == 2 and spec[0] > spec[1]):
+            parser.error(f"--{name} takes one value or a LOW HIGH range")
+    if min(args.rate) <= 0:
+        parser.error("--rate must be positive")
+    if min(args.jitter) < 0 or max(args.jitter) >= 1:
+        parser.error("--jitter must be in [0, 1)")
+
+    sources = [load_source(path, args.frames, args.max_size, args.quality) for path in args.source or [DEFAULT_FRAMES_DIR]]
+    url, stages = asyncio.run(run(args, sources))
+    saturated = saturation_point(stages, args.saturation, args.max_error_rate)
+
+    print(f"{'cameras':>8}{'offered/s':>11}{'done/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}"
+          f"{'errors':>9}{'429s':>8}{'dropped':>9}")
+    for stage in stages:
+        print(f"{stage['cameras']:>8}{stage['offered_rps']:>11}{stage['throughput_rps']:>9}{str(stage['p50_ms']):>9}"
+              f"{str(stage['p90_ms']):>9}{str(stage['p99_ms']):>9}{stage['error_rate']:>9.1%}"
+              f"{stage['throttle_rate']:>8.1%}{stage['drop_rate']:>9.1%}")
+    if saturated:
+        print(f"Saturated at {saturated['cameras']} cameras: {saturated['throughput_rps']}/s completed "
+              f"of {saturated['offered_rps']}/s offered, {saturated['error_rate']:.1%} errors")
+    else:
+        print(f"Not saturated up to {stages[-1]['cameras']} cameras ({stages[-1]['throughput_rps']}/s)")
+
+    with open(args.output, 'w') as f:
+        json.dump({'url': url, 'stub': args.stub, 'rate': args.rate, 'jitter': args.jitter, 'duration': args.duration,
+                   'sources': args.source or [DEFAULT_FRAMES_DIR], 'stages': stages,
+                   'saturated_at': saturated['cameras'] if saturated else None}, f, indent=2)
+    print(f"Wrote {args.output}")
+
+if __name__ == '__main__':
+    main()
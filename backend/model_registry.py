@@ -0,0 +1,99 @@
+"""Detector architectures that can be built, trained and served from one config key.
+
+Checkpoints are saved as {'arch', 'num_classes', 'detections_per_img', 'state_dict', ...}, so a
+file says which architecture it holds. A bare state dict (the original final_model.pth) is read
+as the architecture the caller asks for, fasterrcnn_resnet50_fpn by default.
+
+    fasterrcnn_resnet50_fpn                 the original detector
+    fasterrcnn_mobilenet_v3_large_fpn       MobileNetV3 backbone, 800px input
+    fasterrcnn_mobilenet_v3_large_320_fpn   MobileNetV3 backbone, 320px input, for small CPUs
+    ssdlite320_mobilenet_v3_large           single-stage SSDlite, 320px input
+"""
+import os
+
+import torch
+import torchvision
+from torch import nn
+from torchvision.ops.misc import FrozenBatchNorm2d
+from torchvision.models.detection import (fasterrcnn_mobilenet_v3_large_320_fpn, fasterrcnn_mobilenet_v3_large_fpn,
+                                          fasterrcnn_resnet50_fpn, ssdlite320_mobilenet_v3_large)
+
+DEFAULT_ARCH = 'fasterrcnn_resnet50_fpn'
+NUM_CLASSES = 3
+DETECTIONS_PER_IMG = 500
+
+def freeze_batch_norm(module):
+    """Replace BatchNorm2d layers with FrozenBatchNorm2d in place, keeping their statistics.
+
+    The default eps is kept, as torchvision does when it builds a backbone for pretrained weights.
+    """
+    for name, child in module.named_children():
+        if isinstance(child, nn.BatchNorm2d):
+            frozen = FrozenBatchNorm2d(child.num_features)
+            for key in ('weight', 'bias', 'running_mean', 'running_var'):
+                getattr(frozen, key).copy_(getattr(child, key).detach())
+            setattr(module, name, frozen)
+        else:
+            freeze_batch_norm(child)
+    return module
+
+def _faster_rcnn(builder):
+    def build(num_classes, detections_per_img, pretrained_backbone):
+        weights_backbone = 'DEFAULT' if pretrained_backbone else None
+        model = builder(weights=None, weights_backbone=weights_backbone, num_classes=num_classes,
+                        box_detections_per_img=detections_per_img)
+        # torchvision only freezes batch norm when starting from pretrained weights; do it always so
+        # the layer types (and checkpoint keys) are the same however the model was built
+        return model if pretrained_backbone else freeze_batch_norm(model)
+    return build
+
+def _ssdlite(num_classes, detections_per_img, pretrained_backbone):
+    weights_backbone = 'DEFAULT' if pretrained_backbone else None
+    return ssdlite320_mobilenet_v3_large(weights=None, weights_backbone=weights_backbone, num_classes=num_classes,
+                                         detections_per_img=detections_per_img,
+                                         topk_candidates=max(300, detections_per_img))
+
+ARCHITECTURES = {
+    'fasterrcnn_resnet50_fpn': _faster_rcnn(fasterrcnn_resnet50_fpn),
+    'fasterrcnn_mobilenet_v3_large_fpn': _faster_rcnn(fasterrcnn_mobilenet_v3_large_fpn),
+    'fasterrcnn_mobilenet_v3_large_320_fpn': _faster_rcnn(fasterrcnn_mobilenet_v3_large_320_fpn),
+    'ssdlite320_mobilenet_v3_large': _ssdlite
+}
+
+def build_model(arch=DEFAULT_ARCH, num_classes=NUM_CLASSES, detections_per_img=DETECTIONS_PER_IMG,
+                pretrained_backbone=False):
+    """An untrained detector of the given architecture with a `num_classes` head"""
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Unknown model architecture '{arch}', expected one of {', '.join(ARCHITECTURES)}")
+    return ARCHITECTURES[arch](num_classes, detections_per_img, pretrained_backbone)
+
+def default_checkpoint_path(arch, directory='.'):
+    """final_model.pth for the original detector, <arch>.pth for the others"""
+    return os.path.join(directory, 'final_model.pth' if arch == DEFAULT_ARCH else f'{arch}.pth')
+
+def save_checkpoint(model, arch, path, num_classes=NUM_CLASSES, detections_per_img=DETECTIONS_PER_IMG, **extra):
+    checkpoint = dict(extra, arch=arch, num_classes=num_classes, detections_per_img=detections_per_img,
+                      torchvision_version=torchvision.__version__, state_dict=model.state_dict())
+    torch.save(checkpoint, path)
+    return path
+
+def load_checkpoint(path, arch=None):
+    """Build and load the detector stored at `path`; returns (model in eval mode, checkpoint info).
+
+    `arch` is required to match a self-describing checkpoint and names the architecture of a
+    bare state dict.
+    """
+    checkpoint = torch.load(path, map_location=torch.device('cpu'))
+    if isinstance(checkpoint, dict) and 'state_dict' in checkpoint and 'arch' in checkpoint:
+        if arch is not None and arch != checkpoint['arch']:
+            raise ValueError(f"{path} holds a {checkpoint['arch']} model, not {arch}")
+        state_dict = checkpoint['state_dict']
+        info = {key: value for key, value in checkpoint.items() if key != 'state_dict'}
+    else:
+        state_dict = checkpoint
+        info = {'arch': arch or DEFAULT_ARCH, 'num_classes': NUM_CLASSES, 'detections_per_img': DETECTIONS_PER_IMG}
+
+    model = build_model(info['arch'], info['num_classes'], info['detections_per_img'])
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model, info
@@ -1,41 +1,56 @@
 import torch
-import torchvision
-from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
 from torchvision import transforms
 from PIL import Image
 import cv2
 import matplotlib.pyplot as plt
 import numpy as np
 import os
+import hashlib
 
-# Model setup
-num_classes = 3
-model = torchvision.models.detection.fasterrcnn_resnet50_fpn(pretrained=False)
-in_features = model.roi_heads.box_predictor.cls_score.in_features
-model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
-model.roi_heads.detections_per_img = 500
+from tiling import TiledDetector, input_scale
+from inference_backends import load_backend
+from model_registry import DEFAULT_ARCH, default_checkpoint_path, load_checkpoint
 
-# Load model weights (update path as needed)
-model.load_state_dict(torch.load("./final_model.pth", map_location=torch.device('cpu')))
-model.eval()
+# eager, torchscript or onnx; see inference_backends.py
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'eager')
+# Detector architecture and checkpoint; see model_registry.py
+MODEL_ARCH = os.environ.get('MODEL_ARCH', DEFAULT_ARCH)
+MODEL_PATH = os.environ.get('MODEL_PATH', default_checkpoint_path(MODEL_ARCH))
+
+# Model setup: 3 classes, up to 500 detections per image
+model, model_info = load_checkpoint(MODEL_PATH, MODEL_ARCH)
+num_classes = model_info['num_classes']
+
+backend = load_backend(INFERENCE_BACKEND, model)
+
+def _model_version():
+    """Short hash naming the loaded weights: architecture, runtime and the size/mtime of the files they came from"""
+    parts = [MODEL_ARCH, INFERENCE_BACKEND]
+    for path in (MODEL_PATH, getattr(backend, 'path', None)):
+        if path and os.path.exists(path):
+            stat = os.stat(path)
+            parts.append(f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}')
+    return hashlib.blake2b('|'.join(parts).encode('utf-8'), digest_size=8).hexdigest()
+
+# Changes whenever a different checkpoint (or exported artifact) is loaded
+MODEL_VERSION = _model_version()
 
 # Image transform
 transform = transforms.Compose([
     transforms.ToTensor(),
 ])
 
-def predict(image_path):
-    """Make predictions on the input image"""
-    predictions = []
+def load_tensor(image_path):
+    """Load an image file as a CHW float tensor ready for the model"""
     image = Image.open(image_path).convert('RGB')
-    image_tensor = transform(image).unsqueeze(0)
-
-    with torch.no_grad():
-        prediction = model(image_tensor)
+    return transform(image)
 
-    boxes = prediction[0]['boxes']
-    labels = prediction[0]['labels']
-    scores = prediction[0]['scores']
+def to_predictions(output):
+    """Convert one model output dict into the predictions list format"""
+    predictions = []
+    boxes = output['boxes']
+    labels = output['labels']
+    scores = output['scores']
 
     for i, box in enumerate(boxes):
         predictions.append({
@@ -43,37 +58,110 @@ def predict(image_path):
             "label": int(labels[i]),
             "confidence": float(scores[i])
         })
-    
+
     return predictions
 
-def crop(image_path, predictions):
-    """Crop image if predictions exceed 100, based on highest box"""
-    highest = 640
-    for prediction in predictions:
-        x_min, y_min, x_max, y_max = map(int, prediction["box"].tolist())
-        if y_max < highest:
-            highest = y_max
+def detect_batch(image_tensors, min_size=None, max_size=None):
+    """Run a single batched forward pass and return the raw model outputs.
+
+    `min_size`/`max_size` temporarily override the detector's internal resize for this call.
+    Runs on the backend selected by INFERENCE_BACKEND.
+    """
+    return backend.detect(image_tensors, min_size, max_size)
+
+def predict_batch(image_tensors):
+    """Run a single batched forward pass over a list of image tensors"""
+    return [to_predictions(output) for output in detect_batch(image_tensors)]
 
-    image = Image.open(image_path)
-    base_name = os.path.splitext(os.path.basename(image_path))[0]
-    output_dir = os.path.dirname(image_path)
-    cropped_path = os.path.join(output_dir, f"{base_name}_c.jpg")
+def decode_image(image_data):
+    """Decode raw JPEG/PNG bytes into a BGR uint8 ndarray"""
+    nparr = np.frombuffer(image_data, np.uint8)
+    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Failed to decode image")
+    return image
+
+# Start-of-frame markers of baseline, progressive, lossless and arithmetic-coded JPEGs
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_REDUCED_DECODE_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+def jpeg_size(image_data):
+    """(width, height) from a JPEG's frame header without decoding it, or None for anything else"""
+    data = memoryview(image_data)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a length field
+            i += 2
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    return None
+
+def decode_image_for(image_data, config):
+    """Decode upload bytes at no more resolution than the detector will use under a TileConfig.
+
+    JPEGs the detector would shrink by 2x or more are decoded at 1/2, 1/4 or 1/8 size in the DCT
+    domain, which skips most of the decode work. Returns (BGR image, factor), where multiplying
+    coordinates in the decoded image by factor gives full-resolution coordinates.
+    """
+    size = jpeg_size(image_data)
+    reduction = 1
+    if size is not None:
+        scale = input_scale(size[1], size[0], config)
+        reduction = next((r for r in (8, 4, 2) if r * scale <= 1), 1)
+    if reduction == 1:
+        return decode_image(image_data), 1.0
+
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), _REDUCED_DECODE_FLAGS[reduction])
+    if image is None:
+        raise ValueError("Failed to decode image")
+    # Long sides, so an EXIF rotation applied by imdecode does not matter
+    return image, max(size) / max(image.shape[:2])
+
+def image_to_tensor(image):
+    """Convert a decoded BGR uint8 ndarray into a CHW float RGB tensor without going through PIL"""
+    tensor = torch.from_numpy(image).permute(2, 0, 1)
+    # Channel flip and float conversion are the only copies made
+    return tensor.flip(0).float().div_(255)
+
+def predict(image_path):
+    """Make predictions on the input image"""
+    return predict_batch([load_tensor(image_path)])[0]
+
+def predict_image(image):
+    """Make predictions on raw upload bytes or a decoded BGR uint8 ndarray"""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = decode_image(image)
+    return predict_batch([image_to_tensor(image)])[0]
 
-    crop = image.crop((0, 0, 640, highest + 10))
-    crop.save(cropped_path)
-    return cropped_path
 from datetime import datetime
 def compile_data(image_path, predictions):
+    """Append predictions to info.txt in the same directory as this script.
+
+    Only the command line run below writes info.txt this way; the Flask app records analyses in
+    the detection store.
+    """
     image_name = os.path.splitext(os.path.basename(image_path))[0]
     timestamp = datetime.now().strftime('%Y-%m-%d_%H:%M:%S')
-    """Append predictions to info.txt in the same directory as this script"""
-    base_name = os.path.splitext(os.path.basename(image_path))[0]
     # Get the directory of this script
     script_dir = os.path.dirname(os.path.abspath(__file__))
     # Create full path for info.txt in script directory
     info_path = os.path.join(script_dir, "info.txt")
     
-    with open('info.txt', 'a') as f:
+    with open(info_path, 'a') as f:
         for pred in predictions:
             f.write(f"{image_name} {timestamp} {pred['confidence']:.4f} {pred['label']} "
                     f"{int(pred['box'][0])} {int(pred['box'][1])} {int(pred['box'][2])} {int(pred['box'][3])}\n")
@@ -107,16 +195,11 @@ def main():
     # Specify your image path here
     image_path = "C:/Users/justi/Downloads/parking_dataset/train_images/2012-10-31_14_03_19.jpg"
     
-    # Make initial predictions on full image
-    all_predictions = predict(image_path)
-    
-    # Check if predictions exceed 100 and crop if necessary
-    if len(all_predictions) >= 100:
-        cropped_path = crop(image_path, all_predictions)
-        # Get predictions from cropped image
-        cropped_predictions = predict(cropped_path)
-        # Combine all predictions
-        all_predictions.extend(cropped_predictions)
+    image = cv2.imread(image_path)
+
+    # Tiled predictions over the full frame, duplicates merged with NMS
+    tiled_detector = TiledDetector(detect_batch)
+    all_predictions = to_predictions(tiled_detector([image_to_tensor(image)])[0])
     
     # Append all predictions to text file
     compile_data(image_path, all_predictions)
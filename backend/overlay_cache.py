@@ -0,0 +1,145 @@
+"""Rendered overlay JPEGs stored by content hash and served as their own resources.
+
+A key is a hash of what the overlay is drawn from (frame content, detector output and
+confidence threshold), so the same key always means the same bytes. That lets responses carry
+a URL instead of inline base64, lets /api/overlays/<key>.jpg be cached forever by clients, and
+lets an unchanged frame with unchanged detections skip rendering altogether.
+"""
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+class OverlayCache:
+    """LRU of overlay JPEGs bounded by total bytes, with an optional disk tier.
+
+    With `disk_dir`, every stored overlay is also written to disk (up to `disk_max_bytes`, least
+    recently used removed first), so overlays evicted from memory, or from before a restart, are
+    still served and are promoted back into memory when read.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'disk_evictions': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            key = name[:-4]
+            if name.endswith('.jpg') and KEY_PATTERN.match(key):
+                stat = os.stat(os.path.join(self.disk_dir, name))
+                entries.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        if entries:
+            logger.info(f"Overlay cache found {len(entries)} overlays ({self._disk_bytes / 1024 / 1024:.1f} MB) in {self.disk_dir}")
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f'{key}.jpg')
+
+    def _remember(self, key, data):
+        """Insert into the memory tier and evict least recently used entries; caller holds the lock"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        if len(data) > self.max_bytes:
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.stats['evictions'] += 1
+
+    def get(self, key):
+        """Overlay bytes for a key, or None"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats['hits'] += 1
+                return data
+            on_disk = key in self._disk
+
+        if on_disk:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                data = None
+        with self._lock:
+            if data is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        with self._lock:
+            known = key in self._memory or key in self._disk
+            self._remember(key, data)
+            if known:
+                return
+            self.stats['stores'] += 1
+        if self.disk_dir:
+            self._write_disk(key, data)
+
+    def _write_disk(self, key, data):
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write overlay {key} to disk: {str(e)}")
+            return
+        evicted = []
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+            while self._disk_bytes > self.disk_max_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self.stats['disk_evictions'] += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({
+                'memory_items': len(self._memory),
+                'memory_mb': round(self._memory_bytes / 1024 / 1024, 2),
+                'disk_items': len(self._disk),
+                'disk_mb': round(self._disk_bytes / 1024 / 1024, 2)
+            })
+        return stats
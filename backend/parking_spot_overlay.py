@@ -16,23 +16,35 @@ class ParkingSpotOverlay:
         self.default_color = (255, 255, 0)  # Default color for unknown classes (Yellow)
         
     def draw_detections(self, image, detections, confidence_threshold=0.5):
+        boxes = np.array([d['bbox'] for d in detections], dtype=np.int64).reshape(-1, 4)
+        class_ids = np.array([d['class_id'] for d in detections], dtype=np.int64)
+        confidences = np.array([d['confidence'] for d in detections], dtype=np.float32)
+        return self.draw_boxes(image, boxes, class_ids, confidences, confidence_threshold)
+
+    def draw_boxes(self, image, boxes, class_ids, confidences, confidence_threshold=0.5, copy=True):
+        """Draw detections given as arrays (boxes [N, 4] in pixels, class_ids [N], confidences [N]).
+
+        The confidence filter and the summary counts are computed once over the arrays. With
+        copy=False the boxes are drawn on `image` itself.
+        """
         try:
-            annotated_image = image.copy()
-            
-            for detection in detections:
-                if detection['confidence'] < confidence_threshold:
-                    continue
-                    
-                x_min, y_min, x_max, y_max = detection['bbox']
-                class_id = detection['class_id']
+            annotated_image = image.copy() if copy else image
+            keep = np.asarray(confidences) >= confidence_threshold
+            boxes = np.asarray(boxes)[keep].astype(np.int64)
+            class_ids = np.asarray(class_ids)[keep]
+            confidences = np.asarray(confidences)[keep]
+            text_sizes = {}
+
+            for (x_min, y_min, x_max, y_max), class_id, confidence in zip(boxes.tolist(), class_ids.tolist(), confidences.tolist()):
                 color = self.colors.get(class_id, self.default_color)
                 
                 cv2.rectangle(annotated_image, (x_min, y_min), (x_max, y_max), color, 2)
                 
                 # Updated label logic: 2 is filled, 1 is empty
-                label = f"{'Filled' if class_id == 2 else 'Empty'}: {detection['confidence']:.2f}"
-                
-                text_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
+                label = f"{'Filled' if class_id == 2 else 'Empty'}: {confidence:.2f}"
+                if label not in text_sizes:
+                    text_sizes[label] = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
+                text_size = text_sizes[label]
                 cv2.rectangle(
                     annotated_image, 
                     (x_min, y_min - text_size[1] - 10), 
@@ -51,10 +63,9 @@ class ParkingSpotOverlay:
                     cv2.LINE_AA
                 )
                 
-            # Updated stats logic
-            total_spots = len([d for d in detections if d['confidence'] >= confidence_threshold])
-            filled_spots = len([d for d in detections if d['class_id'] == 2 and d['confidence'] >= confidence_threshold])
-            empty_spots = len([d for d in detections if d['class_id'] == 1 and d['confidence'] >= confidence_threshold])
+            total_spots = len(class_ids)
+            filled_spots = int(np.count_nonzero(class_ids == 2))
+            empty_spots = int(np.count_nonzero(class_ids == 1))
             
             summary_text = f"Total: {total_spots} | Filled: {filled_spots} | Empty: {empty_spots}"
             cv2.putText(
@@ -79,9 +90,19 @@ class ParkingSpotOverlay:
             image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
             if image is None:
                 raise ValueError("Failed to decode image")
-            annotated_image = self.draw_detections(image, detections, confidence_threshold)
-            _, buffer = cv2.imencode('.jpg', annotated_image)
-            return buffer.tobytes()
+            return self.encode_overlay(image, detections, confidence_threshold)
         except Exception as e:
             logger.error(f"Error creating overlay: {str(e)}")
-            return image_data
\ No newline at end of file
+            return image_data
+
+    def encode_overlay(self, image, detections, confidence_threshold=0.5):
+        """Draw detections on an already decoded BGR frame and return the JPEG bytes"""
+        annotated_image = self.draw_detections(image, detections, confidence_threshold)
+        _, buffer = cv2.imencode('.jpg', annotated_image)
+        return buffer.tobytes()
+
+    def encode_boxes(self, image, boxes, class_ids, confidences, confidence_threshold=0.5, copy=True):
+        """draw_boxes followed by JPEG encoding"""
+        annotated_image = self.draw_boxes(image, boxes, class_ids, confidences, confidence_threshold, copy)
+        _, buffer = cv2.imencode('.jpg', annotated_image)
+        return buffer.tobytes()
@@ -0,0 +1,175 @@
+"""Sweep detector input resolutions and report detection recall against latency at each one.
+
+Recall is measured against ground-truth boxes when --labels is given (the train_detector.py
+format), otherwise against the detections at the largest swept resolution. Frames are decoded
+the way the server decodes uploads, at reduced size where the resolution allows, and decode
+time is part of the latency.
+
+    python resolution_sweep.py --frames ../video-to-img/extracted_frames --sizes 800 640 480 400 320 256
+    python resolution_sweep.py --frames lot_a_frames --min-recall 0.95 --apply lot_a
+
+--apply stores the lowest resolution that reaches --min-recall as the camera's setting in
+camera_settings.json.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+
+import torch
+from torchvision.ops import box_iou
+
+from camera_settings import CameraSettings
+from tiling import TileConfig, TiledDetector
+
+logger = logging.getLogger(__name__)
+
+def match_count(output, truth, iou_threshold=0.5):
+    """Detections matched one-to-one to same-class truth boxes, highest scores first"""
+    matched = 0
+    for label in truth['labels'].unique().tolist():
+        boxes = output['boxes'][output['labels'] == label]
+        truth_boxes = truth['boxes'][truth['labels'] == label]
+        if len(boxes) == 0:
+            continue
+        order = torch.argsort(output['scores'][output['labels'] == label], descending=True)
+        ious = box_iou(boxes[order], truth_boxes)
+        for row in ious:
+            best = int(row.argmax())
+            if row[best] >= iou_threshold:
+                matched += 1
+                ious[:, best] = 0
+    return matched
+
+def confident(output, score_threshold):
+    keep = output['scores'] >= score_threshold
+    return {key: value[keep] for key, value in output.items()}
+
+def read_truth(labels_path, paths):
+    """Ground truth for the swept frames from a labels file, keyed by frame path"""
+    from train_detector import read_labels
+    boxes_by_image = read_labels(labels_path)
+    truth = {}
+    for path in paths:
+        annotations = boxes_by_image.get(os.path.basename(path), [])
+        truth[path] = {
+            'boxes': torch.tensor([box for _, box in annotations], dtype=torch.float32).reshape(-1, 4),
+            'labels': torch.tensor([label for label, _ in annotations], dtype=torch.long)
+        }
+    return truth
+
+def run_resolution(detector, config, frames, reduced_decode=True):
+    """Detector outputs in full-resolution coordinates plus per-frame latency and the decode reductions used"""
+    from newer import decode_image, decode_image_for, image_to_tensor
+
+    outputs, latencies, factors = {}, [], set()
+    for path, data in frames:
+        start = time.perf_counter()
+        image, factor = decode_image_for(data, config) if reduced_decode else (decode_image(data), 1.0)
+        output = detector([(image_to_tensor(image), config)])[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        outputs[path] = dict(output, boxes=output['boxes'] * factor)
+        factors.add(round(factor, 2))
+    return outputs, latencies, sorted(factors)
+
+def sweep(frames, sizes, base_config, truth=None, score_threshold=0.5, reduced_decode=True):
+    from newer import detect_batch
+
+    detector = TiledDetector(detect_batch, base_config)
+    sizes = sorted(set(sizes), reverse=True)
+    # Warm-up so first-call allocation is not counted against the first resolution
+    run_resolution(detector, base_config.with_resolution(sizes[-1]), frames[:1], reduced_decode)
+
+    rows = []
+    reference = truth
+    for size in sizes:
+        config = base_config.with_resolution(size)
+        outputs, latencies, factors = run_resolution(detector, config, frames, reduced_decode)
+        outputs = {path: confident(output, score_threshold) for path, output in outputs.items()}
+        if reference is None:
+            # The largest resolution is the reference for the others
+            reference = outputs
+
+        matched = sum(match_count(outputs[path], reference[path]) for path, _ in frames)
+        expected = sum(len(reference[path]['boxes']) for path, _ in frames)
+        detected = sum(len(output['boxes']) for output in outputs.values())
+        latencies.sort()
+        row = {
+            'min_size': size,
+            'max_size': config.max_size,
+            'decode_reduction': factors,
+            'mean_ms': round(sum(latencies) / len(latencies), 1),
+            'p50_ms': round(latencies[len(latencies) // 2], 1),
+            'detections_per_frame': round(detected / len(frames), 1),
+            'recall': round(matched / expected, 4) if expected else None,
+            'precision': round(matched / detected, 4) if detected else None
+        }
+        logger.info(f"min_size {size}: {row}")
+        rows.append(row)
+    return rows
+
+def choose_resolution(rows, min_recall):
+    """Lowest min_size whose recall reaches min_recall, or None"""
+    passing = [row for row in rows if row['recall'] is not None and row['recall'] >= min_recall]
+    return min(passing, key=lambda row: row['min_size']) if passing else None
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    defaults = TileConfig()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                         'video-to-img', 'extracted_frames'))
+    parser.add_argument('--limit', type=int, default=8)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[800, 640, 480, 400, 320, 256])
+    parser.add_argument('--max-size', type=int, default=defaults.max_size)
+    parser.add_argument('--rows', type=int, default=defaults.rows)
+    parser.add_argument('--cols', type=int, default=defaults.cols)
+    parser.add_argument('--overlap', type=float, default=defaults.overlap)
+    parser.add_argument('--labels', help='ground-truth boxes; without them the largest size is the reference')
+    parser.add_argument('--score-threshold', type=float, default=0.5)
+    parser.add_argument('--min-recall', type=float, default=0.95)
+    parser.add_argument('--no-reduced-decode', action='store_true')
+    parser.add_argument('--apply', metavar='CAMERA', help='save the chosen resolution for this camera')
+    parser.add_argument('--output', default='resolution_sweep.json')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.frames, '*.jpg')))[:args.limit]
+    if not paths:
+        raise SystemExit(f"No frames found in {args.frames}")
+    frames = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            frames.append((path, f.read()))
+    truth = read_truth(args.labels, paths) if args.labels else None
+    base_config = TileConfig(rows=args.rows, cols=args.cols, overlap=args.overlap, max_size=args.max_size)
+
+    rows = sweep(frames, args.sizes, base_config, truth, args.score_threshold, not args.no_reduced_decode)
+    chosen = choose_resolution(rows, args.min_recall)
+
+    print(f"{'min_size':>9}{'decode 1/x':>12}{'mean ms':>10}{'p50 ms':>10}{'dets/frame':>12}{'recall':>9}{'precision':>11}")
+    for row in rows:
+        reduction = '/'.join(str(factor) for factor in row['decode_reduction'])
+        print(f"{row['min_size']:>9}{reduction:>12}{row['mean_ms']:>10}{row['p50_ms']:>10}"
+              f"{row['detections_per_frame']:>12}{str(row['recall']):>9}{str(row['precision']):>11}")
+    reference = 'ground truth' if truth else f'min_size {max(args.sizes)}'
+    if chosen:
+        print(f"Lowest resolution with recall >= {args.min_recall} against {reference}: min_size {chosen['min_size']}")
+    else:
+        print(f"No resolution reached recall {args.min_recall} against {reference}")
+
+    with open(args.output, 'w') as f:
+        json.dump({'frames': args.frames, 'reference': reference, 'min_recall': args.min_recall,
+                   'tiles': [args.rows, args.cols], 'results': rows,
+                   'chosen_min_size': chosen['min_size'] if chosen else None}, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.apply:
+        if not chosen:
+            raise SystemExit(f"Not applying a resolution to {args.apply}")
+        CameraSettings().set_resolution(args.apply, chosen['min_size'], args.max_size)
+        print(f"Set {args.apply} to min_size {chosen['min_size']}, max_size {args.max_size}")
+
+if __name__ == '__main__':
+    main()
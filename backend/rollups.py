@@ -0,0 +1,189 @@
+"""Incremental hourly/daily occupancy rollups per location.
+
+Every analysis adds its occupancy rate to one hourly and one daily bucket (count, sum, sum of
+squares, min, max) at write time, so statistics over any date range read a number of rows
+proportional to the buckets in the range rather than to the raw detections.
+
+    python rollups.py backfill --info info.txt [--reset]
+    python rollups.py backfill --store
+"""
+import argparse
+import logging
+import math
+from datetime import datetime, timedelta
+
+from detection_store import DB_PATH, DetectionStore, SQLiteStore, iter_info_analyses, normalize_timestamp, summarize_detections
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS occupancy_rollups (
+    location_id TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    sum_sq REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (location_id, granularity, bucket_start)
+);
+"""
+
+UPSERT = """
+INSERT INTO occupancy_rollups (location_id, granularity, bucket_start, count, sum, sum_sq, min, max)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (location_id, granularity, bucket_start) DO UPDATE SET
+    count = count + excluded.count,
+    sum = sum + excluded.sum,
+    sum_sq = sum_sq + excluded.sum_sq,
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max)
+"""
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def parse_timestamp(timestamp):
+    if isinstance(timestamp, datetime):
+        return timestamp
+    return datetime.strptime(normalize_timestamp(timestamp), TIMESTAMP_FORMAT)
+
+def bucket_starts(timestamp):
+    """Start of the hourly and daily bucket a timestamp falls into"""
+    moment = parse_timestamp(timestamp)
+    return {
+        'hour': moment.strftime('%Y-%m-%d %H:00:00'),
+        'day': moment.strftime('%Y-%m-%d 00:00:00')
+    }
+
+def parse_date_bound(value, end=False):
+    """'YYYY-MM-DD' or a full timestamp; a bare end date includes that whole day"""
+    if not value:
+        return None
+    try:
+        return parse_timestamp(value).strftime(TIMESTAMP_FORMAT)
+    except ValueError:
+        day = datetime.strptime(value, '%Y-%m-%d')
+        if end:
+            day += timedelta(days=1)
+        return day.strftime(TIMESTAMP_FORMAT)
+
+def format_hour(hour):
+    return f'{hour:02d}:00-{(hour + 1) % 24:02d}:00'
+
+class RollupStore(SQLiteStore):
+    schema = SCHEMA
+
+    def record(self, location_id, timestamp, occupancy_rate):
+        """Fold one analysis into its hourly and daily buckets"""
+        value = float(occupancy_rate)
+        conn = self._connection()
+        with conn:
+            conn.executemany(UPSERT, [
+                (location_id, granularity, start, 1, value, value * value, value, value)
+                for granularity, start in bucket_starts(timestamp).items()
+            ])
+
+    def merge_buckets(self, buckets):
+        """Upsert pre-aggregated {(location, granularity, start): [count, sum, sum_sq, min, max]} buckets"""
+        conn = self._connection()
+        with conn:
+            conn.executemany(UPSERT, [key + tuple(values) for key, values in buckets.items()])
+
+    def reset(self, location_id=None):
+        conn = self._connection()
+        with conn:
+            if location_id:
+                conn.execute("DELETE FROM occupancy_rollups WHERE location_id = ?", (location_id,))
+            else:
+                conn.execute("DELETE FROM occupancy_rollups")
+
+    def _range_query(self, granularity, location_id, start, end, columns, group_by=''):
+        sql = f"SELECT {columns} FROM occupancy_rollups WHERE location_id = ? AND granularity = ?"
+        params = [location_id, granularity]
+        if start:
+            sql += " AND bucket_start >= ?"
+            params.append(start)
+        if end:
+            sql += " AND bucket_start < ?"
+            params.append(end)
+        return self._connection().execute(sql + group_by, params)
+
+    def statistics(self, location_id, start_date=None, end_date=None, top_hours=2):
+        """Occupancy statistics for a location over [start_date, end_date], or None without data"""
+        start = parse_date_bound(start_date)
+        end = parse_date_bound(end_date, end=True)
+        # Whole days come from the daily buckets unless the range cuts through a day
+        whole_days = all(bound is None or bound.endswith('00:00:00') for bound in (start, end))
+        granularity = 'day' if whole_days else 'hour'
+        total = self._range_query(
+            granularity, location_id, start, end,
+            "SUM(count) AS count, SUM(sum) AS sum, SUM(sum_sq) AS sum_sq, MIN(min) AS min, MAX(max) AS max"
+        ).fetchone()
+        if not total or not total['count']:
+            return None
+
+        count = total['count']
+        mean = total['sum'] / count
+        variance = max(0.0, total['sum_sq'] / count - mean * mean)
+
+        by_hour = self._range_query(
+            'hour', location_id, start, end,
+            "CAST(substr(bucket_start, 12, 2) AS INTEGER) AS hour, SUM(sum) / SUM(count) AS average",
+            " GROUP BY hour"
+        ).fetchall()
+        ranked = sorted(by_hour, key=lambda row: row['average'])
+        return {
+            'average_occupancy': round(mean, 2),
+            'std_dev_occupancy': round(math.sqrt(variance), 2),
+            'min_occupancy': total['min'],
+            'max_occupancy': total['max'],
+            'peak_hours': [format_hour(row['hour']) for row in reversed(ranked[-top_hours:])],
+            'lowest_occupancy_hours': [format_hour(row['hour']) for row in ranked[:top_hours]],
+            'hourly_profile': {format_hour(row['hour']): round(row['average'], 2) for row in by_hour},
+            'total_records': count
+        }
+
+def aggregate(analyses):
+    """Accumulate (location_id, timestamp, occupancy_rate) tuples into rollup buckets in memory"""
+    buckets = {}
+    for location_id, timestamp, occupancy_rate in analyses:
+        value = float(occupancy_rate)
+        for granularity, start in bucket_starts(timestamp).items():
+            bucket = buckets.get((location_id, granularity, start))
+            if bucket is None:
+                buckets[(location_id, granularity, start)] = [1, value, value * value, value, value]
+            else:
+                bucket[0] += 1
+                bucket[1] += value
+                bucket[2] += value * value
+                bucket[3] = min(bucket[3], value)
+                bucket[4] = max(bucket[4], value)
+    return buckets
+
+def info_file_analyses(info_path):
+    for image_name, timestamp, detections in iter_info_analyses(info_path):
+        yield image_name, timestamp, summarize_detections(detections)['occupancy_rate']
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    backfill = subparsers.add_parser('backfill', help='build rollups from existing results in one streaming pass')
+    source = backfill.add_mutually_exclusive_group(required=True)
+    source.add_argument('--info', help='info.txt log to read (image name is used as the location)')
+    source.add_argument('--store', action='store_true', help='read the analyses table of the detection store')
+    backfill.add_argument('--db', default=DB_PATH)
+    backfill.add_argument('--reset', action='store_true', help='drop existing rollups first')
+    args = parser.parse_args()
+
+    rollups = RollupStore(args.db)
+    if args.reset:
+        rollups.reset()
+    analyses = info_file_analyses(args.info) if args.info else DetectionStore(args.db).iter_occupancy()
+    buckets = aggregate(analyses)
+    rollups.merge_buckets(buckets)
+    print(f"Wrote {len(buckets)} buckets to {args.db}")
+
+if __name__ == '__main__':
+    main()
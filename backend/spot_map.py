@@ -0,0 +1,403 @@
+"""Fixed-camera spot maps: detect the spots once, then classify each known spot per frame.
+
+A spot map is the canonical list of spot rectangles for one camera, built by clustering
+boxes from several detector runs (live, or replayed from info.txt / detections.txt).
+Once a map exists, frames are classified by cropping every spot ROI in one roi_align call
+and running them through SpotClassifier, a small empty/filled CNN. The full detector only
+runs again when the map is missing, stale, or due for its scheduled recalibration.
+
+    python spot_map.py build --camera lot_a --info info.txt --image lot_a.jpg
+    python spot_map.py build --camera lot_a --detections results/detections.txt --frame-size 720 1280
+    python spot_map.py train --images ../video-to-img/extracted_frames
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torchvision.ops import box_iou, nms, roi_align
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SPOT_MAP_FOLDER = os.path.join(BASE_DIR, 'spot_maps')
+CLASSIFIER_PATH = os.path.join(BASE_DIR, 'spot_classifier.pth')
+CROP_SIZE = 32
+
+# Detector labels: 1 = empty, 2 = filled. Classifier outputs index 0 = empty, 1 = filled.
+EMPTY_LABEL = 1
+FILLED_LABEL = 2
+
+class SpotClassifier(nn.Module):
+    """Small empty/filled CNN for CROP_SIZE x CROP_SIZE spot crops"""
+
+    def __init__(self):
+        super().__init__()
+        self.features = nn.Sequential(
+            nn.Conv2d(3, 16, 3, padding=1), nn.BatchNorm2d(16), nn.ReLU(inplace=True), nn.MaxPool2d(2),
+            nn.Conv2d(16, 32, 3, padding=1), nn.BatchNorm2d(32), nn.ReLU(inplace=True), nn.MaxPool2d(2),
+            nn.Conv2d(32, 64, 3, padding=1), nn.BatchNorm2d(64), nn.ReLU(inplace=True),
+            nn.AdaptiveAvgPool2d(1)
+        )
+        self.classifier = nn.Linear(64, 2)
+
+    def forward(self, x):
+        return self.classifier(torch.flatten(self.features(x), 1))
+
+def load_classifier(path=CLASSIFIER_PATH):
+    """Load classifier weights, or return None when no trained classifier is available"""
+    if not os.path.exists(path):
+        return None
+    classifier = SpotClassifier()
+    classifier.load_state_dict(torch.load(path, map_location=torch.device('cpu')))
+    classifier.eval()
+    return classifier
+
+def crop_spots(image_tensor, boxes, crop_size=CROP_SIZE):
+    """Crop and resize every box of a CHW frame in one roi_align call -> [N, 3, crop_size, crop_size]"""
+    return roi_align(image_tensor.unsqueeze(0), [boxes.float()], output_size=(crop_size, crop_size),
+                     spatial_scale=1.0, sampling_ratio=2, aligned=True)
+
+def classify_spots(image_tensor, boxes, classifier):
+    """Classify known spot boxes on a frame, returning a detector-style output dict"""
+    if len(boxes) == 0:
+        return {'boxes': boxes.reshape(0, 4).float(), 'labels': torch.zeros(0, dtype=torch.int64),
+                'scores': torch.zeros(0)}
+    with torch.no_grad():
+        probabilities = F.softmax(classifier(crop_spots(image_tensor, boxes)), dim=1)
+    scores, index = probabilities.max(dim=1)
+    return {'boxes': boxes.float(), 'labels': index + EMPTY_LABEL, 'scores': scores}
+
+def cluster_spot_boxes(frames, iou_threshold=0.5, min_support=0.5):
+    """Cluster boxes from several frames of the same camera into canonical spots.
+
+    `frames` is a list of [N, 4] box tensors, one per analysed frame. Each box joins the cluster
+    whose running mean overlaps it most (at most one box per cluster per frame), or starts a new
+    cluster. Clusters present in fewer than `min_support` of the frames are discarded.
+    Returns (boxes [M, 4], support [M]).
+    """
+    sums = torch.zeros(0, 4)
+    counts = torch.zeros(0)
+    for boxes in frames:
+        boxes = boxes.float().reshape(-1, 4)
+        if len(boxes) == 0:
+            continue
+        assigned = torch.full((len(boxes),), -1, dtype=torch.long)
+        if len(counts):
+            iou = box_iou(boxes, sums / counts.unsqueeze(1))
+            best_iou, best_cluster = iou.max(dim=1)
+            used = set()
+            for i in torch.argsort(best_iou, descending=True).tolist():
+                cluster = int(best_cluster[i])
+                if best_iou[i] < iou_threshold:
+                    break
+                if cluster not in used:
+                    used.add(cluster)
+                    assigned[i] = cluster
+
+        matched = assigned >= 0
+        if matched.any():
+            sums.index_add_(0, assigned[matched], boxes[matched])
+            counts.index_add_(0, assigned[matched], torch.ones(int(matched.sum())))
+        new_boxes = boxes[~matched]
+        sums = torch.cat([sums, new_boxes])
+        counts = torch.cat([counts, torch.ones(len(new_boxes))])
+
+    if not len(counts):
+        return torch.zeros(0, 4), torch.zeros(0)
+
+    support = counts / max(1, len(frames))
+    centers = sums / counts.unsqueeze(1)
+    keep = support >= min_support
+    centers, support = centers[keep], support[keep]
+    # Neighbouring clusters that drifted onto the same spot collapse into the best supported one
+    order = nms(centers, support, iou_threshold)
+    return centers[order], support[order]
+
+def read_info_frames(info_path, image_name):
+    """Box tensors per (image, timestamp) analysis recorded in an info.txt log"""
+    frames = {}
+    with open(info_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 8 or parts[0] != image_name:
+                continue
+            frames.setdefault(parts[1], []).append([float(v) for v in parts[4:8]])
+    return [torch.tensor(boxes) for _, boxes in sorted(frames.items())]
+
+def read_detection_log_frames(log_path, image_name):
+    """Box tensors per analysis in a detections.txt log.
+
+    Lines are grouped by the analysis id flaskapp writes after the box. Older lines have none;
+    consecutive ones of the image are taken as one analysis, which merges back-to-back uploads
+    under the same name.
+    """
+    frames = {}
+    legacy = None  # Key of the run of id-less lines being read
+    with open(log_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 7:
+                continue
+            if parts[0] != image_name:
+                legacy = None
+                continue
+            if len(parts) > 7:
+                key = parts[7]
+            else:
+                if legacy is None:
+                    legacy = len(frames)
+                key = legacy
+            frames.setdefault(key, []).append([float(v) for v in parts[3:7]])
+    return [torch.tensor(boxes) for boxes in frames.values()]
+
+class SpotMap:
+    """Canonical spot rectangles for one camera"""
+
+    def __init__(self, camera_id, boxes, support=None, frame_size=None, created_at=None):
+        self.camera_id = camera_id
+        self.boxes = boxes.float().reshape(-1, 4)
+        self.support = support if support is not None else torch.ones(len(self.boxes))
+        self.frame_size = tuple(frame_size) if frame_size else None
+        self.created_at = created_at or time.time()
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def age(self):
+        return time.time() - self.created_at
+
+    def to_dict(self):
+        spots = []
+        for i, (box, support) in enumerate(zip(self.boxes.tolist(), self.support.tolist())):
+            x_min, y_min, x_max, y_max = [round(v, 1) for v in box]
+            spots.append({
+                'id': i + 1,
+                'bbox': [x_min, y_min, x_max, y_max],
+                'polygon': [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]],
+                'support': round(support, 3)
+            })
+        return {
+            'camera_id': self.camera_id,
+            'created_at': self.created_at,
+            'frame_size': list(self.frame_size) if self.frame_size else None,
+            'spots': spots
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        boxes = torch.tensor([spot['bbox'] for spot in data['spots']], dtype=torch.float32)
+        support = torch.tensor([spot.get('support', 1.0) for spot in data['spots']], dtype=torch.float32)
+        return cls(data['camera_id'], boxes, support, data.get('frame_size'), data.get('created_at'))
+
+    @staticmethod
+    def path_for(camera_id, folder=SPOT_MAP_FOLDER):
+        safe_id = ''.join(c if c.isalnum() or c in '-_' else '_' for c in camera_id)
+        return os.path.join(folder, f'{safe_id}.json')
+
+    def save(self, folder=SPOT_MAP_FOLDER):
+        os.makedirs(folder, exist_ok=True)
+        path = self.path_for(self.camera_id, folder)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, camera_id, folder=SPOT_MAP_FOLDER):
+        path = cls.path_for(camera_id, folder)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+class SpotMapManager:
+    """Chooses per frame between the full detector and spot-map classification.
+
+    The detector runs while a camera has no map, when its map is older than `max_age` seconds,
+    when the frame size changed, and on every `recalibrate_every`-th frame. Boxes from the last
+    `calibration_frames` detector runs are clustered into the camera's map.
+    """
+
+    def __init__(self, classifier, folder=SPOT_MAP_FOLDER, max_age=24 * 3600, recalibrate_every=500,
+                 calibration_frames=5, iou_threshold=0.5, min_support=0.5, min_confidence=0.5):
+        self.classifier = classifier
+        self.folder = folder
+        self.max_age = max_age
+        self.recalibrate_every = recalibrate_every
+        self.iou_threshold = iou_threshold
+        self.min_support = min_support
+        self.min_confidence = min_confidence
+        self._maps = {}
+        self._frame_counts = {}
+        self._history = {}
+        self._calibration_frames = calibration_frames
+        self._lock = threading.Lock()
+        self.stats = {'classified_frames': 0, 'detector_frames': 0, 'rebuilds': 0}
+
+    def get_map(self, camera_id):
+        with self._lock:
+            if camera_id not in self._maps:
+                self._maps[camera_id] = SpotMap.load(camera_id, self.folder)
+            return self._maps[camera_id]
+
+    def needs_detector(self, camera_id, frame_size, offset=0):
+        """Whether the frame `offset` frames after the camera's next one must go through the detector"""
+        spot_map = self.get_map(camera_id)
+        if spot_map is None or len(spot_map) == 0:
+            return True
+        if spot_map.frame_size and tuple(spot_map.frame_size) != tuple(frame_size):
+            return True
+        if self.max_age and spot_map.age() > self.max_age:
+            return True
+        with self._lock:
+            count = self._frame_counts.get(camera_id, 0) + offset
+        return bool(self.recalibrate_every) and count > 0 and count % self.recalibrate_every == 0
+
+    def update_from_detections(self, camera_id, output, frame_size):
+        """Feed one detector output into the calibration history and rebuild the camera's map"""
+        confident = output['scores'] >= self.min_confidence
+        with self._lock:
+            history = self._history.setdefault(camera_id, deque(maxlen=self._calibration_frames))
+            history.append(output['boxes'][confident].detach().float())
+            frames = list(history)
+        # A single run is its own support; with more runs require the spot to recur
+        min_support = self.min_support if len(frames) > 1 else 0.0
+        boxes, support = cluster_spot_boxes(frames, self.iou_threshold, min_support)
+        spot_map = SpotMap(camera_id, boxes, support, frame_size)
+        spot_map.save(self.folder)
+        with self._lock:
+            self._maps[camera_id] = spot_map
+            self.stats['rebuilds'] += 1
+        return spot_map
+
+    def detect_batch(self, camera_id, image_tensors, submit_fn):
+        """Detector-style outputs for consecutive frames of one camera.
+
+        `submit_fn(index, image_tensor)` returns a Future of the detector output. Every frame
+        that needs the detector is submitted before any is waited on, so they share a batch; the
+        map decision for each frame counts the frames ahead of it in the batch.
+        """
+        futures = {}
+        outputs = [None] * len(image_tensors)
+        for i, image_tensor in enumerate(image_tensors):
+            if self.needs_detector(camera_id, tuple(image_tensor.shape[1:]), offset=i):
+                futures[i] = submit_fn(i, image_tensor)
+            else:
+                outputs[i] = classify_spots(image_tensor, self.get_map(camera_id).boxes, self.classifier)
+        for i, future in futures.items():
+            outputs[i] = future.result()
+            self.update_from_detections(camera_id, outputs[i], tuple(image_tensors[i].shape[1:]))
+        with self._lock:
+            self.stats['detector_frames'] += len(futures)
+            self.stats['classified_frames'] += len(image_tensors) - len(futures)
+            self._frame_counts[camera_id] = self._frame_counts.get(camera_id, 0) + len(image_tensors)
+        return outputs
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['cameras'] = len([m for m in self._maps.values() if m is not None])
+        return stats
+
+def train_classifier(crops, labels, epochs=10, batch_size=64, lr=1e-3):
+    """Train a SpotClassifier on [N, 3, CROP_SIZE, CROP_SIZE] crops with 0 = empty / 1 = filled labels"""
+    classifier = SpotClassifier()
+    optimizer = torch.optim.Adam(classifier.parameters(), lr=lr)
+    dataset = torch.utils.data.TensorDataset(crops, labels)
+    dataloader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=True)
+
+    classifier.train()
+    for epoch in range(epochs):
+        total_loss = 0.0
+        correct = 0
+        for batch, target in dataloader:
+            optimizer.zero_grad()
+            logits = classifier(batch)
+            loss = F.cross_entropy(logits, target)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(batch)
+            correct += int((logits.argmax(dim=1) == target).sum())
+        logger.info(f"Epoch {epoch + 1}/{epochs}, Loss: {total_loss / len(dataset):.4f}, "
+                    f"Accuracy: {correct / len(dataset):.3f}")
+    classifier.eval()
+    return classifier
+
+def collect_training_crops(image_paths, min_confidence=0.8):
+    """Label spot crops with the full detector so the classifier can be trained without hand labels"""
+    import cv2
+    from newer import detect_batch, image_to_tensor
+
+    crops = []
+    labels = []
+    for image_path in image_paths:
+        image_tensor = image_to_tensor(cv2.imread(image_path))
+        output = detect_batch([image_tensor])[0]
+        keep = (output['scores'] >= min_confidence) & ((output['labels'] == EMPTY_LABEL) | (output['labels'] == FILLED_LABEL))
+        if keep.any():
+            crops.append(crop_spots(image_tensor, output['boxes'][keep]))
+            labels.append(output['labels'][keep] - EMPTY_LABEL)
+    if not crops:
+        raise ValueError("The detector produced no confident spots to train on")
+    return torch.cat(crops), torch.cat(labels)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='build a camera spot map from historical results')
+    build.add_argument('--camera', required=True, help='camera/location id (the image name in the logs)')
+    build.add_argument('--info', help='info.txt to read analyses from')
+    build.add_argument('--detections', help='detections.txt to read analyses from')
+    size = build.add_mutually_exclusive_group(required=True)
+    size.add_argument('--image', help='a frame of the camera, for the frame size the boxes were detected at')
+    size.add_argument('--frame-size', type=int, nargs=2, metavar=('HEIGHT', 'WIDTH'))
+    build.add_argument('--iou', type=float, default=0.5)
+    build.add_argument('--min-support', type=float, default=0.5)
+    build.add_argument('--folder', default=SPOT_MAP_FOLDER)
+
+    train = subparsers.add_parser('train', help='train the empty/filled classifier from detector-labelled frames')
+    train.add_argument('--images', required=True, help='directory of .jpg frames')
+    train.add_argument('--epochs', type=int, default=10)
+    train.add_argument('--output', default=CLASSIFIER_PATH)
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        frames = []
+        if args.info:
+            frames += read_info_frames(args.info, args.camera)
+        if args.detections:
+            frames += read_detection_log_frames(args.detections, args.camera)
+        if not frames:
+            raise SystemExit(f"No analyses found for {args.camera}")
+        if args.image:
+            import cv2
+            image = cv2.imread(args.image)
+            if image is None:
+                raise SystemExit(f"Could not read {args.image}")
+            frame_size = image.shape[:2]
+        else:
+            frame_size = args.frame_size
+        boxes, support = cluster_spot_boxes(frames, args.iou, args.min_support)
+        # The map is only used on frames of this size; any other size sends the camera back to the detector
+        path = SpotMap(args.camera, boxes, support, frame_size).save(args.folder)
+        print(f"Built {len(boxes)} spots from {len(frames)} analyses -> {path}")
+    else:
+        image_paths = sorted(os.path.join(args.images, name) for name in os.listdir(args.images)
+                             if name.lower().endswith(('.jpg', '.jpeg', '.png')))
+        crops, labels = collect_training_crops(image_paths)
+        classifier = train_classifier(crops, labels, epochs=args.epochs)
+        torch.save(classifier.state_dict(), args.output)
+        print(f"Trained on {len(labels)} crops -> {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import threading
+import time
+
+import numpy as np
+
+FILLED_CLASS = 2
+
+def box_iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU of [N, 4] and [M, 4] xyxy boxes as an [N, M] array"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    wh = np.clip(bottom_right - top_left, 0, None)
+    intersection = wh[..., 0] * wh[..., 1]
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-6), 0.0)
+
+def greedy_match(iou, threshold):
+    """Match rows to columns by descending IoU; returns a list of (row, col) pairs above `threshold`"""
+    if iou.size == 0:
+        return []
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind='stable')
+    used_rows = set()
+    used_cols = set()
+    pairs = []
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        pairs.append((row, col))
+    return pairs
+
+class SpotTracker:
+    """Associates detections of one camera across analyses and smooths each spot's state.
+
+    Every track keeps an exponential moving average of P(filled) and only flips its status
+    when that average crosses `fill_on` (empty -> filled) or `fill_off` (filled -> empty), so a
+    single low-confidence detection cannot swing the occupancy. Tracks survive `max_misses`
+    analyses without a matching detection before they are dropped.
+    """
+
+    def __init__(self, iou_threshold=0.3, alpha=0.4, fill_on=0.6, fill_off=0.4, max_misses=3,
+                 min_confidence=0.5, confirm_frames=3):
+        self.iou_threshold = iou_threshold
+        self.alpha = alpha
+        self.fill_on = fill_on
+        self.fill_off = fill_off
+        self.max_misses = max_misses
+        self.min_confidence = min_confidence
+        self.confirm_frames = confirm_frames
+        self.next_id = 1
+        self.frames = 0
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.filled_score = np.zeros(0, dtype=np.float32)
+        self.filled = np.zeros(0, dtype=bool)
+        self.streak = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+        self.last_update = None
+        self._lock = threading.Lock()
+
+    def _observations(self, detections):
+        kept = [d for d in detections if d['confidence'] >= self.min_confidence]
+        boxes = np.array([d['bbox'] for d in kept], dtype=np.float32).reshape(-1, 4)
+        confidence = np.array([d['confidence'] for d in kept], dtype=np.float32)
+        is_filled = np.array([d['class_id'] == FILLED_CLASS for d in kept], dtype=bool)
+        # Probability that the spot is filled as reported by this detection
+        observed = np.where(is_filled, confidence, 1.0 - confidence)
+        return boxes, observed
+
+    def update(self, detections):
+        """Fold one analysis into the tracks and return the stable spot list"""
+        with self._lock:
+            boxes, observed = self._observations(detections)
+            pairs = greedy_match(box_iou_matrix(self.boxes, boxes), self.iou_threshold)
+            track_index = np.array([p[0] for p in pairs], dtype=np.int64)
+            detection_index = np.array([p[1] for p in pairs], dtype=np.int64)
+
+            matched = np.zeros(len(self.ids), dtype=bool)
+            matched[track_index] = True
+            alpha = self.alpha
+            self.boxes[track_index] = (1 - alpha) * self.boxes[track_index] + alpha * boxes[detection_index]
+            self.filled_score[track_index] = (1 - alpha) * self.filled_score[track_index] + alpha * observed[detection_index]
+            self.streak[matched] += 1
+            self.streak[~matched] = 0
+            self.misses[matched] = 0
+            self.misses[~matched] += 1
+
+            unmatched = np.ones(len(boxes), dtype=bool)
+            unmatched[detection_index] = False
+            new_count = int(unmatched.sum())
+            self.boxes = np.concatenate([self.boxes, boxes[unmatched]])
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + new_count)])
+            self.filled_score = np.concatenate([self.filled_score, observed[unmatched]])
+            self.filled = np.concatenate([self.filled, observed[unmatched] >= 0.5])
+            self.streak = np.concatenate([self.streak, np.ones(new_count, dtype=np.int64)])
+            self.misses = np.concatenate([self.misses, np.zeros(new_count, dtype=np.int64)])
+            self.next_id += new_count
+
+            # Hysteresis on the smoothed score
+            self.filled = np.where(self.filled, self.filled_score > self.fill_off, self.filled_score >= self.fill_on)
+
+            alive = self.misses <= self.max_misses
+            self.boxes = self.boxes[alive]
+            self.ids = self.ids[alive]
+            self.filled_score = self.filled_score[alive]
+            self.filled = self.filled[alive]
+            self.streak = self.streak[alive]
+            self.misses = self.misses[alive]
+
+            self.frames += 1
+            self.last_update = time.time()
+            return self._spots()
+
+    def _spots(self):
+        order = np.argsort(self.ids)
+        return [{
+            'id': int(self.ids[i]),
+            'status': 'filled' if self.filled[i] else 'empty',
+            'bbox': [int(round(v)) for v in self.boxes[i].tolist()],
+            'filled_score': round(float(self.filled_score[i]), 3),
+            'confirmed': bool(self.streak[i] >= self.confirm_frames)
+        } for i in order]
+
+    def spots(self):
+        with self._lock:
+            return self._spots()
+
+    def tracked_boxes(self):
+        with self._lock:
+            return self.boxes.copy()
+
+    def can_skip_detection(self):
+        """True when every tracked spot was confirmed in each of the last `confirm_frames` analyses"""
+        with self._lock:
+            return len(self.ids) > 0 and bool(np.all(self.streak >= self.confirm_frames))
+
+class SpotTrackerRegistry:
+    """One SpotTracker per camera/location id"""
+
+    def __init__(self, **tracker_options):
+        self.tracker_options = tracker_options
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def get(self, location_id):
+        with self._lock:
+            tracker = self._trackers.get(location_id)
+            if tracker is None:
+                tracker = SpotTracker(**self.tracker_options)
+                self._trackers[location_id] = tracker
+            return tracker
+
+    def update(self, location_id, detections):
+        return self.get(location_id).update(detections)
+
+def summarize_spots(spots):
+    """Counts and occupancy for a tracked spot list, in the shape returned by the analysis endpoints"""
+    total_spots = len(spots)
+    filled_spots = sum(1 for spot in spots if spot['status'] == 'filled')
+    return {
+        'total_spots': total_spots,
+        'filled_spots': filled_spots,
+        'empty_spots': total_spots - filled_spots,
+        'occupancy_rate': float((filled_spots / total_spots * 100) if total_spots > 0 else 0),
+        'spots_status': spots
+    }
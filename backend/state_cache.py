@@ -0,0 +1,46 @@
+import threading
+import time
+
+class LatestStateCache:
+    """Thread-safe latest analysis state per location, with versions for long-polling.
+
+    Every update gets a new, globally increasing version number. Readers that already hold
+    version N can wait for anything newer instead of polling on a fixed interval.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._version = 0
+        self._condition = threading.Condition()
+
+    def update(self, location_id, state):
+        with self._condition:
+            self._version += 1
+            self._states[location_id] = {
+                'state': state,
+                'version': self._version,
+                'updated_at': time.time()
+            }
+            self._condition.notify_all()
+            return self._version
+
+    def get(self, location_id):
+        """Return {'state', 'version', 'updated_at'} for a location, or None"""
+        with self._condition:
+            entry = self._states.get(location_id)
+            return dict(entry) if entry else None
+
+    def wait_for_update(self, location_id, since, timeout):
+        """Block until the location has a version newer than `since` or `timeout` seconds pass"""
+        def has_newer():
+            entry = self._states.get(location_id)
+            return entry is not None and entry['version'] > since
+
+        with self._condition:
+            self._condition.wait_for(has_newer, timeout)
+            entry = self._states.get(location_id)
+            return dict(entry) if entry else None
+
+    def locations(self):
+        with self._condition:
+            return list(self._states.keys())
@@ -0,0 +1,49 @@
+"""SubmissionController fed with the backend latencies measured on the single-core Raspberry Pi class host.
+
+    python -m pytest backend/tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camera_simulator import SubmissionController
+
+# Per-frame /api/analyze latencies measured for fasterrcnn_resnet50_fpn tiles (1.8-2.1 s)
+MEASURED_LATENCIES = [1.84, 1.92, 2.05, 1.97, 1.88, 2.11, 1.95, 2.02, 1.90, 1.99]
+
+def feed(controller, latencies, rounds=1):
+    for _ in range(rounds):
+        for latency in latencies:
+            controller.record(latency, {'detections': []})
+
+def test_measured_baseline_keeps_full_settings():
+    controller = SubmissionController(interval=10.0)
+    feed(controller, MEASURED_LATENCIES, rounds=3)
+    assert 1.8 <= controller.baseline_latency <= 2.1
+    assert (controller.interval, controller.max_size, controller.quality) == (10.0, 1280, 85)
+    assert controller.stats['degrades'] == 0
+
+def test_429_is_undone_at_measured_latency():
+    controller = SubmissionController(interval=10.0)
+    feed(controller, MEASURED_LATENCIES)
+    controller.record(2.0, {'error': 'Rate limited', 'status_code': 429, 'retry_after': '5'})
+    assert controller.interval == 20.0
+    feed(controller, MEASURED_LATENCIES, rounds=3)
+    assert controller.interval == 10.0
+    assert (controller.max_size, controller.quality) == (1280, 85)
+
+def test_429_is_undone_between_the_targets():
+    # 3.5 s is above the recover target (1.5x) but below the degrade target (3x) of a 2 s baseline
+    controller = SubmissionController(interval=10.0, baseline_latency=2.0)
+    controller.record(3.5, {'error': 'Rate limited', 'status_code': 429, 'retry_after': '5'})
+    assert controller.interval == 20.0
+    feed(controller, [3.5] * 10, rounds=3)
+    assert controller.interval == 10.0
+
+def test_slow_backend_degrades_and_recovers():
+    controller = SubmissionController(interval=10.0, baseline_latency=2.0)
+    feed(controller, [7.0] * 10)
+    assert controller.interval > 10.0
+    feed(controller, MEASURED_LATENCIES, rounds=20)
+    assert (controller.interval, controller.max_size, controller.quality) == (10.0, 1280, 85)
@@ -0,0 +1,191 @@
+import copy
+import math
+
+import torch
+import torch.nn.functional as F
+from torchvision.ops import batched_nms
+
+class TileConfig:
+    """Tile grid and merge settings for tiled inference.
+
+    The frame is cut into `rows` x `cols` equally sized tiles that overlap by `overlap`
+    (a fraction of the tile size). When `include_full_frame` is set, a copy of the whole
+    frame downscaled to tile size joins the same batch so objects larger than a tile are
+    still seen in one piece. Every input is resized by the detector to `min_size`/`max_size`.
+    The default of 400 keeps 2x2 tiles of a 640x360 frame at the same pixel density as one
+    default (800) full-frame pass, so the tiles together cost about one full-resolution pass
+    plus the overlap, rather than the two passes of the old crop-and-repredict heuristic.
+    """
+
+    def __init__(self, rows=2, cols=2, overlap=0.15, include_full_frame=True,
+                 min_size=400, max_size=1333, iou_threshold=0.5, edge_margin=4):
+        if rows < 1 or cols < 1:
+            raise ValueError("Tile grid needs at least one row and one column")
+        if not 0 <= overlap < 1:
+            raise ValueError("Tile overlap must be in [0, 1)")
+        self.rows = int(rows)
+        self.cols = int(cols)
+        self.overlap = float(overlap)
+        self.include_full_frame = include_full_frame
+        self.min_size = min_size
+        self.max_size = max_size
+        self.iou_threshold = iou_threshold
+        self.edge_margin = edge_margin
+
+    @property
+    def tile_count(self):
+        return self.rows * self.cols
+
+    def with_resolution(self, min_size=None, max_size=None):
+        """A copy of this config with the detector resize replaced where given"""
+        config = copy.copy(self)
+        if min_size is not None:
+            config.min_size = int(min_size)
+        if max_size is not None:
+            config.max_size = int(max_size)
+        return config
+
+def _axis_windows(length, parts, overlap):
+    """Start/end offsets of `parts` equal windows covering `length` with the given overlap"""
+    if parts == 1:
+        return [(0, length)]
+    size = min(length, int(math.ceil(length / (parts - (parts - 1) * overlap))))
+    step = (length - size) / (parts - 1)
+    return [(int(round(i * step)), int(round(i * step)) + size) for i in range(parts)]
+
+def tile_windows(height, width, rows, cols, overlap):
+    """Return the (x0, y0, x1, y1) window of every tile in row-major order"""
+    ys = _axis_windows(height, rows, overlap)
+    xs = _axis_windows(width, cols, overlap)
+    return [(x0, y0, x1, y1) for (y0, y1) in ys for (x0, x1) in xs]
+
+def input_scale(height, width, config):
+    """Factor the detector resizes a height x width frame's pixels by under `config` (below 1 is a downscale)"""
+    x0, y0, x1, y1 = tile_windows(height, width, config.rows, config.cols, config.overlap)[0]
+    short_side, long_side = sorted((y1 - y0, x1 - x0))
+    return min(config.min_size / short_side, config.max_size / long_side)
+
+def build_tile_inputs(image_tensor, config):
+    """Cut a CHW frame tensor into tile views.
+
+    Returns the list of model inputs and a [N, 4] tensor of (offset_x, offset_y, scale_x, scale_y)
+    that maps each input's box coordinates back to the full frame.
+    """
+    _, height, width = image_tensor.shape
+    windows = tile_windows(height, width, config.rows, config.cols, config.overlap)
+    inputs = [image_tensor[:, y0:y1, x0:x1] for (x0, y0, x1, y1) in windows]
+    transforms = [(x0, y0, 1.0, 1.0) for (x0, y0, _, _) in windows]
+
+    if config.include_full_frame and config.tile_count > 1:
+        tile_h = windows[0][3] - windows[0][1]
+        tile_w = windows[0][2] - windows[0][0]
+        scale = min(tile_h / height, tile_w / width)
+        size = (max(1, int(round(height * scale))), max(1, int(round(width * scale))))
+        overview = F.interpolate(image_tensor.unsqueeze(0), size=size, mode='bilinear', align_corners=False)[0]
+        inputs.append(overview)
+        transforms.append((0, 0, width / size[1], height / size[0]))
+
+    return inputs, torch.tensor(transforms, dtype=torch.float32)
+
+def _interior_edges(windows, width, height):
+    """Tile borders that are not also frame borders, as [N, 4] (left, top, right, bottom) with inf where absent"""
+    edges = []
+    for (x0, y0, x1, y1) in windows:
+        edges.append([
+            x0 if x0 > 0 else -math.inf,
+            y0 if y0 > 0 else -math.inf,
+            x1 if x1 < width else math.inf,
+            y1 if y1 < height else math.inf
+        ])
+    return torch.tensor(edges, dtype=torch.float32)
+
+def merge_tile_outputs(outputs, transforms, frame_size, config):
+    """Map per-tile detections back to frame coordinates and merge them with class-aware NMS"""
+    height, width = frame_size
+    counts = [len(output['boxes']) for output in outputs]
+    boxes = torch.cat([output['boxes'] for output in outputs]).float()
+    scores = torch.cat([output['scores'] for output in outputs])
+    labels = torch.cat([output['labels'] for output in outputs])
+    if boxes.numel() == 0:
+        return {'boxes': boxes.reshape(0, 4), 'labels': labels, 'scores': scores}
+
+    source = torch.repeat_interleave(torch.arange(len(outputs)), torch.tensor(counts))
+    per_box = transforms[source]
+    scale = per_box[:, [2, 3, 2, 3]]
+    offset = per_box[:, [0, 1, 0, 1]]
+    boxes = boxes * scale + offset
+
+    keep = torch.ones(len(boxes), dtype=torch.bool)
+    if config.include_full_frame and config.tile_count > 1:
+        # Boxes cut by an interior tile border are partial; the full-frame input covers those objects
+        windows = tile_windows(height, width, config.rows, config.cols, config.overlap)
+        edges = _interior_edges(windows, width, height)
+        is_tile = source < config.tile_count
+        tile_edges = edges[source.clamp(max=config.tile_count - 1)]
+        margin = config.edge_margin
+        touches = (
+            (boxes[:, 0] - tile_edges[:, 0] <= margin) |
+            (boxes[:, 1] - tile_edges[:, 1] <= margin) |
+            (tile_edges[:, 2] - boxes[:, 2] <= margin) |
+            (tile_edges[:, 3] - boxes[:, 3] <= margin)
+        )
+        keep &= ~(is_tile & touches)
+
+    boxes = boxes[keep]
+    scores = scores[keep]
+    labels = labels[keep]
+    boxes[:, 0::2] = boxes[:, 0::2].clamp(0, width)
+    boxes[:, 1::2] = boxes[:, 1::2].clamp(0, height)
+
+    order = batched_nms(boxes, scores, labels, config.iou_threshold)
+    return {'boxes': boxes[order], 'labels': labels[order], 'scores': scores[order]}
+
+class TiledDetector:
+    """Runs every tile of every queued frame through batched forward passes.
+
+    Instances are callable with a list of CHW frame tensors and return one merged output dict
+    per frame, which makes them usable directly as a BatchingScheduler runner. A frame can also
+    be given as a (tensor, TileConfig) pair to use its camera's own config; inputs sharing a
+    detector resolution go through one forward pass. When a call mixes resolutions and one
+    group's forward pass fails, the frames of that group get the exception in place of an
+    output and the other groups' frames are still returned.
+    """
+
+    def __init__(self, detect_fn, config=None):
+        self.detect_fn = detect_fn
+        self.config = config or TileConfig()
+
+    def __call__(self, frames):
+        groups = {}
+        plans = []
+        for frame in frames:
+            frame, config = frame if isinstance(frame, tuple) else (frame, self.config)
+            if config.tile_count == 1:
+                inputs, transforms = [frame], None
+            else:
+                inputs, transforms = build_tile_inputs(frame, config)
+            resolution = (config.min_size, config.max_size)
+            group = groups.setdefault(resolution, [])
+            plans.append((resolution, len(group), len(inputs), transforms, tuple(frame.shape[1:]), config))
+            group.extend(inputs)
+
+        outputs = {}
+        for resolution, inputs in groups.items():
+            try:
+                outputs[resolution] = self.detect_fn(inputs, min_size=resolution[0], max_size=resolution[1])
+            except Exception as e:
+                if len(groups) == 1:
+                    raise
+                outputs[resolution] = e
+
+        merged = []
+        for resolution, start, count, transforms, frame_size, config in plans:
+            if isinstance(outputs[resolution], Exception):
+                merged.append(outputs[resolution])
+                continue
+            frame_outputs = outputs[resolution][start:start + count]
+            if transforms is None:
+                merged.append(frame_outputs[0])
+            else:
+                merged.append(merge_tile_outputs(frame_outputs, transforms, frame_size, config))
+        return merged
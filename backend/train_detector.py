@@ -0,0 +1,246 @@
+"""Train any registered detector architecture and compare checkpoints on the same test split.
+
+Labels use the parkingSpotTrack.py format, one box per line: `filename class x1 y1 x2 y2`, where
+class 1 is an empty spot and anything else a filled one. Images are held out for testing by a
+hash of their file name, so every run with the same --seed and --test-fraction sees the same split.
+
+    python train_detector.py train --arch fasterrcnn_mobilenet_v3_large_320_fpn --labels train_labels.txt --images train_images
+    python train_detector.py compare final_model.pth fasterrcnn_mobilenet_v3_large_320_fpn.pth --labels train_labels.txt --images train_images
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from torchvision import transforms
+from torchvision.ops import box_iou
+
+from model_registry import ARCHITECTURES, build_model, default_checkpoint_path, load_checkpoint, save_checkpoint
+
+logger = logging.getLogger(__name__)
+
+def read_labels(labels_path):
+    """{filename: [(label, [x1, y1, x2, y2]), ...]} with label 1 for empty and 2 for filled spots"""
+    boxes_by_image = {}
+    with open(labels_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 6:
+                continue
+            label = 1 if parts[1] == '1' else 2
+            boxes_by_image.setdefault(parts[0], []).append((label, [float(v) for v in parts[2:6]]))
+    return boxes_by_image
+
+def is_test_image(filename, test_fraction, seed):
+    digest = hashlib.md5(f'{seed}:{filename}'.encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) / 0xFFFFFFFF < test_fraction
+
+def split_images(boxes_by_image, test_fraction=0.2, seed=0):
+    """(train filenames, test filenames), stable across runs and architectures"""
+    train, test = [], []
+    for filename in sorted(boxes_by_image):
+        (test if is_test_image(filename, test_fraction, seed) else train).append(filename)
+    return train, test
+
+class ParkingSpaceDataset(Dataset):
+    def __init__(self, image_folder, boxes_by_image, filenames):
+        self.image_folder = image_folder
+        self.boxes_by_image = boxes_by_image
+        self.filenames = filenames
+        self.transform = transforms.ToTensor()
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def __getitem__(self, idx):
+        filename = self.filenames[idx]
+        image = Image.open(os.path.join(self.image_folder, filename)).convert('RGB')
+        annotations = self.boxes_by_image[filename]
+        boxes = torch.tensor([box for _, box in annotations], dtype=torch.float32)
+        target = {
+            'boxes': boxes,
+            'labels': torch.tensor([label for label, _ in annotations], dtype=torch.long),
+            'area': (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]),
+            'iscrowd': torch.zeros(len(annotations), dtype=torch.long)
+        }
+        # The detector resizes internally; boxes stay in original image coordinates
+        return self.transform(image), target
+
+def collate(batch):
+    return tuple(zip(*batch))
+
+def train(arch, labels_path, images_dir, output, epochs=10, batch_size=4, lr=0.005,
+          test_fraction=0.2, seed=0, pretrained_backbone=True):
+    boxes_by_image = read_labels(labels_path)
+    train_files, test_files = split_images(boxes_by_image, test_fraction, seed)
+    logger.info(f"Training {arch} on {len(train_files)} images ({len(test_files)} held out)")
+
+    device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+    model = build_model(arch, pretrained_backbone=pretrained_backbone).to(device)
+    # A trailing batch of one image breaks batch norm in training (SSDlite trains its BN layers)
+    dataloader = DataLoader(ParkingSpaceDataset(images_dir, boxes_by_image, train_files), batch_size=batch_size,
+                            shuffle=True, collate_fn=collate, drop_last=len(train_files) > batch_size)
+    params = [p for p in model.parameters() if p.requires_grad]
+    optimizer = torch.optim.SGD(params, lr=lr, momentum=0.9, weight_decay=0.0005)
+
+    for epoch in range(epochs):
+        model.train()
+        total_loss = 0.0
+        for images, targets in dataloader:
+            images = [image.to(device) for image in images]
+            targets = [{k: v.to(device) for k, v in t.items()} for t in targets]
+            loss_dict = model(images, targets)
+            losses = sum(loss for loss in loss_dict.values())
+            optimizer.zero_grad()
+            losses.backward()
+            optimizer.step()
+            total_loss += losses.item()
+
+        average_loss = total_loss / max(1, len(dataloader))
+        logger.info(f"Epoch {epoch + 1}/{epochs}, Loss: {average_loss:.4f}")
+        save_checkpoint(model.cpu(), arch, output, epoch=epoch + 1, train_loss=average_loss,
+                        split={'labels': os.path.basename(labels_path), 'test_fraction': test_fraction, 'seed': seed})
+        model.to(device)
+    return output
+
+def average_precision(scores, matched, num_ground_truth):
+    """Area under the interpolated precision/recall curve (VOC all-point)"""
+    if num_ground_truth == 0:
+        return None
+    if len(scores) == 0:
+        return 0.0
+    order = np.argsort(-np.asarray(scores))
+    hits = np.asarray(matched, dtype=float)[order]
+    true_positives = np.cumsum(hits)
+    false_positives = np.cumsum(1 - hits)
+    recall = np.concatenate([[0.0], true_positives / num_ground_truth, [1.0]])
+    precision = np.concatenate([[0.0], true_positives / (true_positives + false_positives), [0.0]])
+    for i in range(len(precision) - 2, -1, -1):
+        precision[i] = max(precision[i], precision[i + 1])
+    steps = np.where(recall[1:] != recall[:-1])[0]
+    return float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1]))
+
+def evaluate(model, dataset, iou_threshold=0.5, score_threshold=0.5):
+    """mAP@iou_threshold, precision/recall at score_threshold and latency over a dataset"""
+    per_class = {1: {'scores': [], 'matched': [], 'ground_truth': 0}, 2: {'scores': [], 'matched': [], 'ground_truth': 0}}
+    latencies = []
+    true_positives = detections = ground_truth = 0
+    for image, target in dataset:
+        start = time.perf_counter()
+        with torch.no_grad():
+            output = model([image])[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        for label, stats in per_class.items():
+            gt_boxes = target['boxes'][target['labels'] == label]
+            keep = output['labels'] == label
+            boxes, scores = output['boxes'][keep], output['scores'][keep]
+            stats['ground_truth'] += len(gt_boxes)
+            ious = box_iou(boxes, gt_boxes) if len(boxes) and len(gt_boxes) else torch.zeros((len(boxes), len(gt_boxes)))
+            taken = set()
+            for i in torch.argsort(scores, descending=True).tolist():
+                hit = False
+                if ious.shape[1]:
+                    row = ious[i].clone()
+                    if taken:
+                        row[list(taken)] = 0
+                    best = int(row.argmax())
+                    if row[best] >= iou_threshold:
+                        taken.add(best)
+                        hit = True
+                stats['scores'].append(float(scores[i]))
+                stats['matched'].append(hit)
+                if scores[i] >= score_threshold:
+                    detections += 1
+                    true_positives += hit
+            ground_truth += len(gt_boxes)
+
+    aps = {label: average_precision(s['scores'], s['matched'], s['ground_truth']) for label, s in per_class.items()}
+    valid = [ap for ap in aps.values() if ap is not None]
+    latencies.sort()
+    return {
+        'images': len(latencies),
+        'map_50': round(sum(valid) / len(valid), 4) if valid else None,
+        'ap_empty': round(aps[1], 4) if aps[1] is not None else None,
+        'ap_filled': round(aps[2], 4) if aps[2] is not None else None,
+        'precision': round(true_positives / detections, 4) if detections else None,
+        'recall': round(true_positives / ground_truth, 4) if ground_truth else None,
+        'mean_latency_ms': round(sum(latencies) / len(latencies), 1) if latencies else None,
+        'p50_latency_ms': round(latencies[len(latencies) // 2], 1) if latencies else None
+    }
+
+def compare(checkpoints, labels_path, images_dir, test_fraction=0.2, seed=0, limit=None, num_threads=None):
+    boxes_by_image = read_labels(labels_path)
+    _, test_files = split_images(boxes_by_image, test_fraction, seed)
+    dataset = ParkingSpaceDataset(images_dir, boxes_by_image, test_files[:limit])
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    rows = []
+    for path in checkpoints:
+        model, info = load_checkpoint(path)
+        row = {
+            'checkpoint': os.path.basename(path),
+            'arch': info['arch'],
+            'params_m': round(sum(p.numel() for p in model.parameters()) / 1e6, 2),
+            'size_mb': round(os.path.getsize(path) / 1024 / 1024, 1)
+        }
+        row.update(evaluate(model, dataset))
+        logger.info(f"{row['checkpoint']}: {row}")
+        rows.append(row)
+    return {'labels': labels_path, 'test_fraction': test_fraction, 'seed': seed, 'threads': torch.get_num_threads(),
+            'test_images': len(dataset), 'results': rows}
+
+def format_report(report):
+    header = '| checkpoint | arch | params (M) | mAP@0.5 | precision | recall | mean ms | p50 ms |'
+    lines = [header, '|' + '---|' * 8]
+    for r in report['results']:
+        lines.append(f"| {r['checkpoint']} | {r['arch']} | {r['params_m']} | {r['map_50']} | {r['precision']} | "
+                     f"{r['recall']} | {r['mean_latency_ms']} | {r['p50_latency_ms']} |")
+    return '\n'.join(lines)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name in ('train', 'compare'):
+        sub = subparsers.add_parser(name)
+        sub.add_argument('--labels', default='train_labels.txt')
+        sub.add_argument('--images', default='train_images')
+        sub.add_argument('--test-fraction', type=float, default=0.2)
+        sub.add_argument('--seed', type=int, default=0)
+    trainer = subparsers.choices['train']
+    trainer.add_argument('--arch', choices=list(ARCHITECTURES), required=True)
+    trainer.add_argument('--epochs', type=int, default=10)
+    trainer.add_argument('--batch-size', type=int, default=4)
+    trainer.add_argument('--lr', type=float, default=0.005)
+    trainer.add_argument('--no-pretrained-backbone', action='store_true')
+    trainer.add_argument('--output', help='defaults to <arch>.pth (final_model.pth for the original detector)')
+    comparer = subparsers.choices['compare']
+    comparer.add_argument('checkpoints', nargs='+')
+    comparer.add_argument('--limit', type=int, help='evaluate only the first N test images')
+    comparer.add_argument('--threads', type=int, help='torch threads, to match the deployment CPU')
+    comparer.add_argument('--output', default='model_comparison.json')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        output = args.output or default_checkpoint_path(args.arch)
+        train(args.arch, args.labels, args.images, output, args.epochs, args.batch_size, args.lr,
+              args.test_fraction, args.seed, pretrained_backbone=not args.no_pretrained_backbone)
+        print(f"Saved {args.arch} checkpoint to {output}")
+        return
+
+    report = compare(args.checkpoints, args.labels, args.images, args.test_fraction, args.seed, args.limit, args.threads)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(format_report(report))
+    print(f"Wrote {args.output}")
+
+if __name__ == '__main__':
+    main()
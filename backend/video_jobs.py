@@ -0,0 +1,186 @@
+"""Background video analysis jobs.
+
+A submitted video is analyzed on a small executor while clients poll the job's progress or
+stream its per-frame results as they are produced; overlays are written to disk per frame and
+fetched on demand instead of being inlined in the results.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class VideoJob:
+    """State of one background video analysis.
+
+    Per-frame results are small summaries; frame pixels and overlays live on disk under
+    `work_dir`, so a job's memory does not grow with the length of the video.
+    """
+
+    def __init__(self, job_id, filename, video_path, work_dir, location_id=None):
+        self.id = job_id
+        self.filename = filename
+        self.video_path = video_path
+        self.work_dir = work_dir
+        self.location_id = location_id
+        self.status = 'queued'
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.frames_expected = None
+        self.timing = None
+        self.results = []
+        self._condition = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ('completed', 'failed')
+
+    def overlay_path(self, frame_number):
+        return os.path.join(self.work_dir, f'{frame_number:08d}.jpg')
+
+    def set_expected(self, frames_expected):
+        with self._condition:
+            self.frames_expected = frames_expected
+
+    def add_result(self, result):
+        with self._condition:
+            result['frame_index'] = len(self.results)
+            self.results.append(result)
+            self._condition.notify_all()
+            return result['frame_index']
+
+    def _finish(self, status, error=None):
+        with self._condition:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+            self._condition.notify_all()
+
+    def to_dict(self):
+        with self._condition:
+            analyzed = len(self.results)
+            occupancy = [r['occupancy_rate'] for r in self.results]
+            return {
+                'job_id': self.id,
+                'filename': self.filename,
+                'location_id': self.location_id,
+                'status': self.status,
+                'error': self.error,
+                'frames_analyzed': analyzed,
+                'frames_expected': self.frames_expected,
+                'progress': round(min(1.0, analyzed / self.frames_expected), 3) if self.frames_expected else None,
+                'average_occupancy': sum(occupancy) / len(occupancy) if occupancy else 0,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'timing': self.timing
+            }
+
+    def iter_results(self, start=0, idle_timeout=None):
+        """Yield frame results from `start` as they are produced, returning once the job is done.
+
+        With `idle_timeout`, also returns when no new result has arrived for that many seconds.
+        """
+        index = start
+        while True:
+            deadline = time.time() + idle_timeout if idle_timeout else None
+            with self._condition:
+                while index >= len(self.results) and not self.done:
+                    remaining = deadline - time.time() if deadline else None
+                    if remaining is not None and remaining <= 0:
+                        return
+                    self._condition.wait(remaining)
+                pending = self.results[index:]
+                finished = self.done
+            for result in pending:
+                yield result
+            index += len(pending)
+            if finished and index >= len(self.results):
+                return
+
+    def finished_at_index(self, index):
+        """Whether a reader that has seen results up to `index` has seen the whole job"""
+        with self._condition:
+            return self.done and index >= len(self.results)
+
+class VideoJobManager:
+    """Runs video analyses on a background executor and keeps the most recent jobs.
+
+    `run_fn(job)` does the work; it reports frames with `job.add_result()`. The uploaded video is
+    deleted once the job ends, and the oldest finished jobs (with their overlays) are dropped when
+    more than `max_jobs` are kept.
+    """
+
+    def __init__(self, run_fn, work_folder, max_workers=1, max_jobs=20):
+        self.run_fn = run_fn
+        self.work_folder = os.path.abspath(work_folder)
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='video-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        os.makedirs(work_folder, exist_ok=True)
+
+    def create(self, filename, location_id=None):
+        """Allocate a job and its working directory; the caller saves the upload to `job.video_path`"""
+        job_id = uuid.uuid4().hex
+        work_dir = os.path.join(self.work_folder, job_id)
+        os.makedirs(work_dir, exist_ok=True)
+        video_path = os.path.join(work_dir, f'source{os.path.splitext(filename)[1]}')
+        job = VideoJob(job_id, filename, video_path, work_dir, location_id)
+        with self._lock:
+            self._jobs[job_id] = job
+        self._prune()
+        return job
+
+    def start(self, job):
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            self.run_fn(job)
+            job._finish('completed')
+        except Exception as e:
+            logger.error(f"Video job {job.id} failed: {str(e)}")
+            job._finish('failed', str(e))
+        finally:
+            if os.path.exists(job.video_path):
+                os.remove(job.video_path)
+
+    def _prune(self):
+        with self._lock:
+            finished = sorted((j for j in self._jobs.values() if j.done), key=lambda j: j.finished_at)
+            excess = len(self._jobs) - self.max_jobs
+            expired = finished[:max(0, excess)]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+
+def ndjson_stream(results):
+    for result in results:
+        yield json.dumps(result) + '\n'
+
+def sse_stream(results, job, start=0):
+    """Frames as SSE, then `done` for a complete job, or `timeout` with the `start` to resume from"""
+    index = start
+    for result in results:
+        index += 1
+        yield f"event: frame\ndata: {json.dumps(result)}\n\n"
+    if job.finished_at_index(index):
+        yield f"event: done\ndata: {json.dumps(job.to_dict())}\n\n"
+    else:
+        yield f"event: timeout\ndata: {json.dumps({'start': index, 'job': job.to_dict()})}\n\n"
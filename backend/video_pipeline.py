@@ -0,0 +1,210 @@
+"""Staged video processing connected by bounded queues.
+
+    decode thread -> inference thread (batches) -> overlay/encode pool -> caller
+                                                \\-> log writer thread
+
+Each stage runs on its own thread(s), so decoding and disk writes overlap with inference
+instead of running between model calls. Bounded queues hold back a fast producer when a
+later stage falls behind, so at most a few frames per stage are in memory. Results come
+out in frame order.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+class StageTimer:
+    """Busy time, time blocked on queues and item count for one stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_s = 0.0
+        self.wait_s = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, busy_s=0.0, wait_s=0.0, items=0):
+        with self._lock:
+            self.busy_s += busy_s
+            self.wait_s += wait_s
+            self.items += items
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'items': self.items,
+                'busy_s': round(self.busy_s, 4),
+                'wait_s': round(self.wait_s, 4),
+                'ms_per_item': round(self.busy_s / self.items * 1000, 2) if self.items else None
+            }
+
+class VideoPipeline:
+    """Run sampled video frames through decode, batched inference, post-processing and logging stages.
+
+    `frames` yields (frame_number, video_time_s, frame). `infer_fn(batch)` takes a list of those
+    tuples and returns one frame result per item, in order. `post_fn(frame_result, frame)` runs on
+    a pool of `post_workers` threads and its return values are what iterating the pipeline yields.
+    `record_fn(frame_result)` runs on a single writer thread, so records are written in order.
+    """
+
+    def __init__(self, frames, infer_fn, post_fn, record_fn=None, batch_size=4, queue_size=8, post_workers=2):
+        self.frames = frames
+        self.infer_fn = infer_fn
+        self.post_fn = post_fn
+        self.record_fn = record_fn
+        self.batch_size = batch_size
+        self.post_workers = post_workers
+        self._decoded = queue.Queue(maxsize=queue_size)
+        self._inferred = queue.Queue(maxsize=queue_size)
+        self._records = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self.timers = {name: StageTimer(name) for name in ('decode', 'inference', 'post', 'record')}
+        self.batches = 0
+        self.wall_s = None
+
+    def _put(self, q, item, timer):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        timer.add(wait_s=time.perf_counter() - start)
+
+    def _get(self, q, timer, block=True):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.1) if block else q.get_nowait()
+                timer.add(wait_s=time.perf_counter() - start)
+                return item
+            except queue.Empty:
+                if not block:
+                    return None
+        return _DONE
+
+    def _fail(self, stage, error):
+        logger.error(f"Video pipeline {stage} stage failed: {str(error)}")
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _decode(self):
+        timer = self.timers['decode']
+        try:
+            frames = iter(self.frames)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                item = next(frames, _DONE)
+                if item is _DONE:
+                    break
+                timer.add(busy_s=time.perf_counter() - start, items=1)
+                self._put(self._decoded, item, timer)
+        except Exception as e:
+            self._fail('decode', e)
+        finally:
+            self._put(self._decoded, _DONE, timer)
+
+    def _infer(self):
+        timer = self.timers['inference']
+        try:
+            finished = False
+            while not finished:
+                first = self._get(self._decoded, timer)
+                if first is _DONE:
+                    break
+                batch = [first]
+                while len(batch) < self.batch_size:
+                    item = self._get(self._decoded, timer, block=False)
+                    if item is None:
+                        break
+                    if item is _DONE:
+                        finished = True
+                        break
+                    batch.append(item)
+
+                start = time.perf_counter()
+                results = self.infer_fn(batch)
+                timer.add(busy_s=time.perf_counter() - start, items=len(batch))
+                self.batches += 1
+                for (_, _, frame), frame_result in zip(batch, results):
+                    if self.record_fn is not None:
+                        self._put(self._records, frame_result, timer)
+                    self._put(self._inferred, (frame_result, frame), timer)
+        except Exception as e:
+            self._fail('inference', e)
+        finally:
+            self._put(self._inferred, _DONE, timer)
+            self._put(self._records, _DONE, timer)
+
+    def _record(self):
+        timer = self.timers['record']
+        try:
+            while True:
+                frame_result = self._get(self._records, timer)
+                if frame_result is _DONE:
+                    break
+                start = time.perf_counter()
+                self.record_fn(frame_result)
+                timer.add(busy_s=time.perf_counter() - start, items=1)
+        except Exception as e:
+            self._fail('record', e)
+
+    def _timed_post(self, frame_result, frame):
+        start = time.perf_counter()
+        output = self.post_fn(frame_result, frame)
+        self.timers['post'].add(busy_s=time.perf_counter() - start, items=1)
+        return output
+
+    def __iter__(self):
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self._decode, name='video-decode', daemon=True),
+                   threading.Thread(target=self._infer, name='video-infer', daemon=True)]
+        if self.record_fn is not None:
+            threads.append(threading.Thread(target=self._record, name='video-record', daemon=True))
+        for thread in threads:
+            thread.start()
+
+        pending = deque()
+        timer = self.timers['post']
+        try:
+            with ThreadPoolExecutor(max_workers=self.post_workers, thread_name_prefix='video-post') as pool:
+                finished = False
+                while not finished or pending:
+                    # Keep up to post_workers frames in flight and hand results back in frame order
+                    while not finished and len(pending) < self.post_workers:
+                        item = self._get(self._inferred, timer, block=not pending)
+                        if item is None:
+                            break
+                        if item is _DONE:
+                            finished = True
+                            break
+                        pending.append(pool.submit(self._timed_post, *item))
+                    if pending:
+                        yield pending.popleft().result()
+            for thread in threads:
+                thread.join()
+        finally:
+            self._stop.set()
+            self.wall_s = time.perf_counter() - start
+        if self._error is not None:
+            raise self._error
+
+    def report(self):
+        """Per-stage timings; the stage with the most busy time per item bounds throughput"""
+        frames = self.timers['inference'].items
+        return {
+            'frames': frames,
+            'batches': self.batches,
+            'wall_s': round(self.wall_s, 4) if self.wall_s is not None else None,
+            'frames_per_s': round(frames / self.wall_s, 3) if self.wall_s and frames else None,
+            'stages': {name: timer.to_dict() for name, timer in self.timers.items()}
+        }
@@ -0,0 +1,97 @@
+"""Sampled video decoding that skips the frames it does not analyze.
+
+Frames between samples are skipped with keyframe-aligned seeks when the gap is long and with
+`grab()` (no colour conversion or copy) when it is short, so only sampled frames are fully
+retrieved and decode time follows the number of samples rather than the length of the video.
+Videos without a usable frame rate are sampled by their presentation timestamps instead.
+"""
+import math
+import shutil
+
+import cv2
+
+SAMPLE_INTERVAL_S = 15.0
+SEEK_MIN_GAP = 120
+FALLBACK_FPS = 25.0
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+def spool_upload(stream, path, chunk_size=SPOOL_CHUNK_SIZE):
+    """Copy an upload stream to disk in fixed-size chunks and return the number of bytes written"""
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(stream, f, chunk_size)
+        return f.tell()
+
+def video_fps(cap):
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    return fps if fps and math.isfinite(fps) and fps > 0 else None
+
+def estimate_sample_count(video_path, interval_s=SAMPLE_INTERVAL_S):
+    """Number of frames iter_sampled_frames will yield, or None if the container does not say"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = video_fps(cap)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if fps is None or frame_count <= 0:
+            return None
+        return math.ceil(frame_count / max(1.0, interval_s * fps))
+    finally:
+        cap.release()
+
+def _skip_to(cap, position, target, seek_min_gap):
+    """Advance the capture from frame `position` to `target` and return where it is, or None at end of stream"""
+    if target - position >= seek_min_gap and cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+        # Some containers land near rather than on the target; carry on from wherever the seek went
+        position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    while position < target:
+        if not cap.grab():
+            return None
+        position += 1
+    return position
+
+def _sample_by_frame_index(cap, fps, interval_s, seek_min_gap):
+    step = max(1.0, interval_s * fps)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    position = 0
+    sample = 0
+    while True:
+        target = int(round(sample * step))
+        if frame_count > 0 and target >= frame_count:
+            return
+        position = _skip_to(cap, position, target, seek_min_gap)
+        if position is None:
+            return
+        ok, frame = cap.read()
+        if not ok:
+            return
+        yield position, position / fps, frame
+        position += 1
+        while int(round(sample * step)) < position:
+            sample += 1
+
+def _sample_by_timestamp(cap, interval_s):
+    next_sample_ms = 0.0
+    frame_number = 0
+    while cap.grab():
+        position_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+        if not position_ms or position_ms <= 0:
+            position_ms = frame_number * 1000.0 / FALLBACK_FPS
+        if position_ms >= next_sample_ms:
+            ok, frame = cap.retrieve()
+            if ok:
+                yield frame_number, position_ms / 1000.0, frame
+            next_sample_ms = position_ms + interval_s * 1000.0
+        frame_number += 1
+
+def iter_sampled_frames(video_path, interval_s=SAMPLE_INTERVAL_S, seek_min_gap=SEEK_MIN_GAP):
+    """Yield (frame_number, video_time_s, frame) for one frame every `interval_s` seconds of video"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video {video_path}")
+        fps = video_fps(cap)
+        if fps is not None:
+            yield from _sample_by_frame_index(cap, fps, interval_s, seek_min_gap)
+        else:
+            yield from _sample_by_timestamp(cap, interval_s)
+    finally:
+        cap.release()
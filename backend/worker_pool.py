@@ -0,0 +1,263 @@
+"""Pre-forked inference worker processes sharing the loaded model weights.
+
+The workers are forked after the model is loaded, with its parameters moved to shared memory,
+so every process runs the same weights without its own copy. Each worker is pinned to its own
+slice of cores with torch.set_num_threads matching the slice, so workers do not fight over
+intra-op threads. Batches go to the least-loaded live worker.
+
+    python worker_pool.py tune [--workers 1 2 4] [--threads 1 2 4] [--requests 16]
+
+`tune` benchmarks worker count x threads per worker on this host and writes the fastest
+configuration to inference_pool.json, which flaskapp uses when INFERENCE_WORKERS is not set.
+"""
+import argparse
+import glob
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError, wait
+
+import torch
+import torch.multiprocessing as mp
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TUNED_CONFIG_PATH = os.path.join(BASE_DIR, 'inference_pool.json')
+WORKER_CHECK_INTERVAL = 1.0  # Seconds between liveness checks of the worker processes
+
+def available_cores():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+def core_slices(num_workers, threads_per_worker, cores=None):
+    """Consecutive core ids per worker, wrapping around when the host has fewer cores than requested"""
+    cores = cores or available_cores()
+    return [[cores[(i * threads_per_worker + j) % len(cores)] for j in range(threads_per_worker)]
+            for i in range(num_workers)]
+
+def _worker_main(index, runner, cores, threads, tasks, results):
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, batch = task
+        try:
+            results.put((index, task_id, runner(batch), None))
+        except Exception as e:
+            # Exceptions do not always pickle; the parent re-raises the message
+            results.put((index, task_id, None, f'{type(e).__name__}: {e}'))
+
+class InferencePool:
+    """`num_workers` forked processes each running `runner(batch)` on their own cores.
+
+    `shared` modules are moved to shared memory before forking. `run(batch)` has the same
+    signature as `runner`, so the pool can be handed to BatchingScheduler as its runner; it
+    raises TimeoutError after `timeout` seconds (None waits for good).
+    """
+
+    def __init__(self, runner, num_workers, threads_per_worker=None, shared=(), pin=True, timeout=None):
+        for module in shared:
+            module.share_memory()
+        context = mp.get_context('fork')
+        cores = available_cores()
+        self.threads_per_worker = threads_per_worker or max(1, len(cores) // num_workers)
+        self.timeout = timeout
+        self._results = context.Queue()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._task_ids = itertools.count()
+        self._next_worker = 0
+        self._closing = False
+        self.workers = []
+        for index, worker_cores in enumerate(core_slices(num_workers, self.threads_per_worker, cores)):
+            tasks = context.Queue()
+            process = context.Process(
+                target=_worker_main,
+                args=(index, runner, worker_cores if pin else None, self.threads_per_worker, tasks, self._results),
+                name=f'inference-worker-{index}',
+                daemon=True
+            )
+            process.start()
+            self.workers.append({'process': process, 'tasks': tasks, 'cores': worker_cores,
+                                 'in_flight': 0, 'completed': 0, 'alive': True})
+        self._collector = threading.Thread(target=self._collect, name='inference-pool-collector', daemon=True)
+        self._collector.start()
+        logger.info(f"Started {num_workers} inference workers with {self.threads_per_worker} threads each")
+
+    def _pick_worker(self):
+        """Least in-flight work among live workers, rotating between ties"""
+        live = [i for i, worker in enumerate(self.workers) if worker['alive']]
+        if not live:
+            raise RuntimeError('No live inference workers')
+        count = len(self.workers)
+        index = min(live, key=lambda i: (self.workers[i]['in_flight'], (i - self._next_worker) % count))
+        self._next_worker = (index + 1) % count
+        return index
+
+    def submit(self, batch):
+        """Send a batch to a worker and return a Future for its list of outputs"""
+        future = Future()
+        with self._lock:
+            index = self._pick_worker()
+            task_id = next(self._task_ids)
+            self._pending[task_id] = (index, future)
+            self.workers[index]['in_flight'] += 1
+        self.workers[index]['tasks'].put((task_id, batch))
+        return future
+
+    def run(self, batch):
+        future = self.submit(batch)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # The collector drops the result if it still arrives
+            future.cancel()
+            raise
+
+    def _collect(self):
+        next_check = time.monotonic() + WORKER_CHECK_INTERVAL
+        while not self._closing:
+            # Checked on a timer: a busy results queue must not hide a dead worker
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + WORKER_CHECK_INTERVAL
+            try:
+                index, task_id, outputs, error = self._results.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            with self._lock:
+                _, future = self._pending.pop(task_id, (None, None))
+                if future is not None:
+                    # Tasks of a worker found dead were failed and its count reset already
+                    self.workers[index]['in_flight'] -= 1
+                    self.workers[index]['completed'] += 1
+            if future is None or not future.set_running_or_notify_cancel():
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(outputs)
+
+    def _check_workers(self):
+        """Stop routing to workers that died and fail the work they were holding"""
+        failed = []
+        with self._lock:
+            if self._closing:
+                return
+            for index, worker in enumerate(self.workers):
+                if worker['alive'] and not worker['process'].is_alive():
+                    worker['alive'] = False
+                    logger.error(f"Inference worker {index} exited with code {worker['process'].exitcode}")
+                    for task_id, (owner, future) in list(self._pending.items()):
+                        if owner == index:
+                            del self._pending[task_id]
+                            failed.append(future)
+                    worker['in_flight'] = 0
+        for future in failed:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError('Inference worker died'))
+
+    def close(self, timeout=10):
+        self._closing = True
+        for worker in self.workers:
+            if worker['alive']:
+                worker['tasks'].put(None)
+        for worker in self.workers:
+            worker['process'].join(timeout)
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+        self._collector.join(timeout)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'threads_per_worker': self.threads_per_worker,
+                'workers': [{
+                    'pid': worker['process'].pid,
+                    'cores': worker['cores'],
+                    'alive': worker['alive'],
+                    'in_flight': worker['in_flight'],
+                    'completed': worker['completed']
+                } for worker in self.workers]
+            }
+
+def load_tuned_config(path=TUNED_CONFIG_PATH):
+    """The configuration written by `tune`, or None if missing or measured on a different core count"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        config = json.load(f)
+    if config.get('host_cores') != len(available_cores()):
+        logger.warning(f"Ignoring {path}: tuned for {config.get('host_cores')} cores, this host has {len(available_cores())}")
+        return None
+    return config
+
+def tune(runner, frames, worker_counts, thread_counts, requests=16, shared=()):
+    """Throughput of every worker x thread combination that fits on this host's cores"""
+    cores = len(available_cores())
+    results = []
+    for num_workers, threads in itertools.product(worker_counts, thread_counts):
+        if num_workers * threads > cores:
+            logger.info(f"Skipping {num_workers} workers x {threads} threads: only {cores} cores")
+            continue
+        pool = InferencePool(runner, num_workers, threads, shared=shared)
+        try:
+            # One warm-up batch per worker so first-call allocation is not measured
+            wait([pool.submit([frames[i % len(frames)]]) for i in range(num_workers)])
+            start = time.perf_counter()
+            futures = [pool.submit([frames[i % len(frames)]]) for i in range(requests)]
+            for future in futures:
+                future.result()
+            elapsed = time.perf_counter() - start
+        finally:
+            pool.close()
+        result = {'workers': num_workers, 'threads_per_worker': threads,
+                  'seconds': round(elapsed, 3), 'frames_per_s': round(requests / elapsed, 3)}
+        logger.info(f"{num_workers} workers x {threads} threads: {result['frames_per_s']} frames/s")
+        results.append(result)
+    return results
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    tuner = subparsers.add_parser('tune', help='benchmark worker/thread combinations and save the fastest')
+    tuner.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    tuner.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    tuner.add_argument('--requests', type=int, default=16)
+    tuner.add_argument('--frames', default=os.path.join(os.path.dirname(BASE_DIR), 'video-to-img', 'extracted_frames'))
+    tuner.add_argument('--no-tiling', action='store_true', help='benchmark single full-frame passes')
+    tuner.add_argument('--output', default=TUNED_CONFIG_PATH)
+    args = parser.parse_args()
+
+    from newer import model, detect_batch, load_tensor
+    from tiling import TiledDetector
+
+    paths = sorted(glob.glob(os.path.join(args.frames, '*.jpg')))[:8]
+    if not paths:
+        raise SystemExit(f"No frames found in {args.frames}")
+    frames = [load_tensor(path) for path in paths]
+    runner = detect_batch if args.no_tiling else TiledDetector(detect_batch)
+
+    results = tune(runner, frames, args.workers, args.threads, args.requests, shared=[model])
+    if not results:
+        raise SystemExit('No combination fits on this host')
+    best = max(results, key=lambda result: result['frames_per_s'])
+    config = dict(best, host_cores=len(available_cores()), tuned_at=time.strftime('%Y-%m-%d %H:%M:%S'), results=results)
+    with open(args.output, 'w') as f:
+        json.dump(config, f, indent=2)
+    print(f"Best: {best['workers']} workers x {best['threads_per_worker']} threads, "
+          f"{best['frames_per_s']} frames/s -> {args.output}")
+
+if __name__ == '__main__':
+    main()
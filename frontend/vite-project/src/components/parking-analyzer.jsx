@@ -147,7 +147,9 @@ export function ParkingAnalyzer() {
         availableSpots: data.empty_spots,
         occupiedSpots: data.filled_spots,
         spotMap: data.spots_status?.map(spot => spot.status === "filled") || [],
-        overlayImage: data.overlay_image ? `data:image/jpeg;base64,${data.overlay_image}` : null
+        overlayImage: data.overlay_url
+          ? new URL(data.overlay_url, API_BASE_URL).href
+          : data.overlay_image ? `data:image/jpeg;base64,${data.overlay_image}` : null
       });
     } catch (error) {
       setError(error.message || "Analysis failed");
@@ -4,10 +4,13 @@ import cv2
 import numpy as np
 import os
 import matplotlib.pyplot as plt
-from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
 from torchvision import transforms
 from PIL import Image
 from datetime import datetime
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from model_registry import load_checkpoint
 
 
 def split_image_into_thirds(image_path, output_dir):
@@ -36,16 +39,11 @@ def split_image_into_thirds(image_path, output_dir):
     return [top_path, bottom_path]
 
 
-def load_model(model_path, num_classes=3):
+def load_model(model_path, arch=None):
     """
-    Load the trained Faster R-CNN model.
+    Load a trained detector checkpoint of any architecture in backend/model_registry.py.
     """
-    model = torchvision.models.detection.fasterrcnn_resnet50_fpn(pretrained=False)
-    in_features = model.roi_heads.box_predictor.cls_score.in_features
-    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
-
-    model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-    model.eval()
+    model, _ = load_checkpoint(model_path, arch)
     return model
 
 